@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Benchmarks punsctl against synthetic rootspaces.
+
+Generates N namespaces with M entries each (a mix of files and
+directories), pre-populates the symlink path with conflicting targets,
+and times RootSpace.check, RootSpace.get_all_ns_paths, listing,
+Namespace.activate, Namespace.switch, Namespace.deactivate, the CLI
+end to end and the startup of "punsctl current" against a bare
+interpreter. File system calls made through the os module are counted
+while each phase runs. Results are written as JSON so that runs against
+different versions can be compared with --compare.
+
+    python benchmarks/bench.py -n 200 -m 100 -o results.json
+    python benchmarks/bench.py -n 200 -m 100 --compare results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from subprocess import DEVNULL, run
+from typing import Any, Callable, Dict, Iterator, List, TextIO
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import punsctl  # noqa: E402
+from punsctl.listing import write_namespaces  # noqa: E402
+from punsctl.namespace import Namespace  # noqa: E402
+from punsctl.rootspace import RootSpace  # noqa: E402
+
+COUNTED_SYSCALLS = (
+    "access",
+    "link",
+    "lstat",
+    "mkdir",
+    "open",
+    "readlink",
+    "rename",
+    "replace",
+    "rmdir",
+    "scandir",
+    "stat",
+    "symlink",
+    "unlink",
+)
+
+
+@contextmanager
+def count_syscalls() -> Iterator[Counter]:
+    """
+    Wraps the os functions in COUNTED_SYSCALLS, including the references
+    punsctl modules imported with "from os import ...", and counts calls.
+    """
+
+    counter: Counter = Counter()
+    originals = {name: getattr(os, name) for name in COUNTED_SYSCALLS}
+
+    def wrap(name: str, func: Callable) -> Callable:
+        def wrapper(*args, **kwargs):
+            counter[name] += 1
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    wrappers = {name: wrap(name, func) for name, func in originals.items()}
+
+    patched = []
+    modules = [os] + [
+        module
+        for name, module in sys.modules.items()
+        if name.startswith("punsctl") and module is not None
+    ]
+    for module in modules:
+        for name, func in originals.items():
+            if getattr(module, name, None) is func:
+                setattr(module, name, wrappers[name])
+                patched.append((module, name, func))
+
+    try:
+        yield counter
+
+    finally:
+        for module, name, func in patched:
+            setattr(module, name, func)
+
+
+def generate(base: Path, namespaces: int, entries: int, conflicts: float) -> RootSpace:
+    root_path = Path(f"{base}/.ns")
+    symlink_path = Path(f"{base}/home")
+
+    root_path.mkdir(parents=True)
+    symlink_path.mkdir(parents=True)
+
+    for ns_index in range(namespaces):
+        ns_path = Path(f"{root_path}/ns{ns_index:04d}")
+        ns_path.mkdir()
+
+        for entry_index in range(entries):
+            entry = Path(f"{ns_path}/.entry{entry_index:04d}")
+            if entry_index % 3 == 0:
+                entry.mkdir()
+                Path(f"{entry}/config").write_text(entry.name)
+            else:
+                entry.write_text(entry.name)
+
+    for entry_index in range(int(entries * conflicts)):
+        Path(f"{symlink_path}/.entry{entry_index:04d}").write_text("home")
+
+    return RootSpace(path=root_path, symlink_path=symlink_path)
+
+
+def measure(
+    func: Callable[[], Any],
+    repeat: int,
+    setup: Callable[[], Any] = lambda: None,
+    subprocess: bool = False,
+) -> Dict[str, Any]:
+    timings: List[float] = []
+    syscalls: Counter = Counter()
+
+    for _ in range(repeat):
+        setup()
+
+        with count_syscalls() as counter:
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+
+        syscalls = counter
+
+    return {
+        "seconds": timings,
+        "median": statistics.median(timings),
+        "min": min(timings),
+        # Calls made by a child process can't be counted from here
+        "syscalls": None if subprocess else dict(sorted(syscalls.items())),
+    }
+
+
+def run_cli(root_space: RootSpace, *args: str) -> None:
+    env = dict(
+        os.environ,
+        NS_ROOT=str(root_space.get_path()),
+        NS_SYMLINK=str(root_space.get_symlink_path()),
+        PYTHONPATH=str(Path(__file__).resolve().parent.parent),
+    )
+
+    run(
+        [sys.executable, "-m", "punsctl", *args],
+        env=env,
+        check=True,
+        stdout=DEVNULL,
+    )
+
+
+def run_python(*args: str) -> None:
+    env = dict(os.environ, PYTHONPATH=str(Path(__file__).resolve().parent.parent))
+    run([sys.executable, *args], env=env, check=True, stdout=DEVNULL)
+
+
+def benchmark(
+    root_space: RootSpace, repeat: int, jobs: int, devnull: TextIO
+) -> Dict[str, Any]:
+    first = Namespace(name="ns0000", root_space=root_space, jobs=jobs)
+    second = Namespace(name="ns0001", root_space=root_space, jobs=jobs)
+
+    def deactivate_all() -> None:
+        for namespace in (first, second):
+            namespace.deactivate()
+
+    def activate_first() -> None:
+        deactivate_all()
+        first.activate()
+
+    results = {
+        "rootspace_check": measure(root_space.check, repeat),
+        "get_all_ns_paths": measure(root_space.get_all_ns_paths, repeat),
+        "list": measure(
+            lambda: write_namespaces(root_space, stream=devnull),
+            repeat,
+        ),
+        "activate": measure(first.activate, repeat, setup=deactivate_all),
+        "switch": measure(second.switch, repeat, setup=activate_first),
+        "deactivate": measure(first.deactivate, repeat, setup=activate_first),
+        "startup_interpreter": measure(
+            lambda: run_python("-c", "pass"), repeat, subprocess=True
+        ),
+        "startup_current": measure(
+            lambda: run_python("-m", "punsctl", "current"), repeat, subprocess=True
+        ),
+        "cli_list": measure(lambda: run_cli(root_space, "-l"), repeat, subprocess=True),
+        "cli_activate": measure(
+            lambda: run_cli(root_space, "-a", first.get_name()),
+            repeat,
+            setup=deactivate_all,
+            subprocess=True,
+        ),
+        "cli_deactivate": measure(
+            lambda: run_cli(root_space, "-d"),
+            repeat,
+            setup=activate_first,
+            subprocess=True,
+        ),
+    }
+
+    deactivate_all()
+
+    return results
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    sys.stdout.write(f"{'phase':<20} {'baseline':>12} {'current':>12} {'ratio':>8}\n")
+
+    for phase, result in results["results"].items():
+        previous = baseline["results"].get(phase)
+        if previous is None:
+            continue
+
+        ratio = result["median"] / previous["median"] if previous["median"] else 0
+        sys.stdout.write(
+            f"{phase:<20} {previous['median'] * 1000:>10.2f}ms "
+            f"{result['median'] * 1000:>10.2f}ms {ratio:>7.2f}x\n"
+        )
+
+
+def default_base_dir() -> str:
+    # tmpfs keeps disk latency out of the numbers
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+def main(args: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", "--namespaces", type=int, default=50)
+    parser.add_argument("-m", "--entries", type=int, default=50)
+    parser.add_argument("-c", "--conflicts", type=float, default=0.25)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("-d", "--dir", default=default_base_dir())
+    parser.add_argument("-o", "--output")
+    parser.add_argument("--compare")
+    opts = parser.parse_args(args)
+
+    if opts.namespaces < 2:
+        parser.error("at least 2 namespaces are required")
+
+    base = Path(tempfile.mkdtemp(prefix="punsctl-bench-", dir=opts.dir))
+    devnull = open(os.devnull, "w")
+    try:
+        root_space = generate(base, opts.namespaces, opts.entries, opts.conflicts)
+        results = {
+            "version": punsctl.__VERSION__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {
+                "namespaces": opts.namespaces,
+                "entries": opts.entries,
+                "conflicts": opts.conflicts,
+                "repeat": opts.repeat,
+                "jobs": opts.jobs,
+            },
+            "results": benchmark(root_space, opts.repeat, opts.jobs, devnull),
+        }
+
+    finally:
+        devnull.close()
+        shutil.rmtree(base)
+
+    output = json.dumps(results, indent=2)
+    if opts.output is not None:
+        Path(opts.output).write_text(output)
+    else:
+        sys.stdout.write(f"{output}\n")
+
+    if opts.compare is not None:
+        compare(results, json.loads(Path(opts.compare).read_text()))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
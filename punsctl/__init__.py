@@ -14,3 +14,31 @@
 # OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
 __VERSION__ = "0.2.6"
+
+__all__ = [
+    "NamespaceException",
+    "NamespaceInfo",
+    "Result",
+    "RootSpaceException",
+    "Session",
+]
+
+# Where each name is imported from on first access, so "punsctl current"
+# and other importers of a submodule don't load the library API
+_EXPORTS = {
+    "NamespaceException": "punsctl.exceptions",
+    "RootSpaceException": "punsctl.exceptions",
+    "NamespaceInfo": "punsctl.session",
+    "Result": "punsctl.session",
+    "Session": "punsctl.session",
+}
+
+
+def __getattr__(name: str) -> object:
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module 'punsctl' has no attribute {name!r}")
+
+    from importlib import import_module
+
+    return getattr(import_module(module), name)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import errno
+import os
+import stat
+from typing import Any, Optional
+
+__all__ = ["exchange", "replace_symlink", "restore_path", "swap_symlink", "temp_name"]
+
+RENAME_EXCHANGE = 2
+
+_renameat2: Optional[Any] = None
+_renameat2_loaded = False
+
+
+def _get_renameat2() -> Optional[Any]:
+    global _renameat2, _renameat2_loaded
+
+    if not _renameat2_loaded:
+        _renameat2_loaded = True
+
+        # ctypes is imported on first use, it is too slow for startup
+        import ctypes
+        import ctypes.util
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            _renameat2 = getattr(libc, "renameat2", None)
+
+        except OSError:
+            _renameat2 = None
+
+    return _renameat2
+
+
+def temp_name(name: str) -> str:
+    head, tail = os.path.split(name)
+    return os.path.join(head, f".{tail}.{os.getpid()}.punsctl.tmp")
+
+
+def exchange(src: str, dst: str, dir_fd: int) -> bool:
+    """
+    Atomically swaps src and dst with renameat2(RENAME_EXCHANGE).
+    Returns False when the platform or filesystem doesn't support it.
+    """
+
+    renameat2 = _get_renameat2()
+    if renameat2 is None:
+        return False
+
+    if (
+        renameat2(dir_fd, os.fsencode(src), dir_fd, os.fsencode(dst), RENAME_EXCHANGE)
+        == 0
+    ):
+        return True
+
+    import ctypes
+
+    err = ctypes.get_errno()
+    if err in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+        return False
+
+    raise OSError(err, os.strerror(err), src, None, dst)
+
+
+def replace_symlink(source: str, name: str, dir_fd: int) -> None:
+    tmp = temp_name(name)
+
+    os.symlink(source, tmp, dir_fd=dir_fd)
+    try:
+        os.rename(tmp, name, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+
+    except OSError:
+        os.unlink(tmp, dir_fd=dir_fd)
+        raise
+
+
+def swap_symlink(source: str, name: str, backup: str, dir_fd: int) -> None:
+    """
+    Links name to source and moves whatever was at name to backup, without
+    a window in which name doesn't exist. Without renameat2 support regular
+    files are hardlinked to backup first, anything else falls back to two
+    consecutive renames.
+    """
+
+    tmp = temp_name(name)
+
+    os.symlink(source, tmp, dir_fd=dir_fd)
+    try:
+        swapped = exchange(tmp, name, dir_fd)
+
+    except OSError:
+        os.unlink(tmp, dir_fd=dir_fd)
+        raise
+
+    if swapped:
+        try:
+            os.rename(tmp, backup, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+
+        except OSError:
+            exchange(tmp, name, dir_fd)
+            os.unlink(tmp, dir_fd=dir_fd)
+            raise
+
+        return
+
+    try:
+        if stat.S_ISREG(os.lstat(name, dir_fd=dir_fd).st_mode):
+            os.link(name, backup, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+        else:
+            os.rename(name, backup, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+
+    except OSError:
+        os.unlink(tmp, dir_fd=dir_fd)
+        raise
+
+    os.rename(tmp, name, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+
+
+def restore_path(backup: str, name: str, dir_fd: int) -> None:
+    """
+    Moves backup over the symlink at name without a window in which name
+    doesn't exist.
+    """
+
+    if exchange(backup, name, dir_fd):
+        os.unlink(backup, dir_fd=dir_fd)
+        return
+
+    if not stat.S_ISDIR(os.lstat(backup, dir_fd=dir_fd).st_mode):
+        os.rename(backup, name, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+        return
+
+    try:
+        os.unlink(name, dir_fd=dir_fd)
+
+    except FileNotFoundError:
+        pass
+
+    os.rename(backup, name, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Batch mode, many operations in one process against a single RootSpace.
+Each input line is either a JSON request as understood by punsctl.ops or
+"<op> [namespace or pattern]", e.g. "create work" or "list work-*", or
+"clone <namespace> <target>". Blank
+lines and lines starting with "#" are skipped. One JSON result line is
+written per operation.
+"""
+
+import io
+import json
+import logging
+import shlex
+import sys
+from typing import Any, Dict, Iterable, Optional, TextIO
+
+from punsctl.exceptions import NamespaceException, format_exception
+from punsctl.ops import LogCapture, execute
+from punsctl.rootspace import RootSpace
+
+__all__ = ["parse_line", "run_batch"]
+
+
+def parse_line(line: str) -> Optional[Dict[str, Any]]:
+    line = line.strip()
+    if line == "" or line.startswith("#"):
+        return None
+
+    if line.startswith("{"):
+        try:
+            request = json.loads(line)
+
+        except ValueError as exc:
+            raise NamespaceException(message=f"invalid request: {exc}")
+
+        if not isinstance(request, dict):
+            raise NamespaceException(message="invalid request: not an object")
+
+        return request
+
+    try:
+        words = shlex.split(line)
+
+    except ValueError as exc:
+        raise NamespaceException(message=f"invalid request: {exc}")
+
+    if len(words) > (3 if words[0] == "clone" else 2):
+        raise NamespaceException(message=f"invalid request: {line}")
+
+    request = {"op": words[0]}
+    if len(words) >= 2:
+        request["pattern" if words[0] == "list" else "namespace"] = words[1]
+    if len(words) == 3:
+        request["target"] = words[2]
+
+    return request
+
+
+def run_batch(
+    root_space: RootSpace,
+    lines: Iterable[str],
+    defaults: Optional[Dict[str, Any]] = None,
+    stop_on_error: bool = False,
+    stream: Optional[TextIO] = None,
+) -> int:
+    """
+    Runs the operations read from lines, defaults fill in options a request
+    doesn't set. Returns the number of failed operations.
+    """
+
+    stream = stream if stream is not None else sys.stdout
+    defaults = defaults if defaults is not None else {}
+
+    log_capture = LogCapture()
+    logging.getLogger().addHandler(log_capture)
+
+    failed = 0
+
+    try:
+        for lineno, line in enumerate(lines, start=1):
+            output = io.StringIO()
+            result: Dict[str, Any] = {
+                "line": lineno,
+                "op": None,
+                "namespace": None,
+                "ok": True,
+                "status": 0,
+                "error": None,
+            }
+
+            try:
+                request = parse_line(line)
+                if request is None:
+                    continue
+
+                request = {**defaults, **request}
+                result.update(op=request.get("op"), namespace=request.get("namespace"))
+
+                with log_capture.capture(output):
+                    result["status"] = execute(root_space, request, output)
+
+            except Exception as exc:
+                result.update(ok=False, status=1, error=format_exception(exc))
+
+            if result["status"] != 0:
+                failed += 1
+
+            result["output"] = output.getvalue()
+            stream.write(json.dumps(result) + "\n")
+            stream.flush()
+
+            if failed > 0 and stop_on_error:
+                break
+
+    finally:
+        logging.getLogger().removeHandler(log_capture)
+
+    return failed
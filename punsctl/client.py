@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import json
+import socket
+from typing import Any, Dict, Optional
+
+from punsctl.static import DAEMON_SOCKET_NAME
+
+__all__ = ["get_socket_path", "call"]
+
+
+def get_socket_path(root_path: str) -> str:
+    return f"{root_path}/{DAEMON_SOCKET_NAME}"
+
+
+def call(socket_path: str, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Sends request to the daemon listening on socket_path and returns its
+    response, or None when no daemon accepts the connection. Once connected
+    errors are raised, a request that may have run is never retried.
+    """
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        sock.connect(socket_path)
+
+    except OSError:
+        sock.close()
+        return None
+
+    with sock:
+        sock.sendall(json.dumps(request).encode() + b"\n")
+
+        with sock.makefile("rb") as stream:
+            line = stream.readline()
+
+    if not line:
+        raise ConnectionError(f"daemon at {socket_path} closed the connection")
+
+    return json.loads(line)
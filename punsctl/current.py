@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Read-only "which namespace is active" query for shell prompts. Only os, typing
+and punsctl.static are imported and no rootspace checks are run, the
+answer costs a single readlink of .current_ns.
+"""
+
+import os
+import sys
+from typing import Optional
+
+from punsctl.static import CURRENT_NS_SYMLINK_NAME, DEFAULT_SYMLINK_PATH
+
+__all__ = ["get_current_ns_name", "main"]
+
+
+def get_current_ns_name(symlink_path: str) -> Optional[str]:
+    try:
+        target = os.readlink(f"{symlink_path}/{CURRENT_NS_SYMLINK_NAME}")
+
+    except OSError:
+        return None
+
+    return os.path.basename(target.rstrip("/")) or None
+
+
+def main(symlink_path: Optional[str] = None) -> int:
+    if symlink_path is None:
+        symlink_path = os.environ.get("NS_SYMLINK", DEFAULT_SYMLINK_PATH)
+
+    name = get_current_ns_name(symlink_path)
+    if name is not None:
+        sys.stdout.write(f"{name}\n")
+
+    return 0
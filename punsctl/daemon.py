@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Long running punsctl daemon. Requests are line-delimited JSON over a Unix
+socket in the rootspace, one response line per request line. RootSpace
+instances live for the lifetime of the daemon, so their checks, namespace
+listing and compiled .nsignore files are reused until the stat of the
+underlying paths changes. Requests that change state are serialized,
+read-only requests run concurrently.
+"""
+
+import io
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from punsctl.client import get_socket_path
+from punsctl.exceptions import RootSpaceException, format_exception
+from punsctl.ops import LogCapture, execute, is_read_only
+from punsctl.rootspace import RootSpace
+from punsctl.static import DAEMON_SOCKET_MODE
+
+__all__ = ["RWLock", "Daemon", "serve"]
+
+
+class RWLock(object):
+    """
+    Readers-writer lock. Waiting writers block new readers, so a steady
+    stream of queries can't starve a switch.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.readers = 0
+        self.writer = False
+        self.writers_waiting = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        with self.cond:
+            while self.writer or self.writers_waiting > 0:
+                self.cond.wait()
+            self.readers += 1
+
+        try:
+            yield
+
+        finally:
+            with self.cond:
+                self.readers -= 1
+                if self.readers == 0:
+                    self.cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        with self.cond:
+            self.writers_waiting += 1
+            while self.writer or self.readers > 0:
+                self.cond.wait()
+            self.writers_waiting -= 1
+            self.writer = True
+
+        try:
+            yield
+
+        finally:
+            with self.cond:
+                self.writer = False
+                self.cond.notify_all()
+
+
+class Daemon(object):
+    def __init__(self, root_path: str):
+        self.root_path = root_path
+        self.socket_path = get_socket_path(root_path)
+        self.lock = RWLock()
+        self.root_spaces: Dict[str, RootSpace] = {}
+        self.root_spaces_lock = threading.Lock()
+        self.log_handler = LogCapture()
+        self.server: Optional[_Server] = None
+
+    def get_root_space(self, symlink_path: str) -> RootSpace:
+        with self.root_spaces_lock:
+            root_space = self.root_spaces.get(symlink_path)
+            if root_space is None:
+                root_space = RootSpace(
+                    path=Path(self.root_path), symlink_path=Path(symlink_path)
+                )
+                self.root_spaces[symlink_path] = root_space
+
+            return root_space
+
+    def invalidate(self) -> None:
+        with self.root_spaces_lock:
+            for root_space in self.root_spaces.values():
+                root_space.invalidate()
+
+    def handle(self, request: Any) -> Dict[str, Any]:
+        if not isinstance(request, dict) or not isinstance(
+            request.get("symlink_path"), str
+        ):
+            return {"ok": False, "output": "", "error": "invalid request"}
+
+        if not os.path.isabs(request["symlink_path"]):
+            return {
+                "ok": False,
+                "output": "",
+                "error": "invalid request: symlink path must be absolute",
+            }
+
+        root_space = self.get_root_space(request["symlink_path"])
+        read_only = is_read_only(request)
+
+        stream = io.StringIO()
+        response: Dict[str, Any] = {"ok": True, "status": 0, "error": None}
+
+        with self.lock.read() if read_only else self.lock.write():
+            try:
+                with self.log_handler.capture(stream):
+                    response["status"] = execute(root_space, request, stream)
+
+            except Exception as exc:
+                response.update(ok=False, status=1, error=format_exception(exc))
+
+            finally:
+                if not read_only:
+                    self.invalidate()
+
+        response["output"] = stream.getvalue()
+
+        return response
+
+    def bind(self) -> None:
+        self.__remove_stale_socket()
+
+        self.server = _Server(self.socket_path, self)
+        os.chmod(self.socket_path, DAEMON_SOCKET_MODE)
+        logging.getLogger().addHandler(self.log_handler)
+
+    def serve_forever(self) -> None:
+        if self.server is None:
+            self.bind()
+
+        self.server.serve_forever()
+
+    def shutdown(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+
+    def close(self) -> None:
+        if self.server is None:
+            return
+
+        self.server.server_close()
+        self.server = None
+        logging.getLogger().removeHandler(self.log_handler)
+
+        try:
+            os.unlink(self.socket_path)
+
+        except FileNotFoundError:
+            pass
+
+    def __remove_stale_socket(self) -> None:
+        if not os.path.exists(self.socket_path):
+            return
+
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+
+        except OSError:
+            os.unlink(self.socket_path)
+            return
+
+        finally:
+            probe.close()
+
+        raise RootSpaceException(
+            message=f"daemon is already running on {self.socket_path}"
+        )
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+
+            except ValueError:
+                response = {"ok": False, "output": "", "error": "invalid request"}
+
+            else:
+                response = self.server.service.handle(request)
+
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, service: Daemon):
+        self.service = service
+        super().__init__(socket_path, _RequestHandler)
+
+
+def serve(root_path: str) -> None:
+    """
+    Serves requests for root_path in the foreground until SIGTERM or SIGINT.
+    """
+
+    daemon = Daemon(root_path)
+    daemon.bind()
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    sys.stdout.write(f"info: daemon listening on {daemon.socket_path}\n")
+    sys.stdout.flush()
+
+    try:
+        daemon.serve_forever()
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        daemon.close()
@@ -13,10 +13,13 @@
 # ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
 # OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
+import errno
 import logging
 import sys
 from functools import wraps
 
+from punsctl.trace import tracer
+
 
 class NamespaceException(Exception):
     def __init__(self, message):
@@ -28,41 +31,39 @@ class RootSpaceException(Exception):
         self.message = message
 
 
+def format_exception(exc: Exception) -> str:
+    if isinstance(exc, RootSpaceException):
+        return f"rootspace error: {exc.message}"
+
+    if isinstance(exc, NamespaceException):
+        return f"namespace error: {exc.message}"
+
+    return f"unexpected error: {exc}"
+
+
 def main_exception_handler(func):
     @wraps(func)
     def inner_func(*args, **kwargs):
         try:
             func(*args, **kwargs)
 
-        except RootSpaceException as exc:
-            sys.exit(f"rootspace error: {exc.message}")
-
-        except NamespaceException as exc:
-            sys.exit(f"namespace error: {exc.message}")
-
         except Exception as exc:
-            sys.exit(f"unexpected error: {exc}")
+            sys.exit(format_exception(exc))
 
     return inner_func
 
 
-def fs_ops_exception_handler(func):
-    @wraps(func)
-    def inner_func(*args, **kwargs):
-        try:
-            func(*args, **kwargs)
+def report_fs_ops_exception(exc: Exception) -> None:
+    if tracer.enabled:
+        tracer.count("warnings")
 
-        except PermissionError as exc:
-            logging.warning(
-                f"warning: {exc.strerror}: {exc.filename} -> {exc.filename2}"
-            )
+    if isinstance(exc, (PermissionError, FileExistsError)):
+        logging.warning(f"warning: {exc.strerror}: {exc.filename} -> {exc.filename2}")
 
-        except FileExistsError as exc:
-            logging.warning(
-                f"warning: {exc.strerror}: {exc.filename} -> {exc.filename2}"
-            )
+    elif isinstance(exc, OSError) and exc.errno == errno.EXDEV:
+        logging.warning(
+            f"warning: {exc.filename} and {exc.filename2} are on different filesystems"
+        )
 
-        except Exception as exc:
-            logging.critical(f"unexpected error: {exc}")
-
-    return inner_func
+    else:
+        logging.critical(f"unexpected error: {exc}")
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+"punsctl exec <namespace> -- <command>" runs a command inside a private
+view of a namespace. The namespace is activated into a temporary directory
+instead of the shared symlink path and the command gets it as HOME, so any
+number of namespaces can be in use at once. The view is removed when the
+command exits.
+"""
+
+import os
+import signal
+import subprocess  # nosec B404
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+from punsctl.fsremove import remove_tree
+from punsctl.namespace import Namespace
+from punsctl.rootspace import RootSpace
+
+__all__ = ["build_view", "run_in_namespace"]
+
+# Signals passed on to the command instead of ending punsctl before cleanup
+FORWARDED_SIGNALS = (signal.SIGTERM, signal.SIGHUP, signal.SIGQUIT)
+
+
+def build_view(
+    root_path: Path,
+    name: str,
+    view_path: Path,
+    atomic: bool = False,
+    jobs: int = 1,
+    tree: bool = False,
+    lock_timeout: Optional[float] = None,
+) -> RootSpace:
+    """
+    Activates namespace name with view_path as its symlink path. The
+    rootspace itself is only read, a shared lock is enough.
+    """
+
+    root_space = RootSpace(path=root_path, symlink_path=view_path)
+    root_space.check()
+
+    with root_space.lock(shared=True, timeout=lock_timeout):
+        ns = Namespace(
+            name=name, root_space=root_space, atomic=atomic, jobs=jobs, tree=tree
+        )
+        ns.activate()
+
+    return root_space
+
+
+def _wait(process: subprocess.Popen) -> int:
+    def forward(signum, frame):
+        process.send_signal(signum)
+
+    handlers = {signum: signal.signal(signum, forward) for signum in FORWARDED_SIGNALS}
+
+    try:
+        while True:
+            try:
+                return process.wait()
+
+            except KeyboardInterrupt:
+                # The terminal sent SIGINT to the command as well
+                continue
+
+    finally:
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+
+
+def run_in_namespace(
+    root_path: Path,
+    name: str,
+    command: List[str],
+    atomic: bool = False,
+    jobs: int = 1,
+    tree: bool = False,
+    lock_timeout: Optional[float] = None,
+) -> int:
+    """
+    Runs command with HOME and XDG_CONFIG_HOME in a private view of
+    namespace name and returns its exit status, 128 + signal number when
+    it was killed by a signal.
+    """
+
+    view_path = Path(tempfile.mkdtemp(prefix=f"punsctl-{name}-"))
+
+    try:
+        build_view(
+            root_path,
+            name,
+            view_path,
+            atomic=atomic,
+            jobs=jobs,
+            tree=tree,
+            lock_timeout=lock_timeout,
+        )
+
+        env = dict(os.environ)
+        env["HOME"] = str(view_path)
+        env["XDG_CONFIG_HOME"] = f"{view_path}/.config"
+        env["NS_SYMLINK"] = str(view_path)
+
+        try:
+            # The user asked for exactly this command, no shell is involved
+            process = subprocess.Popen(command, env=env)  # nosec B603
+
+        except FileNotFoundError:
+            sys.stderr.write(f"punsctl: {command[0]}: command not found\n")
+            return 127
+
+        returncode = _wait(process)
+
+    finally:
+        remove_tree(str(view_path))
+
+    return 128 - returncode if returncode < 0 else returncode
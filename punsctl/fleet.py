@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Fleet mode, operations across many rootspaces at once, e.g. those of the
+service accounts of a build host. Each input line names a target and the
+operation to run against it, either as a JSON request with "root_path"
+and "symlink_path" keys or as "<root path> <symlink path> <op> [args]",
+the rest as in batch mode. Targets run on a pool of worker processes, each
+under the lock of its own rootspace, and one JSON result line is written
+per target, in input order, followed by a summary line.
+"""
+
+import io
+import json
+import logging
+import shlex
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+
+from punsctl.batch import parse_line
+from punsctl.exceptions import NamespaceException, format_exception
+from punsctl.ops import LogCapture, execute
+from punsctl.rootspace import RootSpace
+
+__all__ = ["parse_target", "run_target", "run_fleet"]
+
+
+def parse_target(line: str) -> Optional[Dict[str, Any]]:
+    line = line.strip()
+    if line == "" or line.startswith("#"):
+        return None
+
+    if line.startswith("{"):
+        request = parse_line(line)
+
+        for key in ("root_path", "symlink_path"):
+            if not isinstance(request.get(key), str):
+                raise NamespaceException(message=f"invalid request: no {key}")
+
+        return request
+
+    try:
+        words = shlex.split(line)
+
+    except ValueError as exc:
+        raise NamespaceException(message=f"invalid request: {exc}")
+
+    if len(words) < 3:
+        raise NamespaceException(message=f"invalid request: {line}")
+
+    request = parse_line(shlex.join(words[2:]))
+    if request is None:
+        raise NamespaceException(message=f"invalid request: {line}")
+
+    request.update(root_path=words[0], symlink_path=words[1])
+
+    return request
+
+
+def run_target(request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Runs request against the rootspace it names and returns its result.
+    Runs in a worker process, nothing but the result crosses back.
+    """
+
+    started = time.perf_counter()
+    output = io.StringIO()
+    result: Dict[str, Any] = {
+        "root_path": request.get("root_path"),
+        "symlink_path": request.get("symlink_path"),
+        "op": request.get("op"),
+        "namespace": request.get("namespace"),
+        "ok": True,
+        "status": 0,
+        "error": None,
+    }
+
+    log_capture = LogCapture()
+    logger = logging.getLogger()
+    logger.addHandler(log_capture)
+
+    try:
+        root_space = RootSpace(
+            path=Path(request["root_path"]),
+            symlink_path=Path(request["symlink_path"]),
+        )
+
+        with log_capture.capture(output):
+            result["status"] = execute(root_space, request, output)
+
+    except Exception as exc:
+        result.update(ok=False, status=1, error=format_exception(exc))
+
+    finally:
+        logger.removeHandler(log_capture)
+
+    result["output"] = output.getvalue()
+    result["seconds"] = round(time.perf_counter() - started, 6)
+
+    return result
+
+
+def _parse(lines: Iterable[str], defaults: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    # Lines that don't parse become failed results without reaching a worker
+    for lineno, line in enumerate(lines, start=1):
+        try:
+            request = parse_target(line)
+
+        except Exception as exc:
+            yield {"line": lineno, "error": format_exception(exc)}
+            continue
+
+        if request is not None:
+            yield {"line": lineno, "request": {**defaults, **request}}
+
+
+def _run(item: Dict[str, Any]) -> Dict[str, Any]:
+    if "error" in item:
+        result = {"ok": False, "status": 1, "error": item["error"], "output": ""}
+    else:
+        result = run_target(item["request"])
+
+    return {"line": item["line"], **result}
+
+
+def run_fleet(
+    lines: Iterable[str],
+    defaults: Optional[Dict[str, Any]] = None,
+    processes: Optional[int] = None,
+    stream: Optional[TextIO] = None,
+) -> int:
+    """
+    Runs the targets read from lines on up to processes worker processes,
+    os.cpu_count() by default, and in this process when it is 1. defaults
+    fill in options a request doesn't set. Returns the number of failed
+    targets.
+    """
+
+    stream = stream if stream is not None else sys.stdout
+    defaults = defaults if defaults is not None else {}
+
+    started = time.perf_counter()
+    items: List[Dict[str, Any]] = list(_parse(lines, defaults))
+    failed = 0
+
+    def write(result: Dict[str, Any]) -> None:
+        nonlocal failed
+
+        if result["status"] != 0:
+            failed += 1
+
+        stream.write(json.dumps(result) + "\n")
+        stream.flush()
+
+    if processes == 1 or len(items) <= 1:
+        for item in items:
+            write(_run(item))
+
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for result in executor.map(_run, items):
+                write(result)
+
+    stream.write(
+        json.dumps(
+            {
+                "targets": len(items),
+                "failed": failed,
+                "seconds": round(time.perf_counter() - started, 6),
+            }
+        )
+        + "\n"
+    )
+
+    return failed
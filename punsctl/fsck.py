@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Consistency check and repair of a symlink path. The symlink path is
+scanned once and links are classified by looking their targets up in the
+persistent entry index instead of stat-ing them, so a check is linear in
+home entries plus namespace entries, and namespaces unchanged since the
+last run aren't scanned at all.
+"""
+
+import os
+from os import DirEntry
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from punsctl.manifest import Manifest
+from punsctl.namespace import Namespace
+from punsctl.plan import Plan
+from punsctl.rootspace import RootSpace
+from punsctl.static import (
+    CURRENT_NS_SYMLINK_NAME,
+    DAEMON_SOCKET_NAME,
+    LOCK_NAME,
+    MANIFEST_NAME,
+)
+from punsctl.store import STORE_BACKUP
+from punsctl.trace import tracer
+
+__all__ = [
+    "CORRECT",
+    "DANGLING",
+    "FOREIGN",
+    "IGNORED",
+    "ORPHAN_BACKUP",
+    "CONFLICT",
+    "MISSING",
+    "Finding",
+    "Fsck",
+]
+
+CORRECT = "correct"
+DANGLING = "dangling"
+FOREIGN = "foreign"
+IGNORED = "ignored"
+ORPHAN_BACKUP = "orphan-backup"
+CONFLICT = "conflict"
+MISSING = "missing"
+
+_SKIPPED_NAMES = (MANIFEST_NAME, DAEMON_SOCKET_NAME, LOCK_NAME)
+
+
+class Finding(NamedTuple):
+    name: str
+    status: str
+    detail: str = ""
+
+    def __str__(self) -> str:
+        return f"{self.status}: {self.name}{f' ({self.detail})' if self.detail else ''}"
+
+
+class Fsck(object):
+    def __init__(
+        self,
+        root_space: RootSpace,
+        atomic: bool = False,
+        jobs: int = 1,
+        indirect: bool = False,
+    ):
+        self.root_space = root_space
+        self.atomic = atomic
+        self.jobs = jobs
+        self.indirect = indirect
+
+        self.root_prefix = f"{root_space.get_path()}/"
+        self.indirect_prefix = f"{root_space.get_current_ns_path()}/"
+
+        # Filled by scan()
+        self.index: Dict[str, Dict[str, bool]] = {}
+        self.entries: Dict[str, Dict[str, bool]] = {}
+        # Namespaces backups can belong to, removed ones still referenced
+        # by the manifest, .current_ns or a link included
+        self.known: Set[str] = set()
+        self.active: Optional[str] = None
+        self.links: Dict[str, Tuple[str, str]] = {}
+        self.backups: Dict[str, Tuple[str, str]] = {}
+        self.findings: List[Finding] = []
+        self.home: Dict[str, DirEntry] = {}
+
+    def __scan_dir(self, path: Path) -> Dict[str, DirEntry]:
+        if tracer.enabled:
+            tracer.count("scandirs")
+
+        with os.scandir(path) as entries:
+            return {entry.name: entry for entry in entries}
+
+    def __build_index(self) -> None:
+        # namespace -> linkable entry name -> is a directory, from the
+        # persistent index, which only rescans namespaces that changed.
+        # entries keeps the ignored ones too, links into them aren't dangling
+        for ns, entries in self.root_space.get_index().get_all_entries().items():
+            self.entries[ns] = entries
+            self.known.add(ns)
+            nsignore = self.root_space.get_nsignore(
+                Path(f"{self.root_space.get_path()}/{ns}/.nsignore")
+            )
+            self.index[ns] = {
+                name: is_dir
+                for name, is_dir in entries.items()
+                if not nsignore.match(name, is_dir)
+            }
+
+    def __parse_link(self, link: str) -> Optional[Tuple[str, str]]:
+        """
+        Returns (namespace, entry) for links into the rootspace, directly or
+        through .current_ns, and None for links punsctl didn't make.
+        """
+
+        if link.startswith(self.indirect_prefix):
+            if self.active is None:
+                return "", link[len(self.indirect_prefix) :]
+            return self.active, link[len(self.indirect_prefix) :]
+
+        if link.startswith(self.root_prefix):
+            ns, _, entry = link[len(self.root_prefix) :].partition("/")
+            return ns, entry
+
+        return None
+
+    def __parse_backup(self, name: str) -> Optional[Tuple[str, str]]:
+        if not name.endswith(".bak"):
+            return None
+
+        # Namespace names may contain dots, try every split with a lookup
+        stem = name[: -len(".bak")]
+        dot = stem.rfind(".")
+        while dot > 0:
+            if stem[dot + 1 :] in self.known:
+                return stem[:dot], stem[dot + 1 :]
+            dot = stem.rfind(".", 0, dot)
+
+        return None
+
+    def __check_current_ns(self, targets: Dict[str, DirEntry]) -> None:
+        entry = targets.get(CURRENT_NS_SYMLINK_NAME)
+        if entry is None:
+            return
+
+        if not entry.is_symlink():
+            self.findings.append(Finding(entry.name, CONFLICT, "not a symlink"))
+            return
+
+        link = os.readlink(entry.path)
+        ns = link[len(self.root_prefix) :] if link.startswith(self.root_prefix) else ""
+        if ns:
+            self.known.add(ns)
+
+        if ns in self.index:
+            self.active = ns
+            self.findings.append(Finding(entry.name, CORRECT, ns))
+        else:
+            self.findings.append(Finding(entry.name, DANGLING, link))
+
+    def scan(self) -> List[Finding]:
+        with tracer.phase("fsck_scan"):
+            self.__build_index()
+            manifest = self.root_space.load_manifest()
+            if manifest is not None:
+                self.known.add(manifest.namespace)
+            targets = self.__scan_dir(self.root_space.get_symlink_path())
+            self.home = targets
+            self.__check_current_ns(targets)
+            self.__classify(targets)
+
+        return self.findings
+
+    def __classify(self, targets: Dict[str, DirEntry]) -> None:
+        active_entries = self.index.get(self.active, {})
+        statuses: Dict[str, str] = {}
+        others: List[Tuple[str, DirEntry]] = []
+
+        for name, entry in sorted(targets.items()):
+            if name == CURRENT_NS_SYMLINK_NAME or name in _SKIPPED_NAMES:
+                continue
+
+            if not entry.is_symlink():
+                others.append((name, entry))
+                continue
+
+            if tracer.enabled:
+                tracer.count("readlinks")
+
+            parsed = self.__parse_link(os.readlink(entry.path))
+            if parsed is None:
+                continue
+
+            ns, source = parsed
+            self.links[name] = parsed
+            if ns:
+                self.known.add(ns)
+
+            if source not in self.entries.get(ns, {}):
+                status = DANGLING
+            elif source not in self.index[ns]:
+                status = IGNORED
+            elif ns != self.active or source != name:
+                status = FOREIGN
+            else:
+                status = CORRECT
+
+            statuses[name] = status
+            self.findings.append(Finding(name, status, f"{ns}/{source}"))
+
+        # After the links, they name removed namespaces backups can belong to
+        for name, entry in others:
+            backup = self.__parse_backup(name)
+            if backup is not None:
+                self.backups[name] = backup
+                continue
+
+            if name in active_entries:
+                # A real directory over a directory entry is unfolded tree mode
+                if not (active_entries[name] and entry.is_dir(follow_symlinks=False)):
+                    statuses[name] = CONFLICT
+                    self.findings.append(Finding(name, CONFLICT, f"{self.active}"))
+
+        for name in sorted(set(active_entries) - set(targets)):
+            self.findings.append(Finding(name, MISSING, f"{self.active}/{name}"))
+
+        for name, (entry, ns) in sorted(self.backups.items()):
+            # A backup is only expected under a correct link of its namespace
+            if ns == self.active and statuses.get(entry) == CORRECT:
+                self.findings.append(Finding(name, CORRECT, entry))
+            else:
+                self.findings.append(Finding(name, ORPHAN_BACKUP, entry))
+
+    def problems(self) -> List[Finding]:
+        return [
+            finding
+            for finding in self.findings
+            if finding.status not in (CORRECT, IGNORED)
+        ]
+
+    def plan_repair(self) -> Plan:
+        """
+        Plans the fixes for the findings of scan(). Links into the rootspace
+        are pointed at the active namespace or removed, orphaned backups are
+        restored where their entry is free and missing links are created.
+        Conflicts and links into ignored entries are left alone, and so is a
+        dangling link whose target still resolves.
+        """
+
+        active = None
+        if self.active is not None:
+            active = Namespace(
+                name=self.active,
+                root_space=self.root_space,
+                atomic=self.atomic,
+                jobs=self.jobs,
+                indirect=self.indirect,
+            )
+
+        store = self.root_space.get_backup_store()
+        plan = Plan(
+            symlink_path=self.root_space.get_symlink_path(),
+            manifest=Manifest(self.active) if active is not None else None,
+            atomic=self.atomic,
+            jobs=self.jobs,
+            store=store,
+        )
+
+        def link_target(name: str) -> Path:
+            if self.indirect:
+                return Path(f"{self.indirect_prefix}{name}")
+            return Path(f"{self.root_prefix}{self.active}/{name}")
+
+        active_backups = {
+            entry: name
+            for name, (entry, ns) in self.backups.items()
+            if ns == self.active
+        }
+        owners = store.get_owners()
+
+        def backup_of(name: str) -> Optional[str]:
+            if name in active_backups:
+                return active_backups[name]
+            owner = owners.get(f"{self.root_space.get_symlink_path()}/{name}")
+            if owner is not None and owner in ("", self.active):
+                return STORE_BACKUP
+            return None
+
+        # Entries linked to the active namespace, and entries left empty,
+        # once the plan is applied
+        linked = set()
+        freed = set()
+
+        for finding in self.findings:
+            name = finding.name
+
+            if name == CURRENT_NS_SYMLINK_NAME:
+                if finding.status == DANGLING:
+                    plan.unlink(name)
+                    if os.path.lexists(self.root_space.get_manifest_path()):
+                        plan.unlink(MANIFEST_NAME)
+
+            elif finding.status == CORRECT and name in self.links:
+                plan.keep(name, backup=backup_of(name))
+                linked.add(name)
+
+            elif finding.status in (DANGLING, FOREIGN):
+                if active is not None and name in self.index[self.active]:
+                    plan.retarget(name, link_target(name))
+                    plan.keep(name, backup=backup_of(name))
+                    linked.add(name)
+                elif finding.status == DANGLING and os.path.exists(
+                    self.home[name].path
+                ):
+                    # The index disagrees with the filesystem, keep the link
+                    continue
+                else:
+                    plan.unlink(name)
+                    freed.add(name)
+
+            elif finding.status == MISSING:
+                plan.symlink(name, link_target(name))
+                plan.keep(name, backup=backup_of(name))
+                linked.add(name)
+
+        for finding in self.findings:
+            if finding.status != ORPHAN_BACKUP:
+                continue
+
+            entry, ns = self.backups[finding.name]
+            if entry in linked and ns == self.active:
+                continue
+
+            # Restored only into a free name, never over a file or a link
+            if entry in freed or (entry not in self.home and entry not in linked):
+                plan.rename(finding.name, entry, entry=entry)
+                freed.discard(entry)
+
+        return plan
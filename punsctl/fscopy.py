@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File tree copying for namespace clones. Regular files are reflinked with
+the FICLONE ioctl where the filesystem shares extents (btrfs, XFS, bcachefs,
+overlays of those), otherwise copied in the kernel with copy_file_range or
+sendfile, and only then through userspace buffers. Hardlink mode links
+files instead, edits through either name show up in both trees. move()
+renames, and across filesystems copies the same way and removes the
+source once the copy is verified.
+"""
+
+import errno
+import logging
+import os
+import stat
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from punsctl.atomic import temp_name
+from punsctl.pool import map_ordered
+from punsctl.trace import tracer
+
+__all__ = ["copy_file", "clone_tree", "move"]
+
+# _IOW(0x94, 9, int) from linux/fs.h, exposed by fcntl only since 3.12
+FICLONE = 0x40049409
+
+CHUNK_SIZE = 1 << 30
+
+# Errors that mean "this method doesn't work here", not "the copy failed"
+_UNSUPPORTED = {
+    errno.EBADF,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    errno.EXDEV,
+    errno.EPERM,
+}
+
+
+def _reflink(src_fd: int, dst_fd: int) -> bool:
+    if not sys.platform.startswith("linux"):
+        return False
+
+    import fcntl
+
+    try:
+        fcntl.ioctl(dst_fd, getattr(fcntl, "FICLONE", FICLONE), src_fd)
+
+    except OSError as exc:
+        if exc.errno in _UNSUPPORTED:
+            return False
+        raise
+
+    return True
+
+
+def _copy_range(src_fd: int, dst_fd: int, size: int) -> bool:
+    copy_file_range = getattr(os, "copy_file_range", None)
+    if copy_file_range is None:
+        return False
+
+    copied = 0
+    while copied < size:
+        try:
+            count = copy_file_range(src_fd, dst_fd, CHUNK_SIZE)
+
+        except OSError as exc:
+            # Only before the first byte, a partial copy can't switch methods
+            if copied == 0 and exc.errno in _UNSUPPORTED:
+                return False
+            raise
+
+        if count == 0:
+            break
+        copied += count
+
+    return True
+
+
+def _sendfile(src_fd: int, dst_fd: int, size: int) -> bool:
+    # Only Linux sends into regular files, elsewhere dst_fd must be a socket
+    if not sys.platform.startswith("linux"):
+        return False
+
+    copied = 0
+    while copied < size:
+        try:
+            count = os.sendfile(dst_fd, src_fd, copied, CHUNK_SIZE)
+
+        except OSError as exc:
+            if copied == 0 and exc.errno in _UNSUPPORTED:
+                return False
+            raise
+
+        if count == 0:
+            break
+        copied += count
+
+    return True
+
+
+def _read_write(src_fd: int, dst_fd: int) -> None:
+    while True:
+        chunk = os.read(src_fd, 1 << 20)
+        if not chunk:
+            break
+
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(dst_fd, view) :]
+
+
+def copy_file(src: str, dst: str, mode: int, dst_dir_fd: Optional[int] = None) -> str:
+    """
+    Copies regular file src to the new file dst, relative to dst_dir_fd if
+    given, with mode and returns the method that did the copy: reflink,
+    copy_file_range, sendfile or copy.
+    """
+
+    src_fd = os.open(src, os.O_RDONLY | os.O_NOFOLLOW)
+    try:
+        dst_fd = os.open(
+            dst,
+            os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW,
+            mode,
+            dir_fd=dst_dir_fd,
+        )
+        try:
+            size = os.fstat(src_fd).st_size
+
+            if _reflink(src_fd, dst_fd):
+                method = "reflink"
+            elif _copy_range(src_fd, dst_fd, size):
+                method = "copy_file_range"
+            elif _sendfile(src_fd, dst_fd, size):
+                method = "sendfile"
+            else:
+                _read_write(src_fd, dst_fd)
+                method = "copy"
+
+            # The umask applied at creation may have dropped bits
+            os.fchmod(dst_fd, mode)
+
+        finally:
+            os.close(dst_fd)
+
+    finally:
+        os.close(src_fd)
+
+    return method
+
+
+def _walk(
+    src: str, dst: str, dirs: List[Tuple[str, int]], files: List[Tuple[str, str, int]]
+) -> int:
+    symlinks = 0
+
+    with os.scandir(src) as entries:
+        for entry in entries:
+            target = f"{dst}/{entry.name}"
+
+            if entry.is_symlink():
+                os.symlink(os.readlink(entry.path), target)
+                symlinks += 1
+
+            elif entry.is_dir(follow_symlinks=False):
+                mode = stat.S_IMODE(entry.stat(follow_symlinks=False).st_mode)
+                # Writable until its contents are in place, see clone_tree
+                os.mkdir(target, 0o700)
+                dirs.append((target, mode))
+                symlinks += _walk(entry.path, target, dirs, files)
+
+            elif entry.is_file(follow_symlinks=False):
+                mode = stat.S_IMODE(entry.stat(follow_symlinks=False).st_mode)
+                files.append((entry.path, target, mode))
+
+            else:
+                logging.warning("warning: skipping special file %s", entry.path)
+
+    return symlinks
+
+
+def clone_tree(src: str, dst: str, hardlink: bool = False, jobs: int = 1) -> Dict:
+    """
+    Copies the tree at src to the new directory dst, preserving modes and
+    symlinks, with files copied on up to jobs threads. Returns how many
+    entries were created by each method.
+    """
+
+    dirs: List[Tuple[str, int]] = []
+    files: List[Tuple[str, str, int]] = []
+
+    with tracer.phase("clone_walk"):
+        os.mkdir(dst, 0o700)
+        dirs.append((dst, stat.S_IMODE(os.stat(src).st_mode)))
+        symlinks = _walk(src, dst, dirs, files)
+
+    def copy(item: Tuple[str, str, int]) -> str:
+        if hardlink:
+            os.link(item[0], item[1], follow_symlinks=False)
+            return "hardlink"
+
+        return copy_file(*item)
+
+    with tracer.phase("clone_copy"):
+        methods = map_ordered(copy, files, jobs=jobs)
+
+    # Deepest first, so a read-only parent doesn't block its children
+    for path, mode in reversed(dirs):
+        os.chmod(path, mode)
+
+    counts = {"dirs": len(dirs), "symlinks": symlinks}
+    for method in methods:
+        counts[method] = counts.get(method, 0) + 1
+
+    if tracer.enabled:
+        for method, count in counts.items():
+            tracer.count(f"clone_{method}", count)
+
+    return counts
+
+
+def _summarize(path: str) -> Tuple[int, int]:
+    # Entries and bytes of regular files below path, what a copy must match
+    entries, size = 0, 0
+
+    with os.scandir(path) as scanned:
+        for entry in scanned:
+            entries += 1
+
+            if entry.is_dir(follow_symlinks=False):
+                sub_entries, sub_size = _summarize(entry.path)
+                entries += sub_entries
+                size += sub_size
+
+            elif entry.is_file(follow_symlinks=False):
+                size += entry.stat(follow_symlinks=False).st_size
+
+    return entries, size
+
+
+def _copy_entry(src: str, dst: str, st: os.stat_result, jobs: int) -> None:
+    if stat.S_ISDIR(st.st_mode):
+        clone_tree(src, dst, jobs=jobs)
+
+        if _summarize(src) != _summarize(dst):
+            raise OSError(errno.EIO, "copy doesn't match its source", src, None, dst)
+
+    elif stat.S_ISLNK(st.st_mode):
+        os.symlink(os.readlink(src), dst)
+
+    elif stat.S_ISREG(st.st_mode):
+        copy_file(src, dst, stat.S_IMODE(st.st_mode))
+
+        if os.lstat(dst).st_size != st.st_size:
+            raise OSError(errno.EIO, "copy doesn't match its source", src, None, dst)
+
+    else:
+        raise OSError(errno.EOPNOTSUPP, "can't copy special file", src)
+
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns), follow_symlinks=False)
+
+
+def move(src: str, dst: str, jobs: int = 1) -> str:
+    """
+    Moves src to dst and returns how: rename, or copy when they are on
+    different filesystems. A copy is built under a temporary name next to
+    dst, compared with src and renamed into place before src is removed,
+    so a failure leaves src as it was. File contents are copied in the
+    kernel where it can, directory trees on up to jobs threads.
+    """
+
+    try:
+        os.rename(src, dst)
+        return "rename"
+
+    except OSError as exc:
+        if exc.errno != errno.EXDEV:
+            raise
+
+    logging.debug("debug: fscopy: %s and %s are on different filesystems", src, dst)
+
+    st = os.lstat(src)
+    tmp = temp_name(dst)
+
+    # fsremove is imported here, it starts processes and is slow to import
+    from punsctl.fsremove import remove_tree
+
+    with tracer.phase("move_copy"):
+        try:
+            _copy_entry(src, tmp, st, jobs)
+            os.rename(tmp, dst)
+
+        except BaseException:
+            if os.path.isdir(tmp) and not os.path.islink(tmp):
+                remove_tree(tmp)
+            elif os.path.lexists(tmp):
+                os.unlink(tmp)
+            raise
+
+    if stat.S_ISDIR(st.st_mode):
+        remove_tree(src, jobs=jobs)
+    else:
+        os.unlink(src)
+
+    if tracer.enabled:
+        tracer.count("move_copies")
+
+    return "copy"
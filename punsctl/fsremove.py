@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Recursive removal of namespace trees. Directories are opened with
+O_NOFOLLOW and emptied bottom-up with unlink/rmdir relative to their file
+descriptor, a symlink anywhere in the tree is removed, never followed.
+Trees can instead be renamed into the rootspace trash and deleted by a
+detached "python -m punsctl.fsremove" process.
+"""
+
+import os
+import stat
+import subprocess  # nosec B404
+import sys
+import time
+from typing import List
+
+from punsctl.pool import map_ordered
+from punsctl.trace import tracer
+
+__all__ = ["remove_tree", "move_to_trash", "remove_in_background"]
+
+_OPEN_DIR_FLAGS = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW
+
+
+def _unlink(name: str, dir_fd: int) -> None:
+    if tracer.enabled:
+        tracer.count("unlinks")
+
+    try:
+        os.unlink(name, dir_fd=dir_fd)
+
+    except FileNotFoundError:
+        pass
+
+
+def _remove_entry(entry: os.DirEntry, dir_fd: int, jobs: int = 1) -> None:
+    if entry.is_dir(follow_symlinks=False):
+        _remove_dir(entry.name, dir_fd, jobs)
+    else:
+        _unlink(entry.name, dir_fd)
+
+
+def _remove_contents(fd: int, jobs: int = 1) -> None:
+    # Entries can't be unlinked from a directory without write permission
+    mode = os.fstat(fd).st_mode
+    if mode & stat.S_IWUSR == 0 or mode & stat.S_IXUSR == 0:
+        os.fchmod(fd, stat.S_IMODE(mode) | stat.S_IRWXU)
+
+    with os.scandir(fd) as scanned:
+        entries: List[os.DirEntry] = list(scanned)
+
+    if jobs > 1:
+        dirs = [entry for entry in entries if entry.is_dir(follow_symlinks=False)]
+
+        # A single subdirectory passes the parallelism down to its children
+        if len(dirs) == 1:
+            for entry in entries:
+                _remove_entry(entry, fd, jobs if entry is dirs[0] else 1)
+            return
+
+    map_ordered(lambda entry: _remove_entry(entry, fd), entries, jobs=jobs)
+
+
+def _remove_dir(name: str, dir_fd: int, jobs: int = 1) -> None:
+    try:
+        fd = os.open(name, _OPEN_DIR_FLAGS, dir_fd=dir_fd)
+
+    except FileNotFoundError:
+        return
+
+    try:
+        _remove_contents(fd, jobs)
+
+    finally:
+        os.close(fd)
+
+    if tracer.enabled:
+        tracer.count("rmdirs")
+
+    try:
+        os.rmdir(name, dir_fd=dir_fd)
+
+    except FileNotFoundError:
+        pass
+
+
+def remove_tree(path: str, jobs: int = 1) -> None:
+    """
+    Removes the directory tree at path, the contents of wide directories
+    on up to jobs threads. path itself must not be a symlink.
+    """
+
+    parent, name = os.path.split(os.path.abspath(path))
+    parent_fd = os.open(parent, os.O_RDONLY | os.O_DIRECTORY)
+
+    try:
+        with tracer.phase("remove_tree"):
+            _remove_dir(name, parent_fd, jobs)
+
+    finally:
+        os.close(parent_fd)
+
+
+def move_to_trash(path: str, trash_path: str) -> str:
+    """
+    Renames path to a unique name in trash_path and returns it. trash_path
+    must be on the same filesystem as path.
+    """
+
+    os.makedirs(trash_path, mode=0o700, exist_ok=True)
+
+    target = f"{trash_path}/{os.path.basename(path)}.{os.getpid()}.{time.time_ns()}"
+    os.rename(path, target)
+
+    return target
+
+
+def remove_in_background(path: str) -> None:
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    python_path = os.environ.get("PYTHONPATH")
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = (
+        f"{package_parent}{os.pathsep}{python_path}" if python_path else package_parent
+    )
+
+    # Fixed argv running this module under sys.executable, path is passed
+    # as an argument and never to a shell
+    subprocess.Popen(  # nosec B603
+        [sys.executable, "-m", "punsctl.fsremove", path],
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+if __name__ == "__main__":
+    for arg in sys.argv[1:]:
+        remove_tree(arg)
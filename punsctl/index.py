@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Persistent inverted index of namespace entries, stored in the root path.
+It maps every top-level entry name to the namespaces that provide it.
+Each namespace is recorded with the stat of its directory, so a refresh
+only rescans namespaces whose directory changed since the index was
+written. Entries are stored unfiltered, .nsignore is applied by callers.
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from punsctl.static import CURRENT_NS_SYMLINK_NAME, INDEX_NAME
+from punsctl.trace import tracer
+
+if TYPE_CHECKING:
+    from punsctl.rootspace import RootSpace
+
+__all__ = ["EntryIndex"]
+
+INDEX_VERSION = 1
+
+
+class EntryIndex(object):
+    def __init__(self, root_space: "RootSpace"):
+        self.root_space = root_space
+        self.path = f"{root_space.get_path()}/{INDEX_NAME}"
+        self.lock = threading.Lock()
+
+        # namespace -> (directory stat key, entry name -> is a directory)
+        self.namespaces: Dict[str, Tuple[List[int], Dict[str, bool]]] = {}
+        self.providers: Dict[str, List[str]] = {}
+        self.loaded = False
+
+    def __load(self) -> None:
+        self.loaded = True
+
+        try:
+            with open(self.path) as fd:
+                data = json.load(fd)
+
+            if data.get("version") != INDEX_VERSION:
+                return
+
+            for name, (key, entries, dirs) in data["namespaces"].items():
+                self.namespaces[name] = (
+                    key,
+                    {**dict.fromkeys(entries, False), **dict.fromkeys(dirs, True)},
+                )
+
+        except FileNotFoundError:
+            pass
+
+        except (ValueError, KeyError, TypeError) as exc:
+            logging.warning(f"warning: rebuilding corrupted index {self.path}: {exc}")
+            self.namespaces = {}
+
+    def __save(self) -> None:
+        data = {
+            "version": INDEX_VERSION,
+            "namespaces": {
+                name: [
+                    key,
+                    sorted(entry for entry, is_dir in entries.items() if not is_dir),
+                    sorted(entry for entry, is_dir in entries.items() if is_dir),
+                ]
+                for name, (key, entries) in self.namespaces.items()
+            },
+        }
+
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as fd:
+                json.dump(data, fd, separators=(",", ":"))
+            os.rename(tmp, self.path)
+
+        except OSError as exc:
+            # A read-only rootspace still answers from the rebuilt index
+            logging.debug("debug: index: not saved: %s", exc)
+
+    @staticmethod
+    def __scan(path: str) -> Dict[str, bool]:
+        if tracer.enabled:
+            tracer.count("scandirs")
+
+        with os.scandir(path) as entries:
+            return {
+                entry.name: entry.is_dir(follow_symlinks=False)
+                for entry in entries
+                if entry.name != CURRENT_NS_SYMLINK_NAME
+            }
+
+    def refresh(self) -> bool:
+        """
+        Brings the index up to date and returns whether anything changed.
+        Costs a scan of the root path plus a scan of every namespace whose
+        directory changed.
+        """
+
+        with self.lock, tracer.phase("index_refresh"):
+            if not self.loaded:
+                self.__load()
+
+            changed = False
+            seen = set()
+
+            for ns_entry in self.root_space.iter_ns_entries():
+                # Not DirEntry.stat, the entry may be cached by the rootspace
+                if tracer.enabled:
+                    tracer.count("stats")
+                st = os.stat(ns_entry.path, follow_symlinks=False)
+                key = [st.st_ino, st.st_mtime_ns, st.st_ctime_ns]
+                seen.add(ns_entry.name)
+
+                cached = self.namespaces.get(ns_entry.name)
+                if cached is not None and cached[0] == key:
+                    continue
+
+                logging.debug("debug: index: rescanning %s", ns_entry.name)
+                self.namespaces[ns_entry.name] = (key, self.__scan(ns_entry.path))
+                changed = True
+
+            for name in set(self.namespaces) - seen:
+                del self.namespaces[name]
+                changed = True
+
+            if changed or not self.providers:
+                self.providers = {}
+                for name in sorted(self.namespaces):
+                    for entry in self.namespaces[name][1]:
+                        self.providers.setdefault(entry, []).append(name)
+
+            if changed:
+                self.__save()
+
+            return changed
+
+    def lookup(self, entry: str) -> List[str]:
+        """
+        Returns the namespaces providing entry, sorted by name.
+        """
+
+        self.refresh()
+
+        return list(self.providers.get(entry, []))
+
+    def get_entries(self, namespace: str) -> Optional[Dict[str, bool]]:
+        """
+        Returns entry name -> is a directory for namespace, None if it
+        doesn't exist.
+        """
+
+        self.refresh()
+
+        cached = self.namespaces.get(namespace)
+        return dict(cached[1]) if cached is not None else None
+
+    def get_namespaces(self) -> List[str]:
+        self.refresh()
+
+        return sorted(self.namespaces)
+
+    def get_all_entries(self) -> Dict[str, Dict[str, bool]]:
+        """
+        Returns namespace -> entry name -> is a directory for every
+        namespace, after a single refresh.
+        """
+
+        self.refresh()
+
+        return {name: dict(entries) for name, (_, entries) in self.namespaces.items()}
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import json
+import sys
+from pathlib import Path
+from typing import Optional, TextIO
+
+from punsctl.rootspace import RootSpace
+
+__all__ = ["LIST_FORMATS", "write_namespaces"]
+
+LIST_FORMATS = ("text", "json", "nul")
+
+
+def format_namespace(name: str, path: Path, active: bool, fmt: str) -> str:
+    if fmt == "json":
+        return json.dumps({"name": name, "path": str(path), "active": active}) + "\n"
+
+    if fmt == "nul":
+        return f"{name}\0"
+
+    return f"{name} ({path}) {'active' if active else ''}\n"
+
+
+def write_namespaces(
+    root_space: RootSpace,
+    fmt: str = "text",
+    pattern: Optional[str] = None,
+    stream: Optional[TextIO] = None,
+) -> int:
+    """
+    Writes the namespaces of root_space to stream and returns their count.
+    The active namespace is resolved once with a single readlink. Machine
+    readable formats are streamed in directory order as entries are read,
+    the text format is sorted by name.
+    """
+
+    stream = stream if stream is not None else sys.stdout
+    current = root_space.get_current_ns_target()
+
+    entries = root_space.iter_ns_entries(pattern=pattern)
+    if fmt == "text":
+        entries = iter(sorted(entries, key=lambda entry: entry.name))
+
+    count = 0
+    for entry in entries:
+        path = Path(f"{root_space.get_path()}/{entry.name}")
+        stream.write(
+            format_namespace(entry.name, path.absolute(), path == current, fmt)
+        )
+        count += 1
+
+    return count
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import fcntl
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from punsctl.exceptions import RootSpaceException
+from punsctl.trace import tracer
+
+__all__ = ["LOCK_POLL_INTERVAL", "lock_file"]
+
+LOCK_POLL_INTERVAL = 0.01
+LOCK_POLL_MAX_INTERVAL = 0.2
+
+
+@contextmanager
+def lock_file(
+    path: str, shared: bool = False, timeout: Optional[float] = None
+) -> Iterator[None]:
+    """
+    Holds an flock on path, created if missing, for the duration of the
+    block. Shared locks don't block each other, an exclusive lock waits for
+    every other holder. timeout None blocks until the lock is granted, 0
+    fails at once and anything else polls for up to that many seconds.
+    """
+
+    operation = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+    kind = "shared" if shared else "exclusive"
+
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+
+    except PermissionError as exc:
+        # Readers of a rootspace they can't write to lock the existing file
+        if not shared or not os.path.exists(path):
+            raise RootSpaceException(message=f"{exc.strerror}: {path}")
+
+        fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+
+    try:
+        with tracer.phase("lock_wait"):
+            if timeout is None:
+                fcntl.flock(fd, operation)
+            else:
+                _poll(fd, operation, timeout, kind)
+
+        yield
+
+    finally:
+        # Closing the descriptor releases the lock
+        os.close(fd)
+
+
+def _poll(fd: int, operation: int, timeout: float, kind: str) -> None:
+    deadline = time.monotonic() + timeout
+    interval = LOCK_POLL_INTERVAL
+
+    while True:
+        try:
+            fcntl.flock(fd, operation | fcntl.LOCK_NB)
+            return
+
+        except BlockingIOError:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RootSpaceException(
+                    message=f"timed out waiting for an {kind} rootspace lock"
+                )
+
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, LOCK_POLL_MAX_INTERVAL)
@@ -13,22 +13,31 @@
 # ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
 # OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
+import atexit
 import logging
 import os
 import sys
 from pathlib import Path
 from typing import List, Tuple
 
+from punsctl.batch import run_batch
+from punsctl.client import call, get_socket_path
+from punsctl.current import main as current
 from punsctl.exceptions import main_exception_handler
-from punsctl.namespace import Namespace
+from punsctl.execns import run_in_namespace
+from punsctl.listing import LIST_FORMATS
+from punsctl.ops import execute
 from punsctl.rootspace import RootSpace
 from punsctl.sgetopt import sgetopt
+from punsctl.shell import SHELLS, render
 from punsctl.static import (
+    DEFAULT_JOBS,
     DEFAULT_ROOTSPACE_PATH,
     DEFAULT_SYMLINK_PATH,
     SGETOPT_STRING,
     USAGE,
 )
+from punsctl.trace import tracer
 
 handler = logging.StreamHandler(sys.stdout)
 handler.setFormatter(logging.Formatter("%(message)s"))
@@ -37,10 +46,11 @@ logger = logging.getLogger()
 logger.addHandler(handler)
 
 
+# argv is read when main() is called, or passed as main(["-l"])
 @main_exception_handler
-@sgetopt(args=sys.argv[1:], optstring=SGETOPT_STRING)
+@sgetopt(args=None, optstring=SGETOPT_STRING)
 def main(opts: List[Tuple], argv: List[str]) -> None:
-    if len(opts) == 0:
+    if len(opts) == 0 and len(argv) == 0:
         sys.exit(USAGE)
 
     opt_list = False
@@ -51,7 +61,22 @@ def main(opts: List[Tuple], argv: List[str]) -> None:
     opt_create = None
     opt_delete = None
     opt_deactivate = False
+    opt_switch = None
+    opt_dry_run = False
+    opt_atomic = False
+    opt_jobs = DEFAULT_JOBS
+    opt_tree = False
+    opt_indirect = False
+    opt_store = False
+    opt_format = "text"
+    opt_stop_on_error = False
+    opt_hardlink = False
+    opt_recursive = False
+    opt_trash = False
+    opt_lock_timeout = None
+    opt_processes = None
     opt_verbose = False
+    opt_trace = os.environ.get("NS_TRACE", "") != ""
 
     verbose_level = 0
 
@@ -63,6 +88,9 @@ def main(opts: List[Tuple], argv: List[str]) -> None:
             opt_verbose = True
             verbose_level += 1
 
+        elif opt == "-t":
+            opt_trace = True
+
         elif opt == "-l":
             opt_list = True
 
@@ -84,57 +112,244 @@ def main(opts: List[Tuple], argv: List[str]) -> None:
         elif opt == "-a":
             opt_activate = arg if arg is not None else sys.exit(USAGE)
 
+        elif opt == "-w":
+            opt_switch = arg if arg is not None else sys.exit(USAGE)
+
+        elif opt == "-W":
+            try:
+                opt_lock_timeout = float(arg)
+
+            except (TypeError, ValueError):
+                sys.exit(USAGE)
+
+            if opt_lock_timeout < 0:
+                sys.exit(USAGE)
+
+        elif opt == "-P":
+            if arg is None or not arg.isdigit() or int(arg) < 1:
+                sys.exit(USAGE)
+
+            opt_processes = int(arg)
+
+        elif opt == "-R":
+            opt_recursive = True
+
+        elif opt == "-b":
+            opt_trash = True
+
+        elif opt == "-L":
+            opt_hardlink = True
+
+        elif opt == "-e":
+            opt_stop_on_error = True
+
+        elif opt == "-N":
+            opt_dry_run = True
+
+        elif opt == "-A":
+            opt_atomic = True
+
+        elif opt == "-T":
+            opt_tree = True
+
+        elif opt == "-I":
+            opt_indirect = True
+
+        elif opt == "-B":
+            opt_store = True
+
+        elif opt == "-f":
+            if arg not in LIST_FORMATS:
+                sys.exit(USAGE)
+
+            opt_format = arg
+
+        elif opt == "-j":
+            if arg is None or not arg.isdigit() or int(arg) < 1:
+                sys.exit(USAGE)
+
+            opt_jobs = int(arg)
+
         else:
             sys.exit(USAGE)
 
     if opt_verbose:
         if verbose_level >= 1:
             logger.setLevel(logging.DEBUG)
-            logging.debug(f"debug: sgetopt opts: {opts}")
-            logging.debug(f"debug: sgetopt argv: {argv}")
+            logging.debug("debug: sgetopt opts: %s", opts)
+            logging.debug("debug: sgetopt argv: %s", argv)
 
-    root_space = RootSpace(
-        path=Path(opt_root_path), symlink_path=Path(opt_symlink_path)
-    )
+    if opt_trace:
+        tracer.enable()
+        atexit.register(tracer.dump)
 
-    root_space.check()
+    command = argv[0] if len(argv) > 0 and not opt_list else None
 
-    if opt_list:
-        for namespace in root_space.get_all_ns_paths():
-            ns = Namespace(
-                name=namespace.name,
-                root_space=root_space,
-            )
+    if command == "current":
+        sys.exit(current(symlink_path=opt_symlink_path))
+
+    if command == "init":
+        if len(argv) != 2 or argv[1] not in SHELLS:
+            sys.exit(USAGE)
+
+        sys.stdout.write(render(argv[1], opt_symlink_path))
+        return
+
+    if command == "daemon":
+        RootSpace(path=Path(opt_root_path), symlink_path=Path(opt_symlink_path)).check()
+        # socketserver and threading are only imported by the daemon itself
+        from punsctl.daemon import serve
+
+        serve(opt_root_path)
+        return
+
+    options = {
+        # Resolved here, a daemon would resolve it against its own cwd
+        "symlink_path": os.path.abspath(opt_symlink_path),
+        "atomic": opt_atomic,
+        "jobs": opt_jobs,
+        "tree": opt_tree,
+        "indirect": opt_indirect,
+        "store": opt_store,
+        "dry_run": opt_dry_run,
+        "lock_timeout": opt_lock_timeout,
+    }
+
+    if command == "batch":
+        if len(argv) > 2:
+            sys.exit(USAGE)
+
+        root_space = RootSpace(
+            path=Path(opt_root_path), symlink_path=Path(opt_symlink_path)
+        )
+        # Results are JSON lines on stdout, warnings go into them instead
+        logger.removeHandler(handler)
+
+        if len(argv) == 1 or argv[1] == "-":
+            failed = run_batch(root_space, sys.stdin, options, opt_stop_on_error)
+        else:
+            with open(argv[1]) as lines:
+                failed = run_batch(root_space, lines, options, opt_stop_on_error)
+
+        if failed > 0:
+            sys.exit(1)
+        return
+
+    if command == "fleet":
+        if len(argv) > 2:
+            sys.exit(USAGE)
 
-            sys.stdout.write(
-                f"{namespace.name} ({namespace.absolute()}) "
-                f"{'active' if ns.active() else ''}\n"
+        # concurrent.futures and multiprocessing are only imported for a fleet
+        from punsctl.fleet import run_fleet
+
+        # Every target names its own symlink path
+        defaults = {
+            key: value for key, value in options.items() if key != "symlink_path"
+        }
+        logger.removeHandler(handler)
+
+        if len(argv) == 1 or argv[1] == "-":
+            failed = run_fleet(sys.stdin, defaults, opt_processes)
+        else:
+            with open(argv[1]) as lines:
+                failed = run_fleet(lines, defaults, opt_processes)
+
+        if failed > 0:
+            sys.exit(1)
+        return
+
+    if command == "exec":
+        if len(argv) < 3:
+            sys.exit(USAGE)
+
+        sys.exit(
+            run_in_namespace(
+                Path(opt_root_path),
+                argv[1],
+                argv[2:],
+                atomic=opt_atomic,
+                jobs=opt_jobs,
+                tree=opt_tree,
+                lock_timeout=opt_lock_timeout,
             )
+        )
 
-    elif opt_create is not None:
-        ns = Namespace(name=opt_create, root_space=root_space)
+    if command == "clone":
+        if len(argv) != 3:
+            sys.exit(USAGE)
 
-        ns.create()
-        sys.stdout.write(f"info: {opt_create} created\n")
+        request = {
+            "op": "clone",
+            "namespace": argv[1],
+            "target": argv[2],
+            "hardlink": opt_hardlink,
+        }
 
-    elif opt_delete is not None:
-        ns = Namespace(name=opt_delete, root_space=root_space)
+    elif command == "which":
+        if len(argv) != 2:
+            sys.exit(USAGE)
+
+        request = {"op": "which", "entry": argv[1], "format": opt_format}
+
+    elif command in ("check", "repair"):
+        if len(argv) != 1:
+            sys.exit(USAGE)
+
+        request = {"op": command, "format": opt_format}
+
+    elif command == "gc":
+        if len(argv) != 1:
+            sys.exit(USAGE)
 
-        ns.remove()
-        sys.stdout.write(f"info: {opt_delete} removed\n")
+        request = {"op": "gc"}
+
+    elif opt_list:
+        request = {
+            "op": "list",
+            "format": opt_format,
+            "pattern": argv[0] if len(argv) > 0 else None,
+        }
+
+    elif opt_create is not None:
+        request = {"op": "create", "namespace": opt_create}
+
+    elif opt_delete is not None:
+        request = {
+            "op": "remove",
+            "namespace": opt_delete,
+            "recursive": opt_recursive,
+            "deactivate": opt_deactivate,
+            "trash": opt_trash,
+        }
 
     elif opt_activate is not None:
-        ns = Namespace(name=opt_activate, root_space=root_space)
+        request = {"op": "activate", "namespace": opt_activate}
 
-        ns.activate()
-        sys.stdout.write(f"info: {opt_activate} activated\n")
+    elif opt_switch is not None:
+        request = {"op": "switch", "namespace": opt_switch}
 
     elif opt_deactivate:
-        for namespace in root_space.get_all_ns_paths():
-            ns = Namespace(name=namespace.name, root_space=root_space)
-            ns.deactivate()
-
-        sys.stdout.write("info: namespaces are deactivated successfully\n")
+        request = {"op": "deactivate"}
 
     else:
         sys.exit(USAGE)
+
+    request.update(options)
+
+    # Traced runs stay in-process, the timings are of this process
+    if not opt_trace and os.environ.get("NS_NO_DAEMON", "") == "":
+        response = call(get_socket_path(opt_root_path), request)
+
+        if response is not None:
+            sys.stdout.write(response["output"])
+
+            if not response["ok"]:
+                sys.exit(response["error"])
+
+            sys.exit(response.get("status", 0))
+
+    root_space = RootSpace(
+        path=Path(opt_root_path), symlink_path=Path(opt_symlink_path)
+    )
+
+    sys.exit(execute(root_space, request))
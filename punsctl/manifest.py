@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+__all__ = ["Manifest"]
+
+
+class Manifest(object):
+    def __init__(
+        self,
+        namespace: str,
+        links: Optional[List[str]] = None,
+        backups: Optional[Dict[str, str]] = None,
+    ):
+        self.namespace = namespace
+        self.links = links if links is not None else []
+        self.backups = backups if backups is not None else {}
+
+    def add_link(self, name: str, backup: Optional[str] = None) -> None:
+        self.links.append(name)
+
+        if backup is not None:
+            self.backups[name] = backup
+
+    def discard_link(self, name: str) -> None:
+        if name in self.links:
+            self.links.remove(name)
+
+        self.backups.pop(name, None)
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {"namespace": self.namespace, "links": self.links, "backups": self.backups},
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, data: str) -> "Manifest":
+        manifest = json.loads(data)
+
+        return cls(
+            namespace=manifest["namespace"],
+            links=list(manifest.get("links", [])),
+            backups=dict(manifest.get("backups", {})),
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["Manifest"]:
+        try:
+            with open(path) as fd:
+                return cls.from_json(fd.read())
+
+        except FileNotFoundError:
+            return None
+
+        except (ValueError, KeyError, TypeError) as exc:
+            logging.warning(f"warning: ignoring corrupted manifest {path}: {exc}")
+            return None
+
+    def dump(self, name: str, dir_fd: int) -> None:
+        tmp_name = f"{name}.tmp"
+
+        fd = os.open(
+            tmp_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644, dir_fd=dir_fd
+        )
+        with os.fdopen(fd, "w") as manifest:
+            manifest.write(self.to_json())
+
+        os.rename(tmp_name, name, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
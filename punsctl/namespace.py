@@ -14,13 +14,25 @@
 # OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
 import logging
-from os import mkdir, readlink, rmdir
+import os
+import shutil
+import stat
+from os import DirEntry, mkdir, readlink, rmdir
 from pathlib import Path
-from typing import List
-
-from punsctl.exceptions import NamespaceException, fs_ops_exception_handler
+from typing import Dict, Iterable, Optional, Tuple
+
+from punsctl.atomic import temp_name
+from punsctl.exceptions import NamespaceException
+from punsctl.fscopy import clone_tree
+from punsctl.fsremove import move_to_trash, remove_in_background, remove_tree
+from punsctl.manifest import Manifest
+from punsctl.nsignore import NsIgnore
+from punsctl.plan import Plan
+from punsctl.pool import map_ordered
 from punsctl.rootspace import RootSpace
-from punsctl.static import CURRENT_NS_SYMLINK_NAME, DEFAULT_NAMESPACE_MKDIR_MODE
+from punsctl.static import DEFAULT_NAMESPACE_MKDIR_MODE
+from punsctl.store import STORE_BACKUP
+from punsctl.trace import tracer
 
 __all__ = ["Namespace"]
 
@@ -30,16 +42,29 @@ class Namespace(object):
         self,
         name: str,
         root_space: RootSpace,
+        atomic: bool = False,
+        jobs: int = 1,
+        tree: bool = False,
+        indirect: bool = False,
+        store: bool = False,
     ):
         self.name = name
         self.root_space = root_space
+        self.atomic = atomic
+        self.jobs = jobs
+        self.tree = tree
+        self.indirect = indirect
+        self.store = store
+        self.backup_store = root_space.get_backup_store()
+        self.active_memo: Optional[bool] = None
+        self.store_memo: Optional[Dict[str, str]] = None
 
         self.symlink_path = root_space.get_symlink_path()
         self.current_ns_path = root_space.get_current_ns_path()
         self.path = Path(f"{root_space.get_path()}/{name}")
 
-        logging.debug(f"debug: namespace: name: {self.name}")
-        logging.debug(f"debug: namespace: path: {self.path}")
+        logging.debug("debug: namespace: name: %s", self.name)
+        logging.debug("debug: namespace: path: %s", self.path)
 
     def create(self) -> None:
         try:
@@ -48,10 +73,69 @@ class Namespace(object):
         except OSError as exc:
             raise NamespaceException(message=exc.strerror)
 
-    def remove(self) -> None:
+    def clone(self, name: str, hardlink: bool = False) -> Dict[str, int]:
+        """
+        Copies this namespace to the new namespace name. The copy is built
+        under a temporary name in the root path and renamed into place, a
+        failed clone leaves nothing behind.
+        """
+
+        target = Path(f"{self.root_space.get_path()}/{name}")
+
+        if not self.exists():
+            raise NamespaceException(message=f"{self.name} doesn't exist")
+
+        if target.exists():
+            raise NamespaceException(message=f"{name} already exists")
+
+        tmp = temp_name(str(target))
+        logging.debug("debug: namespace: cloning %s to %s", self.path, tmp)
+
         try:
-            if self.exists():
-                logging.debug(f"debug: mkdir: {self.path}")
+            counts = clone_tree(str(self.path), tmp, hardlink=hardlink, jobs=self.jobs)
+            os.rename(tmp, target)
+
+        except OSError as exc:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise NamespaceException(message=f"{exc.strerror}: {exc.filename}")
+
+        return counts
+
+    def remove(
+        self, recursive: bool = False, deactivate: bool = False, trash: bool = False
+    ) -> None:
+        """
+        Removes the namespace directory, with its contents when recursive.
+        An active namespace is deactivated first if deactivate is set,
+        otherwise it is refused. With trash the directory is moved into
+        the rootspace trash and deleted by a background process.
+        """
+
+        if self.active():
+            if not deactivate:
+                raise NamespaceException(
+                    message=f"{self.name} is active, deactivate it first"
+                )
+
+            self.deactivate()
+
+        try:
+            if not self.exists():
+                return
+
+            if trash:
+                path = move_to_trash(
+                    str(self.path), str(self.root_space.get_trash_path())
+                )
+                logging.debug("debug: namespace: trashed %s as %s", self.path, path)
+                remove_in_background(path)
+
+            elif recursive:
+                logging.debug("debug: namespace: removing tree %s", self.path)
+                remove_tree(str(self.path), jobs=self.jobs)
+
+            else:
+                logging.debug("debug: rmdir: %s", self.path)
                 rmdir(self.path)
 
         except OSError as exc:
@@ -63,13 +147,8 @@ class Namespace(object):
 
         return True
 
-    def load_nsignore(self) -> List[str]:
-        ns_ignore = Path(f"{self.path}/.nsignore")
-        if ns_ignore.exists() and ns_ignore.is_file():
-            with open(ns_ignore) as fd:
-                return [line.rstrip() for line in fd]
-
-        return []
+    def load_nsignore(self) -> NsIgnore:
+        return self.root_space.get_nsignore(Path(f"{self.path}/.nsignore"))
 
     def get_path(self) -> Path:
         return self.path
@@ -89,112 +168,459 @@ class Namespace(object):
     def get_namespace_path(self) -> Path:
         return self.path
 
-    def __get_sources(self) -> List[Path]:
-        sources = []
+    @staticmethod
+    def __scan(path: Path, prefix: str = "") -> Dict[str, DirEntry]:
+        if tracer.enabled:
+            tracer.count("scandirs")
 
-        for source in self.path.iterdir():
-            if source.name == self.current_ns_path.name:
-                continue
-            sources.append(source)
+        with os.scandir(path) as entries:
+            if not prefix:
+                return {entry.name: entry for entry in entries}
+
+            return {f"{prefix}/{entry.name}": entry for entry in entries}
+
+    def __get_sources(self, prefix: str = "") -> Dict[str, DirEntry]:
+        if prefix:
+            return self.__scan(self.__get_source(prefix), prefix=prefix)
+
+        sources = self.__scan(self.path)
+        sources.pop(self.current_ns_path.name, None)
 
         return sources
 
-    @staticmethod
-    @fs_ops_exception_handler
-    def __rename_path(path: Path, target: Path) -> None:
-        path.rename(target)
+    def __get_targets(self, prefix: str = "") -> Dict[str, DirEntry]:
+        if prefix:
+            return self.__scan(Path(f"{self.symlink_path}/{prefix}"), prefix=prefix)
 
-    @staticmethod
-    @fs_ops_exception_handler
-    def __symlink_path(target: Path, source: Path) -> None:
-        target.symlink_to(source)
+        return self.__scan(self.symlink_path)
+
+    def __open_symlink_dir(self) -> int:
+        return os.open(self.symlink_path, os.O_RDONLY | os.O_DIRECTORY)
 
     @staticmethod
-    @fs_ops_exception_handler
-    def __unlink_path(symlink: Path) -> None:
-        symlink.unlink()
+    def __readlinkat(name: str, dir_fd: int) -> Path:
+        if tracer.enabled:
+            tracer.count("readlinks")
 
-    def activate(self) -> None:
-        logging.debug(f"debug: namespace: activating {self.name} namespace")
-        logging.debug(f"debug: namespace: checking if {self.name} namespace exists")
+        return Path(readlink(name, dir_fd=dir_fd))
+
+    def __get_source(self, name: str) -> Path:
+        return Path(f"{self.path}/{name}")
+
+    def __get_backup_name(self, name: str) -> str:
+        return f"{name}.{self.name}.bak"
+
+    def __get_store_key(self, name: str) -> str:
+        return f"{self.symlink_path}/{name}"
+
+    def __owns_stored(self, name: str) -> bool:
+        # Only the namespace that displaced the latest backup of a path
+        # restores it, so each backup is restored once, by its owner
+        # The store index is read once per plan, not once per entry
+        if self.store_memo is None:
+            self.store_memo = self.backup_store.get_owners()
+
+        owner = self.store_memo.get(self.__get_store_key(name))
+
+        return owner is not None and owner in ("", self.name)
+
+    def __get_backup(self, name: str, targets: Dict[str, DirEntry]) -> Optional[str]:
+        backup = self.__get_backup_name(name)
+
+        entry = targets.get(backup)
+        if entry is not None and not entry.is_symlink():
+            return backup
+
+        if self.__owns_stored(name):
+            return STORE_BACKUP
+
+        return None
+
+    def __read_links(
+        self, names: Iterable[str], targets: Dict[str, DirEntry]
+    ) -> Dict[str, Path]:
+        symlinks = [
+            name for name in names if name in targets and targets[name].is_symlink()
+        ]
+
+        dir_fd = self.__open_symlink_dir()
+        try:
+            links = map_ordered(
+                lambda name: self.__readlinkat(name, dir_fd), symlinks, jobs=self.jobs
+            )
+
+        finally:
+            os.close(dir_fd)
+
+        return dict(zip(symlinks, links))
+
+    def __get_indirect_source(self, name: str) -> Path:
+        return Path(f"{self.current_ns_path}/{name}")
+
+    def __get_link_target(self, name: str) -> Path:
+        # Indirect links resolve through .current_ns, whichever namespace it
+        # points at, so a switch doesn't have to touch them
+        if self.indirect:
+            return self.__get_indirect_source(name)
+
+        return self.__get_source(name)
+
+    def __is_own_link(self, name: str, link: Optional[Path]) -> bool:
+        if link == self.__get_source(name):
+            return True
+
+        return link == self.__get_indirect_source(name) and self.__active_memo()
+
+    def __owns(self, name: str, links: Dict[str, Path]) -> bool:
+        return self.__is_own_link(name, links.get(name))
+
+    def __new_plan(self, manifest: Optional[Manifest] = None) -> Plan:
+        self.active_memo = None
+        self.store_memo = None
+
+        return Plan(
+            symlink_path=self.symlink_path,
+            manifest=manifest,
+            atomic=self.atomic,
+            jobs=self.jobs,
+            store=self.backup_store,
+            namespace=self.name,
+        )
+
+    def __check_exists(self) -> None:
+        logging.debug("debug: namespace: checking if %s namespace exists", self.name)
 
         if not self.exists():
             raise NamespaceException(
                 message=f"{self.name} ({self.path}) doesn't exists"
             )
 
-        logging.debug("debug: namespace: checking if .current_ns exists")
-        if self.current_ns_path.exists() and self.current_ns_path.is_symlink():
-            if Path(readlink(self.current_ns_path)) == self.path:
-                pass
+    def __get_linkable_sources(self, prefix: str = "") -> Dict[str, DirEntry]:
+        logging.debug("debug: namespace: loading .nsignore")
+        nsignore = self.load_nsignore()
+        logging.debug("debug: namespace: .nsignore: %s", nsignore)
+
+        return {
+            name: entry
+            for name, entry in sorted(self.__get_sources(prefix).items())
+            if not nsignore.match(name, is_dir=entry.is_dir(follow_symlinks=False))
+        }
+
+    def __unfolds(self, source: DirEntry, target: Optional[DirEntry]) -> bool:
+        # Tree mode links into an existing real directory entry by entry
+        # instead of backing the whole directory up
+        return (
+            self.tree
+            and target is not None
+            and not target.is_symlink()
+            and target.is_dir(follow_symlinks=False)
+            and source.is_dir(follow_symlinks=False)
+        )
+
+    def __plan_tree(self, plan: Plan, prefix: str = "", unlink: bool = False) -> None:
+        sources = self.__get_linkable_sources(prefix)
+        targets = self.__get_targets(prefix)
+        links = self.__read_links(sources, targets)
+
+        for name, source in sources.items():
+            if self.__unfolds(source, targets.get(name)):
+                logging.debug("debug: namespace: unfolding %s", name)
+                self.__plan_tree(plan, prefix=name, unlink=unlink)
+
+            elif unlink:
+                self.__plan_unlink(plan, name, targets, links)
 
             else:
+                self.__plan_link(plan, name, targets, links)
+
+    def __plan_link(
+        self,
+        plan: Plan,
+        name: str,
+        targets: Dict[str, DirEntry],
+        links: Dict[str, Path],
+    ) -> None:
+        source = self.__get_source(name)
+        logging.debug("debug: namespace: processing %s", source)
+
+        target = targets.get(name)
+        if target is not None:
+            if target.is_symlink():
+                if self.__owns(name, links):
+                    logging.debug(
+                        "debug: namespace: source %s link exists, skipping ...",
+                        source,
+                    )
+                    # Linked by an activation in the other link mode
+                    if links[name] != self.__get_link_target(name):
+                        plan.retarget(name, self.__get_link_target(name))
+
+                    plan.keep(name, backup=self.__get_backup(name, targets))
+                    return
+
+                if tracer.enabled:
+                    tracer.count("stats")
+
+                if not os.path.exists(target.path):
+                    return
+
+            if self.store:
+                plan.link(name, self.__get_link_target(name), backup=STORE_BACKUP)
+                return
+
+            backup = self.__get_backup_name(name)
+            if backup in targets:
+                return
+
+            plan.link(name, self.__get_link_target(name), backup=backup)
+            return
+
+        plan.link(name, self.__get_link_target(name))
+
+    def __plan_unlink(
+        self,
+        plan: Plan,
+        name: str,
+        targets: Dict[str, DirEntry],
+        links: Dict[str, Path],
+    ) -> None:
+        logging.debug("debug: namespace: processing %s", self.__get_source(name))
+
+        linked = name in targets
+        if linked and not self.__owns(name, links):
+            return
+
+        backup = self.__get_backup(name, targets)
+        if backup is not None:
+            plan.restore(name, backup, linked=linked, namespace=self.name)
+
+        elif linked:
+            plan.unlink(name)
+
+    def __active(self) -> bool:
+        try:
+            return Path(readlink(self.current_ns_path)) == self.path
+
+        except OSError:
+            return False
+
+    def __active_memo(self) -> bool:
+        # Asked once per indirect link, answered once per plan
+        if self.active_memo is None:
+            self.active_memo = self.__active()
+
+        return self.active_memo
+
+    def __probe_manifest_link(
+        self, name: str, backup: Optional[str], dir_fd: int
+    ) -> Tuple[bool, Optional[Path], Optional[str]]:
+        if tracer.enabled:
+            tracer.count("readlinks")
+            tracer.count("stats", 0 if backup in (None, STORE_BACKUP) else 1)
+
+        try:
+            link = Path(readlink(name, dir_fd=dir_fd))
+
+        except FileNotFoundError:
+            link = None
+
+        except OSError:
+            # Replaced by a regular file or directory since activation
+            return False, None, None
+
+        if backup == STORE_BACKUP:
+            if not self.__owns_stored(name):
+                backup = None
+
+        elif backup is not None:
+            try:
+                if stat.S_ISLNK(os.lstat(backup, dir_fd=dir_fd).st_mode):
+                    backup = None
+
+            except FileNotFoundError:
+                backup = None
+
+        return True, link, backup
+
+    def __plan_unlink_manifest(self, plan: Plan, manifest: Manifest) -> None:
+        dir_fd = self.__open_symlink_dir()
+        try:
+            probes = map_ordered(
+                lambda name: self.__probe_manifest_link(
+                    name, manifest.backups.get(name), dir_fd
+                ),
+                manifest.links,
+                jobs=self.jobs,
+            )
+
+        finally:
+            os.close(dir_fd)
+
+        for name, (free, link, backup) in zip(manifest.links, probes):
+            logging.debug("debug: namespace: processing %s", name)
+
+            if not free:
+                continue
+
+            if link is not None and link not in (
+                self.__get_source(name),
+                self.__get_indirect_source(name),
+            ):
+                continue
+
+            if backup is not None:
+                plan.restore(name, backup, linked=link is not None, namespace=self.name)
+
+            elif link is not None:
+                plan.unlink(name)
+
+    def plan_activate(self) -> Plan:
+        logging.debug("debug: namespace: planning %s activation", self.name)
+        self.__check_exists()
+
+        plan = self.__new_plan(manifest=Manifest(self.name))
+
+        logging.debug("debug: namespace: checking if .current_ns exists")
+        if self.current_ns_path.exists() and self.current_ns_path.is_symlink():
+            if Path(readlink(self.current_ns_path)) != self.path:
                 raise NamespaceException(
                     message=(
                         f"{self.root_space.get_current_ns_name()} "
                         f"namespace is already activated"
                     )
                 )
+        elif os.path.lexists(self.current_ns_path):
+            # Checked before anything is linked, a failed .current_ns would
+            # leave links and a manifest behind under no active namespace
+            if self.current_ns_path.is_symlink():
+                raise NamespaceException(
+                    message=(
+                        f"{self.current_ns_path} points at a removed namespace "
+                        f"({readlink(self.current_ns_path)}), run repair"
+                    )
+                )
+            raise NamespaceException(
+                message=f"{self.current_ns_path} exists and is not a symlink"
+            )
         else:
-            self.current_ns_path.symlink_to(self.path)
+            plan.symlink(self.current_ns_path.name, self.path)
 
-        logging.debug("debug: namespace: loading .nsignore")
-        nsignore = self.load_nsignore()
-        logging.debug(f"debug: namespace: .nsignore: {nsignore}")
+        with tracer.phase("scan"):
+            self.__plan_tree(plan)
 
-        for source in self.__get_sources():
-            logging.debug(f"debug: namespace: processing {source}")
+        return plan
 
-            if source.name == CURRENT_NS_SYMLINK_NAME:
-                logging.debug(f"debug: namespace: ignoring {source.name}")
+    def plan_deactivate(self) -> Plan:
+        logging.debug("debug: namespace: planning %s deactivation", self.name)
 
-                continue
+        plan = self.__new_plan()
 
-            if source.name in nsignore:
-                logging.debug(f"debug: namespace: ignoring {source}")
-                continue
+        manifest = self.root_space.load_manifest()
+        if manifest is not None and manifest.namespace == self.name:
+            logging.debug("debug: namespace: replaying manifest")
+            with tracer.phase("scan"):
+                self.__plan_unlink_manifest(plan, manifest)
+            plan.unlink(self.root_space.get_manifest_path().name)
 
-            target = Path(f"{self.symlink_path}/{source.name}")
-            if target.exists():
-                if target.is_symlink() and Path(readlink(target)) == source:
-                    logging.debug(
-                        f"debug: namespace: source {source} "
-                        f"link exists, skipping ..."
-                    )
+            if self.__active():
+                plan.unlink(self.current_ns_path.name)
 
-                    continue
+            return plan
 
-                backup = target.with_name(f"{target.name}.{self.name}.bak")
-                if not backup.exists():
-                    logging.debug(f"debug: namespace: rename {target} -> {backup}")
-                    self.__rename_path(path=target, target=backup)
+        if not self.exists():
+            return plan
 
-                else:
-                    continue
+        with tracer.phase("scan"):
+            self.__plan_tree(plan, unlink=True)
 
-            if not target.is_symlink():
-                logging.debug(f"debug: namespace: symlink {target} -> {source}")
-                self.__symlink_path(target=target, source=source)
+        if self.current_ns_path.exists() and self.current_ns_path.is_symlink():
+            if Path(readlink(self.current_ns_path)) == self.path:
+                plan.unlink(self.current_ns_path.name)
+
+                if manifest is not None:
+                    plan.unlink(self.root_space.get_manifest_path().name)
+
+        return plan
+
+    def plan_switch(self) -> Plan:
+        current_ns_name = self.root_space.get_current_ns_name()
+        if current_ns_name is None or current_ns_name == self.name:
+            return self.plan_activate()
+
+        logging.debug(
+            "debug: namespace: planning switch %s -> %s", current_ns_name, self.name
+        )
+        self.__check_exists()
+
+        current = Namespace(
+            name=current_ns_name,
+            root_space=self.root_space,
+            atomic=self.atomic,
+            jobs=self.jobs,
+            tree=self.tree,
+            indirect=self.indirect,
+            store=self.store,
+        )
+
+        if self.tree:
+            # Which directories unfold depends on the state left behind by
+            # the deactivation, so the activation is planned after it.
+            plan = current.plan_deactivate()
+            plan.then(f"activate {self.name}", self.plan_activate)
+
+            return plan
+
+        plan = self.__new_plan(manifest=Manifest(self.name))
+
+        if self.indirect:
+            # Every indirect link resolves through .current_ns, unlinking it
+            # first would leave them all dangling until the new link exists
+            plan.replace(self.current_ns_path.name, self.path)
+        else:
+            plan.retarget(self.current_ns_path.name, self.path)
+
+        names = set(self.__get_linkable_sources())
+        current_names = (
+            set(current.__get_linkable_sources()) if current.exists() else set()
+        )
+        with tracer.phase("scan"):
+            targets = self.__scan(self.symlink_path)
+            links = self.__read_links(names | current_names, targets)
+
+        for name in sorted(names | current_names):
+            if name not in names:
+                current.__plan_unlink(plan, name, targets, links)
+                continue
 
-    def deactivate(self) -> None:
-        for source in self.__get_sources():
-            logging.debug(f"debug: namespace: processing {source}")
+            if not current.__owns(name, links):
+                self.__plan_link(plan, name, targets, links)
+                continue
 
-            target = Path(f"{self.symlink_path}/{source.name}")
-            if target.exists():
-                if target.is_symlink() and Path(readlink(target)) == source:
-                    logging.debug(f"debug: namespace: unlink {target}")
-                    self.__unlink_path(symlink=target)
+            # Shared entry: retarget the link and hand the backup over
+            backup = self.__get_backup(name, targets)
+            current_backup = current.__get_backup(name, targets)
+            if backup is None and current_backup == STORE_BACKUP:
+                plan.hand_over(name, current.name)
+                backup = STORE_BACKUP
 
-                backup = target.with_name(f"{target.name}.{self.name}.bak")
-                if backup.exists() and not backup.is_symlink():
-                    if target.exists():
-                        continue
+            elif backup is None and current_backup is not None:
+                backup = self.__get_backup_name(name)
+                plan.rename(current_backup, backup, entry=name)
 
-                    logging.debug(f"debug: namespace: rename {target} -> {backup}")
-                    self.__rename_path(path=backup, target=target)
+            if links.get(name) != self.__get_link_target(name):
+                plan.retarget(name, self.__get_link_target(name))
+            plan.keep(name, backup=backup)
 
-        if self.current_ns_path.exists() and self.current_ns_path.is_symlink():
-            if Path(readlink(self.current_ns_path)) == self.path:
-                logging.debug(f"debug: namespace: unlink {self.current_ns_path}")
-                self.__unlink_path(symlink=self.current_ns_path)
+        return plan
+
+    def activate(self) -> None:
+        logging.debug("debug: namespace: activating %s namespace", self.name)
+        self.plan_activate().apply()
+
+    def deactivate(self) -> None:
+        logging.debug("debug: namespace: deactivating %s namespace", self.name)
+        self.plan_deactivate().apply()
+
+    def switch(self) -> None:
+        logging.debug("debug: namespace: switching to %s namespace", self.name)
+        self.plan_switch().apply()
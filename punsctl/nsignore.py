@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Pattern, Tuple
+
+__all__ = ["NsIgnore"]
+
+GLOB_CHARS = frozenset("*?[")
+
+
+def translate(pattern: str) -> str:
+    """
+    Translates a gitignore style glob to a regular expression matching a
+    path relative to the namespace root. "*" and "?" never match "/", "**"
+    matches across directories.
+    """
+
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+
+    regex, index = "", 0
+    while index < len(pattern):
+        char = pattern[index]
+
+        if pattern.startswith("**/", index):
+            regex += "(?:.*/)?"
+            index += 3
+            continue
+
+        if pattern.startswith("**", index):
+            regex += ".*"
+            index += 2
+            continue
+
+        if char == "*":
+            regex += "[^/]*"
+
+        elif char == "?":
+            regex += "[^/]"
+
+        elif char == "[":
+            end = pattern.find("]", index + 2)
+            if end == -1:
+                regex += re.escape(char)
+            else:
+                body = pattern[index + 1 : end].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                regex += f"[{body}]"
+                index = end
+
+        elif char == "\\" and index + 1 < len(pattern):
+            index += 1
+            regex += re.escape(pattern[index])
+
+        else:
+            regex += re.escape(char)
+
+        index += 1
+
+    return regex if anchored else f"(?:.*/)?{regex}"
+
+
+class NsIgnore(object):
+    """
+    Compiled .nsignore rules. Exact names live in dicts, every other rule is
+    folded into a single alternation regex with the rules in reverse order,
+    so the first alternative that matches is the last matching rule, as in
+    gitignore.
+    """
+
+    def __init__(self, lines: Optional[List[str]] = None):
+        self.rules: List[Tuple[str, bool, bool]] = []
+
+        for line in lines if lines is not None else []:
+            rule = self.parse(line)
+            if rule is not None:
+                self.rules.append(rule)
+
+        # name -> (rule index, negated); one dict for directories, one for
+        # everything else since "name/" rules only apply to directories
+        self.dir_names: Dict[str, Tuple[int, bool]] = {}
+        self.file_names: Dict[str, Tuple[int, bool]] = {}
+
+        dir_patterns: List[Tuple[int, str]] = []
+        file_patterns: List[Tuple[int, str]] = []
+
+        for index, (pattern, negated, dir_only) in enumerate(self.rules):
+            if "/" not in pattern and not GLOB_CHARS & set(pattern):
+                self.dir_names[pattern] = (index, negated)
+                if not dir_only:
+                    self.file_names[pattern] = (index, negated)
+                continue
+
+            dir_patterns.append((index, translate(pattern)))
+            if not dir_only:
+                file_patterns.append((index, translate(pattern)))
+
+        self.dir_regex = self.compile(dir_patterns)
+        self.file_regex = self.compile(file_patterns)
+
+    @staticmethod
+    def parse(line: str) -> Optional[Tuple[str, bool, bool]]:
+        line = line.rstrip("\n").rstrip()
+        if not line or line.startswith("#"):
+            return None
+
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+
+        elif line.startswith("\\"):
+            line = line[1:]
+
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            return None
+
+        return line, negated, dir_only
+
+    @staticmethod
+    def compile(patterns: List[Tuple[int, str]]) -> Optional[Pattern]:
+        if not patterns:
+            return None
+
+        # Grouped so the anchor applies to every rule, not just the first tried
+        alternatives = "|".join(
+            f"(?P<r{index}>{regex})" for index, regex in reversed(patterns)
+        )
+        return re.compile(rf"(?:{alternatives})\Z")
+
+    def match(self, path: str, is_dir: bool = False) -> bool:
+        names = self.dir_names if is_dir else self.file_names
+        regex = self.dir_regex if is_dir else self.file_regex
+
+        best: Optional[Tuple[int, bool]] = names.get(path.rsplit("/", 1)[-1])
+
+        if regex is not None:
+            found = regex.match(path)
+            if found is not None:
+                index = int(found.lastgroup[1:])
+                if best is None or index > best[0]:
+                    best = (index, self.rules[index][1])
+
+        return best is not None and not best[1]
+
+    def __contains__(self, path: str) -> bool:
+        return self.match(path)
+
+    def __bool__(self) -> bool:
+        return len(self.rules) > 0
+
+    def __repr__(self) -> str:
+        return f"NsIgnore({len(self.rules)} rules)"
+
+    @classmethod
+    def load(cls, path: Path) -> "NsIgnore":
+        with open(path) as fd:
+            return cls(fd.readlines())
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Operations shared by the command line and the daemon. A request is a dict
+naming an op and its arguments, so the same request runs in-process or is
+sent over the daemon socket as one JSON line.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, TextIO
+
+from punsctl.current import get_current_ns_name
+from punsctl.exceptions import NamespaceException
+from punsctl.fsck import CONFLICT, Fsck
+from punsctl.listing import write_namespaces
+from punsctl.rootspace import RootSpace
+from punsctl.session import Session
+
+__all__ = ["OPS", "READ_OPS", "DRY_RUN_OPS", "LogCapture", "is_read_only", "execute"]
+
+READ_OPS = ("ping", "current", "list", "check", "which")
+WRITE_OPS = (
+    "create",
+    "clone",
+    "remove",
+    "activate",
+    "deactivate",
+    "switch",
+    "repair",
+    "gc",
+)
+OPS = READ_OPS + WRITE_OPS
+# Write ops that only print what they would do with dry_run
+DRY_RUN_OPS = WRITE_OPS
+
+
+class LogCapture(logging.Handler):
+    """
+    Copies log records of the request running on the current thread into
+    its output, warnings reach the client the way they reach a terminal.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.local = threading.local()
+        self.setFormatter(logging.Formatter("%(message)s"))
+
+    @contextmanager
+    def capture(self, stream: TextIO) -> Iterator[None]:
+        self.local.stream = stream
+        try:
+            yield
+
+        finally:
+            self.local.stream = None
+
+    def emit(self, record: logging.LogRecord) -> None:
+        stream = getattr(self.local, "stream", None)
+        if stream is not None:
+            stream.write(f"{self.format(record)}\n")
+
+
+def is_read_only(request: Dict[str, Any]) -> bool:
+    op = request.get("op")
+
+    return op in READ_OPS or (op in DRY_RUN_OPS and bool(request.get("dry_run")))
+
+
+def _get_session(root_space: RootSpace, request: Dict[str, Any]) -> Session:
+    timeout = request.get("lock_timeout")
+
+    return Session(
+        root_space=root_space,
+        atomic=bool(request.get("atomic", False)),
+        jobs=int(request.get("jobs", 1)),
+        tree=bool(request.get("tree", False)),
+        indirect=bool(request.get("indirect", False)),
+        store=bool(request.get("store", False)),
+        lock_timeout=float(timeout) if timeout is not None else None,
+    )
+
+
+def execute(
+    root_space: RootSpace, request: Dict[str, Any], stream: Optional[TextIO] = None
+) -> int:
+    """
+    Runs request against root_space, writes the command line output to
+    stream and returns the exit status. Errors are raised as
+    NamespaceException or RootSpaceException. Everything but ping and
+    current holds the rootspace lock.
+    """
+
+    stream = stream if stream is not None else sys.stdout
+    op = request.get("op")
+
+    if op not in OPS:
+        raise NamespaceException(message=f"unknown operation: {op}")
+
+    if op == "ping":
+        stream.write("pong\n")
+        return 0
+
+    if op == "current":
+        name = get_current_ns_name(str(root_space.get_symlink_path()))
+        if name is not None:
+            stream.write(f"{name}\n")
+        return 0
+
+    session = _get_session(root_space, request)
+
+    with session.lock(shared=is_read_only(request)):
+        return _execute(session, request, stream)
+
+
+def _check(root_space: RootSpace, request: Dict[str, Any], stream: TextIO) -> int:
+    fsck = Fsck(
+        root_space,
+        atomic=bool(request.get("atomic", False)),
+        jobs=int(request.get("jobs", 1)),
+        indirect=bool(request.get("indirect", False)),
+    )
+    findings = fsck.scan()
+
+    if request.get("op") == "check":
+        if request.get("format") == "json":
+            for finding in findings:
+                stream.write(json.dumps(finding._asdict()) + "\n")
+        else:
+            for finding in fsck.problems():
+                stream.write(f"{finding}\n")
+            stream.write(f"info: {len(fsck.problems())} problems found\n")
+
+        return 1 if fsck.problems() else 0
+
+    plan = fsck.plan_repair()
+
+    if request.get("dry_run"):
+        plan.print(stream)
+        return 0
+
+    failed = plan.apply()
+    conflicts = [finding for finding in findings if finding.status == CONFLICT]
+    for finding in conflicts:
+        stream.write(f"{finding}, left as is\n")
+
+    stream.write(f"info: {len(plan)} repair operations applied\n")
+
+    return 1 if failed or conflicts else 0
+
+
+def _which(root_space: RootSpace, request: Dict[str, Any], stream: TextIO) -> int:
+    entry = request.get("entry")
+    if not isinstance(entry, str) or entry == "":
+        raise NamespaceException(message="entry name is required")
+
+    namespaces = root_space.get_index().lookup(entry)
+
+    # The namespace behind the entry's link, if it is one of ours
+    try:
+        link = os.readlink(f"{root_space.get_symlink_path()}/{entry}")
+
+    except OSError:
+        link = ""
+
+    if link == f"{root_space.get_current_ns_path()}/{entry}":
+        linked = get_current_ns_name(str(root_space.get_symlink_path()))
+    else:
+        linked = os.path.basename(os.path.dirname(link))
+
+    for namespace in namespaces:
+        if request.get("format") == "json":
+            stream.write(
+                json.dumps(
+                    {
+                        "entry": entry,
+                        "namespace": namespace,
+                        "linked": namespace == linked,
+                    }
+                )
+                + "\n"
+            )
+        else:
+            stream.write(f"{namespace}{' (linked)' if namespace == linked else ''}\n")
+
+    return 0 if namespaces else 1
+
+
+def _execute(session: Session, request: Dict[str, Any], stream: TextIO) -> int:
+    root_space = session.get_root_space()
+    op = request.get("op")
+    dry_run = bool(request.get("dry_run", False))
+
+    if op in ("check", "repair"):
+        return _check(root_space, request, stream)
+
+    if op == "which":
+        return _which(root_space, request, stream)
+
+    if op == "gc":
+        removed, size = root_space.get_backup_store().gc(dry_run=dry_run)
+        if dry_run:
+            stream.write(
+                f"dry-run: {removed} unreferenced backups to remove ({size} bytes)\n"
+            )
+        else:
+            stream.write(
+                f"info: {removed} unreferenced backups removed ({size} bytes)\n"
+            )
+        return 0
+
+    name = request.get("namespace")
+
+    if op == "list":
+        write_namespaces(
+            root_space,
+            fmt=request.get("format", "text"),
+            pattern=request.get("pattern"),
+            stream=stream,
+        )
+
+    elif op == "create":
+        if dry_run:
+            stream.write(f"dry-run: create {session.namespace(name).get_name()}\n")
+
+        else:
+            session.create(name)
+            stream.write(f"info: {name} created\n")
+
+    elif op == "clone":
+        target = request.get("target")
+
+        if dry_run:
+            stream.write(f"dry-run: clone {name} -> {target}\n")
+            return 0
+
+        counts = session.clone(name, target, hardlink=bool(request.get("hardlink")))
+        summary = ", ".join(f"{method}: {count}" for method, count in counts.items())
+        stream.write(f"info: {name} cloned to {target} ({summary})\n")
+
+    elif op == "remove":
+        if dry_run:
+            stream.write(f"dry-run: remove {session.namespace(name).get_name()}\n")
+            return 0
+
+        session.remove(
+            name,
+            recursive=bool(request.get("recursive", False)),
+            deactivate=bool(request.get("deactivate", False)),
+            trash=bool(request.get("trash", False)),
+        )
+        stream.write(f"info: {name} removed\n")
+
+    elif op in ("activate", "switch"):
+        if dry_run:
+            if op == "activate":
+                session.plan_activate(name).print(stream)
+            else:
+                session.plan_switch(name).print(stream)
+
+        elif op == "activate":
+            session.activate(name)
+            stream.write(f"info: {name} activated\n")
+
+        else:
+            session.switch(name)
+            stream.write(f"info: switched to {name}\n")
+
+    elif op == "deactivate":
+        if dry_run:
+            for plan in session.plan_deactivate():
+                plan.print(stream)
+
+        else:
+            session.deactivate()
+            stream.write("info: namespaces are deactivated successfully\n")
+
+    return 0
@@ -0,0 +1,444 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from punsctl.atomic import replace_symlink, restore_path, swap_symlink
+from punsctl.exceptions import report_fs_ops_exception
+from punsctl.manifest import Manifest
+from punsctl.pool import map_ordered
+from punsctl.static import MANIFEST_NAME
+from punsctl.store import STORE_BACKUP, BackupStore, stash_name
+from punsctl.trace import tracer
+
+__all__ = ["Operation", "Plan"]
+
+
+class Operation(object):
+    RENAME = "rename"
+    SYMLINK = "symlink"
+    UNLINK = "unlink"
+    REPLACE = "replace"
+    EXCHANGE = "exchange"
+    RESTORE = "restore"
+    STASH = "stash"
+    UNSTASH = "unstash"
+    HANDOVER = "handover"
+
+    # Trace phase and syscall counters of each action
+    TRACE = {
+        RENAME: ("backup", {"renames": 1}),
+        SYMLINK: ("link", {"symlinks": 1}),
+        UNLINK: ("unlink", {"unlinks": 1}),
+        REPLACE: ("link", {"symlinks": 1, "renames": 1}),
+        EXCHANGE: ("link", {"symlinks": 1, "renames": 2}),
+        RESTORE: ("backup", {"renames": 1, "unlinks": 1}),
+        STASH: ("backup", {"renames": 1}),
+        UNSTASH: ("backup", {"renames": 1}),
+        HANDOVER: ("backup", {}),
+    }
+
+    def __init__(
+        self,
+        action: str,
+        name: str,
+        target: Optional[str] = None,
+        backup: Optional[str] = None,
+        entry: Optional[str] = None,
+        store: Optional[BackupStore] = None,
+        jobs: int = 1,
+        namespace: Optional[str] = None,
+    ):
+        self.action = action
+        self.name = name
+        self.target = target
+        self.backup = backup
+        self.entry = entry if entry is not None else name
+        self.store = store
+        self.jobs = jobs
+        self.namespace = namespace
+
+    def __str__(self) -> str:
+        if self.action == self.HANDOVER:
+            return f"{self.action} {self.name} {self.backup} -> {self.namespace}"
+
+        if self.action in (self.RESTORE, self.UNSTASH):
+            return f"{self.action} {self.name} <- {self.backup}"
+
+        if self.target is None:
+            return f"{self.action} {self.name}"
+
+        if self.backup is not None:
+            return f"{self.action} {self.name} -> {self.target} ({self.backup})"
+
+        return f"{self.action} {self.name} -> {self.target}"
+
+    def __repr__(self) -> str:
+        return (
+            f"Operation({self.action!r}, {self.name!r}, "
+            f"{self.target!r}, {self.backup!r})"
+        )
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Operation):
+            return NotImplemented
+
+        return (self.action, self.name, self.target, self.backup) == (
+            other.action,
+            other.name,
+            other.target,
+            other.backup,
+        )
+
+    def apply(self, dir_fd: int) -> None:
+        logging.debug("debug: plan: %s", self)
+
+        if tracer.enabled:
+            phase, counters = self.TRACE[self.action]
+            started = time.perf_counter()
+
+            try:
+                self.__apply(dir_fd)
+
+            finally:
+                tracer.add_time(phase, time.perf_counter() - started)
+                for counter, value in counters.items():
+                    tracer.count(counter, value)
+
+            return
+
+        self.__apply(dir_fd)
+
+    def __apply(self, dir_fd: int) -> None:
+        if self.action == self.RENAME:
+            os.rename(self.name, self.target, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+
+        elif self.action == self.SYMLINK:
+            os.symlink(self.target, self.name, dir_fd=dir_fd)
+
+        elif self.action == self.UNLINK:
+            os.unlink(self.name, dir_fd=dir_fd)
+
+        elif self.action == self.REPLACE:
+            replace_symlink(self.target, self.name, dir_fd=dir_fd)
+
+        elif self.action == self.EXCHANGE:
+            swap_symlink(self.target, self.name, self.backup, dir_fd=dir_fd)
+
+        elif self.action == self.RESTORE:
+            restore_path(self.backup, self.name, dir_fd=dir_fd)
+
+        elif self.action == self.STASH:
+            self.store.stash(
+                self.name,
+                self.target,
+                dir_fd=dir_fd,
+                jobs=self.jobs,
+                namespace=self.namespace,
+            )
+
+        elif self.action == self.UNSTASH:
+            self.store.unstash(
+                self.name,
+                self.backup,
+                dir_fd=dir_fd,
+                jobs=self.jobs,
+                namespace=self.namespace,
+            )
+
+        elif self.action == self.HANDOVER:
+            self.store.hand_over(self.target, self.backup, self.namespace)
+
+        else:
+            raise ValueError(f"unknown operation {self.action}")
+
+
+class Plan(object):
+    def __init__(
+        self,
+        symlink_path: Path,
+        manifest: Optional[Manifest] = None,
+        atomic: bool = False,
+        jobs: int = 1,
+        store: Optional[BackupStore] = None,
+        namespace: Optional[str] = None,
+    ):
+        self.symlink_path = symlink_path
+        self.manifest = manifest
+        self.atomic = atomic
+        self.jobs = jobs
+        self.store = store
+        # Namespace whose backups the plan stashes and restores
+        self.namespace = namespace
+        self.operations: List[Operation] = []
+        self.followups: List[Tuple[str, Callable[[], "Plan"]]] = []
+        # Filled by apply() with the plans the followups computed
+        self.followup_plans: List["Plan"] = []
+
+    def __iter__(self) -> Iterator[Operation]:
+        return iter(self.operations)
+
+    def __len__(self) -> int:
+        return len(self.operations)
+
+    def rename(self, name: str, target: str, entry: Optional[str] = None) -> None:
+        self.operations.append(Operation(Operation.RENAME, name, target, entry=entry))
+
+    def symlink(self, name: str, source: Path) -> None:
+        self.operations.append(Operation(Operation.SYMLINK, name, str(source)))
+
+    def unlink(self, name: str) -> None:
+        self.operations.append(Operation(Operation.UNLINK, name))
+
+    def stash(self, name: str, entry: Optional[str] = None) -> None:
+        self.operations.append(
+            Operation(
+                Operation.STASH,
+                name,
+                self.__get_store_key(entry if entry is not None else name),
+                entry=entry,
+                store=self.store,
+                jobs=self.jobs,
+                namespace=self.namespace,
+            )
+        )
+
+    def unstash(
+        self,
+        name: str,
+        entry: Optional[str] = None,
+        namespace: Optional[str] = None,
+    ) -> None:
+        self.operations.append(
+            Operation(
+                Operation.UNSTASH,
+                name,
+                backup=self.__get_store_key(entry if entry is not None else name),
+                entry=entry,
+                store=self.store,
+                jobs=self.jobs,
+                namespace=namespace if namespace is not None else self.namespace,
+            )
+        )
+
+    def hand_over(self, name: str, previous: str) -> None:
+        self.operations.append(
+            Operation(
+                Operation.HANDOVER,
+                name,
+                self.__get_store_key(name),
+                backup=previous,
+                store=self.store,
+                namespace=self.namespace,
+            )
+        )
+
+    def __get_store_key(self, name: str) -> str:
+        if self.store is None:
+            raise ValueError("plan has no backup store")
+
+        return f"{self.symlink_path}/{name}"
+
+    def link(self, name: str, source: Path, backup: Optional[str] = None) -> None:
+        if backup == STORE_BACKUP:
+            if self.atomic:
+                stashed = stash_name(name)
+                self.operations.append(
+                    Operation(Operation.EXCHANGE, name, str(source), stashed)
+                )
+                self.stash(stashed, entry=name)
+
+            else:
+                self.stash(name)
+                self.symlink(name, source)
+
+        elif backup is not None and self.atomic:
+            self.operations.append(
+                Operation(Operation.EXCHANGE, name, str(source), backup)
+            )
+
+        else:
+            if backup is not None:
+                self.rename(name, backup)
+
+            self.symlink(name, source)
+
+        self.keep(name, backup=backup)
+
+    def replace(self, name: str, source: Path) -> None:
+        # A temporary symlink renamed over name, it never disappears
+        self.operations.append(Operation(Operation.REPLACE, name, str(source)))
+
+    def retarget(self, name: str, source: Path) -> None:
+        if self.atomic:
+            self.replace(name, source)
+
+        else:
+            self.unlink(name)
+            self.symlink(name, source)
+
+    def restore(
+        self,
+        name: str,
+        backup: str,
+        linked: bool = True,
+        namespace: Optional[str] = None,
+    ) -> None:
+        """
+        Puts backup back at name. Store backups are only restored for the
+        namespace that owns them, the plan's unless namespace is given.
+        """
+
+        if backup == STORE_BACKUP:
+            if linked and self.atomic:
+                stashed = stash_name(name)
+                self.unstash(stashed, entry=name, namespace=namespace)
+                self.operations.append(
+                    Operation(Operation.RESTORE, name, backup=stashed)
+                )
+
+            else:
+                if linked:
+                    self.unlink(name)
+
+                self.unstash(name, namespace=namespace)
+
+        elif linked and self.atomic:
+            self.operations.append(Operation(Operation.RESTORE, name, backup=backup))
+
+        else:
+            if linked:
+                self.unlink(name)
+
+            self.rename(backup, name, entry=name)
+
+    def keep(self, name: str, backup: Optional[str] = None) -> None:
+        if self.manifest is not None:
+            self.manifest.add_link(name, backup=backup)
+
+    def extend(self, plan: "Plan") -> None:
+        self.operations.extend(plan.operations)
+
+    def then(self, description: str, planner: Callable[[], "Plan"]) -> None:
+        """
+        Registers a plan that can only be computed once this one is applied.
+        """
+
+        self.followups.append((description, planner))
+
+    def print(self, stream: Optional[TextIO] = None) -> None:
+        stream = stream if stream is not None else sys.stdout
+
+        for operation in self.operations:
+            stream.write(f"dry-run: {operation}\n")
+
+        for description, _ in self.followups:
+            stream.write(f"dry-run: then {description}\n")
+
+    def get_groups(self) -> List[List[Operation]]:
+        groups: Dict[str, List[Operation]] = {}
+
+        for operation in self.operations:
+            groups.setdefault(operation.entry, []).append(operation)
+
+        return list(groups.values())
+
+    @staticmethod
+    def __apply_group(
+        operations: List[Operation], dir_fd: int
+    ) -> List[Tuple[Operation, Optional[Exception]]]:
+        # Operations on the same entry depend on each other (backup before
+        # link), so the first failure skips the rest of the group.
+        for index, operation in enumerate(operations):
+            try:
+                operation.apply(dir_fd=dir_fd)
+
+            except Exception as exc:
+                return [(operation, exc)] + [
+                    (skipped, None) for skipped in operations[index + 1 :]
+                ]
+
+        return []
+
+    def apply(self) -> List[Operation]:
+        failed = self.__apply_operations()
+
+        for _, planner in self.followups:
+            plan = planner()
+            self.followup_plans.append(plan)
+            failed.extend(plan.apply())
+
+        return failed
+
+    def iter_applied(self) -> Iterator[Operation]:
+        """
+        Yields the operations of this plan and, once applied, of the plans
+        its followups computed, failed ones included.
+        """
+
+        yield from self.operations
+
+        for plan in self.followup_plans:
+            yield from plan.iter_applied()
+
+    def __apply_operations(self) -> List[Operation]:
+        if not self.operations and self.manifest is None:
+            return []
+
+        failed = []
+
+        dir_fd = os.open(self.symlink_path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            results = map_ordered(
+                lambda group: self.__apply_group(group, dir_fd),
+                self.get_groups(),
+                jobs=self.jobs,
+            )
+
+            for result in results:
+                for operation, exc in result:
+                    if exc is not None:
+                        report_fs_ops_exception(exc)
+
+                    failed.append(operation)
+
+            if self.manifest is not None:
+                for operation in failed:
+                    if operation.action in (
+                        Operation.SYMLINK,
+                        Operation.REPLACE,
+                        Operation.EXCHANGE,
+                    ):
+                        self.manifest.discard_link(operation.name)
+
+                self.manifest.dump(MANIFEST_NAME, dir_fd=dir_fd)
+
+        finally:
+            os.close(dir_fd)
+
+            # Also after failures, stashed entries must stay findable
+            if any(
+                operation.action
+                in (Operation.STASH, Operation.UNSTASH, Operation.HANDOVER)
+                for operation in self.operations
+            ):
+                self.store.save()
+
+        return failed
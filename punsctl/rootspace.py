@@ -14,17 +14,29 @@
 # OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
 import logging
-from os import R_OK, W_OK, access, mkdir, readlink
+from fnmatch import fnmatchcase
+from os import R_OK, W_OK, DirEntry, access, mkdir, readlink, scandir, stat
 from pathlib import Path
-from typing import List, Optional
+from typing import ContextManager, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from punsctl.exceptions import RootSpaceException
+from punsctl.index import EntryIndex
+from punsctl.lock import lock_file
+from punsctl.manifest import Manifest
+from punsctl.nsignore import NsIgnore
 from punsctl.static import (
+    BACKUP_STORE_NAME,
     CURRENT_NS_SYMLINK_NAME,
     DEFAULT_ROOTSPACE_MKDIR_MODE,
     DEFAULT_ROOTSPACE_PATH,
     DEFAULT_SYMLINK_PATH,
+    LOCK_NAME,
+    MANIFEST_NAME,
+    ROOTSPACE_RESERVED_NAMES,
+    TRASH_NAME,
 )
+from punsctl.store import BackupStore
+from punsctl.trace import tracer
 
 __all__ = ["RootSpace"]
 
@@ -38,17 +50,79 @@ class RootSpace(object):
         self.path = path
         self.symlink_path = symlink_path
         self.current_ns_path = Path(f"{symlink_path}/{CURRENT_NS_SYMLINK_NAME}")
+        self.manifest_path = Path(f"{symlink_path}/{MANIFEST_NAME}")
+        self.trash_path = Path(f"{path}/{TRASH_NAME}")
+        self.lock_path = Path(f"{path}/{LOCK_NAME}")
+        self.backup_store = BackupStore(Path(f"{path}/{BACKUP_STORE_NAME}"))
+        self.index = EntryIndex(self)
+        self.nsignore_cache: Dict[Path, Tuple[Tuple[int, int], NsIgnore]] = {}
+        self.check_key: Optional[Tuple] = None
+        self.ns_entries_cache: Optional[Tuple[Tuple, List[DirEntry]]] = None
 
-        logging.debug(f"debug: rootspace: path: {self.path}")
-        logging.debug(f"debug: rootspace: symlink path: {self.symlink_path}")
+        logging.debug("debug: rootspace: path: %s", self.path)
+        logging.debug("debug: rootspace: symlink path: %s", self.symlink_path)
         logging.debug(
-            f"debug: rootspace: current namespace path: {self.current_ns_path}"
+            "debug: rootspace: current namespace path: %s", self.current_ns_path
         )
 
     def check(self) -> None:
+        # Skipped while neither path changed since the last successful check,
+        # which is what a long running process such as the daemon sees
+        key = self.__get_check_key()
+        if key is not None and key == self.check_key:
+            return
+
+        with tracer.phase("rootspace_check"):
+            self.__check()
+
+        self.check_key = key
+
+    def lock(
+        self, shared: bool = False, timeout: Optional[float] = None
+    ) -> ContextManager[None]:
+        """
+        Locks the rootspace against other processes, shared for queries and
+        exclusive for changes. See punsctl.lock.lock_file for timeout.
+        """
+
+        logging.debug(
+            "debug: rootspace: %s lock on %s",
+            "shared" if shared else "exclusive",
+            self.lock_path,
+        )
+
+        return lock_file(str(self.lock_path), shared=shared, timeout=timeout)
+
+    def invalidate(self) -> None:
+        self.check_key = None
+        self.ns_entries_cache = None
+
+    @staticmethod
+    def __stat_key(path: Path) -> Optional[Tuple]:
+        if tracer.enabled:
+            tracer.count("stats")
+
+        try:
+            st = stat(path)
+
+        except OSError:
+            return None
+
+        return (st.st_ino, st.st_mode, st.st_nlink, st.st_mtime_ns, st.st_ctime_ns)
+
+    def __get_check_key(self) -> Optional[Tuple]:
+        root_key = self.__stat_key(self.path)
+        symlink_key = self.__stat_key(self.symlink_path)
+
+        if root_key is None or symlink_key is None:
+            return None
+
+        return root_key, symlink_key
+
+    def __check(self) -> None:
         # Root path checks
         logging.debug(
-            f"debug: rootspace: checking {self.path.parent} write permissions"
+            "debug: rootspace: checking %s write permissions", self.path.parent
         )
         if not self.path.exists():
             if access(self.path.parent, W_OK) is not True:
@@ -60,27 +134,27 @@ class RootSpace(object):
             except OSError as exc:
                 raise RootSpaceException(message=exc.strerror)
 
-        logging.debug(f"debug: rootspace: checking {self.path} is a directory")
+        logging.debug("debug: rootspace: checking %s is a directory", self.path)
         if not self.path.is_dir():
             raise RootSpaceException(message=f"path {self.path} is not a directory")
 
-        logging.debug(f"debug: rootspace: checking {self.path} read permissions")
+        logging.debug("debug: rootspace: checking %s read permissions", self.path)
         if access(self.path, R_OK) is not True:
             raise RootSpaceException(message=f"path {self.path} is not readable")
 
         # Symlink path checks
-        logging.debug(f"debug: rootspace: checking {self.symlink_path} exists")
+        logging.debug("debug: rootspace: checking %s exists", self.symlink_path)
         if not self.symlink_path.exists():
             raise RootSpaceException(message=f"path {self.symlink_path} doesn't exists")
 
-        logging.debug(f"debug: rootspace: checking {self.symlink_path} is a directory")
+        logging.debug("debug: rootspace: checking %s is a directory", self.symlink_path)
         if not self.symlink_path.is_dir():
             raise RootSpaceException(
                 message=f"path {self.symlink_path} is not a directory"
             )
 
         logging.debug(
-            f"debug: rootspace: checking {self.symlink_path} write permissions"
+            "debug: rootspace: checking %s write permissions", self.symlink_path
         )
         if access(self.symlink_path, W_OK) is not True:
             raise RootSpaceException(
@@ -96,19 +170,108 @@ class RootSpace(object):
     def get_current_ns_path(self) -> Path:
         return self.current_ns_path
 
+    def get_index(self) -> EntryIndex:
+        return self.index
+
+    def get_trash_path(self) -> Path:
+        return self.trash_path
+
+    def get_backup_store(self) -> BackupStore:
+        return self.backup_store
+
+    def get_manifest_path(self) -> Path:
+        return self.manifest_path
+
+    def load_manifest(self) -> Optional[Manifest]:
+        return Manifest.load(self.manifest_path)
+
+    def get_nsignore(self, path: Path) -> NsIgnore:
+        """
+        Returns the compiled .nsignore at path, parsed at most once for as
+        long as the file's mtime and size don't change.
+        """
+
+        if tracer.enabled:
+            tracer.count("stats")
+
+        try:
+            st = stat(path)
+
+        except (FileNotFoundError, NotADirectoryError):
+            self.nsignore_cache.pop(path, None)
+            return NsIgnore()
+
+        key = (st.st_mtime_ns, st.st_size)
+
+        cached = self.nsignore_cache.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        logging.debug("debug: rootspace: compiling %s", path)
+        with tracer.phase("nsignore_load"):
+            nsignore = NsIgnore.load(path)
+        self.nsignore_cache[path] = (key, nsignore)
+
+        return nsignore
+
+    def get_current_ns_target(self) -> Optional[Path]:
+        if tracer.enabled:
+            tracer.count("readlinks")
+
+        try:
+            return Path(readlink(self.current_ns_path))
+
+        except OSError:
+            return None
+
     def get_current_ns_name(self) -> Optional[str]:
         if self.current_ns_path.exists() and self.current_ns_path.is_symlink():
             return Path(readlink(self.current_ns_path)).name
 
         return None
 
-    def get_all_ns_paths(self) -> List[Path]:
-        namespaces = []
+    def iter_ns_entries(self, pattern: Optional[str] = None) -> Iterator[DirEntry]:
+        key = self.__stat_key(self.path)
+
+        cached = self.ns_entries_cache
+        if key is not None and cached is not None and cached[0] == key:
+            entries: Iterable[DirEntry] = cached[1]
+        else:
+            entries = self.__scan_ns_entries(key)
+
+        for entry in entries:
+            if pattern is not None and not fnmatchcase(entry.name, pattern):
+                continue
+
+            yield entry
+
+    def __scan_ns_entries(self, key: Optional[Tuple]) -> Iterator[DirEntry]:
+        if tracer.enabled:
+            tracer.count("scandirs")
 
-        for namespace in self.path.iterdir():
-            if namespace.is_dir() and not namespace.is_symlink():
-                namespaces.append(namespace)
+        scanned = []
+        with scandir(self.path) as entries:
+            for entry in entries:
+                # d_type from readdir, no stat unless the filesystem omits it
+                if not entry.is_dir(follow_symlinks=False):
+                    continue
 
+                if entry.name in ROOTSPACE_RESERVED_NAMES:
+                    continue
+
+                # A clone interrupted before its rename, see atomic.temp_name
+                if entry.name.endswith(".punsctl.tmp"):
+                    continue
+
+                scanned.append(entry)
+                yield entry
+
+        # Only a complete scan is cached, keyed on the root's stat before it
+        if key is not None:
+            self.ns_entries_cache = (key, scanned)
+
+    def get_all_ns_paths(self) -> List[Path]:
+        namespaces = [Path(entry.path) for entry in self.iter_ns_entries()]
         namespaces.sort()
 
         return namespaces
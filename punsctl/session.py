@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Library API. A Session wraps one RootSpace for as long as the caller keeps
+it, so the rootspace checks, namespace listing and compiled .nsignore
+files are reused across calls the way the daemon reuses them. Methods
+return results instead of printing and raise NamespaceException or
+RootSpaceException instead of exiting.
+
+    from punsctl import Session
+
+    session = Session()
+    with session.activated("work"):
+        ...
+"""
+
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+from punsctl.exceptions import NamespaceException
+from punsctl.namespace import Namespace
+from punsctl.plan import Plan
+from punsctl.rootspace import RootSpace
+from punsctl.static import DEFAULT_JOBS, DEFAULT_ROOTSPACE_PATH, DEFAULT_SYMLINK_PATH
+
+__all__ = ["NamespaceInfo", "Result", "Session"]
+
+
+class NamespaceInfo(NamedTuple):
+    name: str
+    path: str
+    active: bool
+
+
+class Result(NamedTuple):
+    namespace: Optional[str]
+    applied: List[str]
+    failed: List[str]
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+
+class Session(object):
+    def __init__(
+        self,
+        root_path: str = DEFAULT_ROOTSPACE_PATH,
+        symlink_path: str = DEFAULT_SYMLINK_PATH,
+        atomic: bool = False,
+        jobs: int = DEFAULT_JOBS,
+        tree: bool = False,
+        indirect: bool = False,
+        store: bool = False,
+        lock_timeout: Optional[float] = None,
+        root_space: Optional[RootSpace] = None,
+    ):
+        if root_space is None:
+            root_space = RootSpace(
+                path=Path(root_path), symlink_path=Path(symlink_path)
+            )
+
+        self.root_space = root_space
+        self.atomic = atomic
+        self.jobs = jobs
+        self.tree = tree
+        self.indirect = indirect
+        self.store = store
+        self.lock_timeout = lock_timeout
+
+        # Set while this session holds the rootspace lock, see lock()
+        self.locked: Optional[bool] = None
+
+    def get_root_space(self) -> RootSpace:
+        return self.root_space
+
+    @contextmanager
+    def lock(self, shared: bool = False) -> Iterator[None]:
+        """
+        Checks the rootspace and holds its lock for the block. Nested calls
+        run under the lock already held, so methods can be combined in one
+        locked block; an exclusive lock can't be taken inside a shared one.
+        """
+
+        if self.locked is not None:
+            # A caller error, requests are classified before they lock
+            if not shared and self.locked:
+                raise NamespaceException(
+                    message="can't change the rootspace inside a read-only block"
+                )
+
+            yield
+            return
+
+        self.root_space.check()
+
+        with self.root_space.lock(shared=shared, timeout=self.lock_timeout):
+            self.locked = shared
+            try:
+                yield
+
+            finally:
+                self.locked = None
+
+    def namespace(self, name: str) -> Namespace:
+        if not isinstance(name, str) or name == "":
+            raise NamespaceException(message="namespace name is required")
+
+        return Namespace(
+            name=name,
+            root_space=self.root_space,
+            atomic=self.atomic,
+            jobs=self.jobs,
+            tree=self.tree,
+            indirect=self.indirect,
+            store=self.store,
+        )
+
+    def current(self) -> Optional[str]:
+        target = self.root_space.get_current_ns_target()
+
+        return target.name if target is not None else None
+
+    def list(self, pattern: Optional[str] = None) -> List[NamespaceInfo]:
+        with self.lock(shared=True):
+            current = self.root_space.get_current_ns_target()
+
+            namespaces = []
+            for entry in self.root_space.iter_ns_entries(pattern=pattern):
+                path = Path(f"{self.root_space.get_path()}/{entry.name}")
+                namespaces.append(
+                    NamespaceInfo(entry.name, str(path.absolute()), path == current)
+                )
+
+        namespaces.sort()
+
+        return namespaces
+
+    def create(self, name: str) -> None:
+        with self.lock():
+            self.namespace(name).create()
+
+    def clone(self, name: str, target: str, hardlink: bool = False) -> Dict[str, int]:
+        if not isinstance(target, str) or target == "":
+            raise NamespaceException(message="clone target name is required")
+
+        with self.lock():
+            return self.namespace(name).clone(target, hardlink=hardlink)
+
+    def remove(
+        self,
+        name: str,
+        recursive: bool = False,
+        deactivate: bool = False,
+        trash: bool = False,
+    ) -> None:
+        with self.lock():
+            self.namespace(name).remove(
+                recursive=recursive, deactivate=deactivate, trash=trash
+            )
+
+    def plan_activate(self, name: str) -> Plan:
+        with self.lock(shared=True):
+            return self.namespace(name).plan_activate()
+
+    def plan_switch(self, name: str) -> Plan:
+        with self.lock(shared=True):
+            return self.namespace(name).plan_switch()
+
+    def plan_deactivate(self) -> List[Plan]:
+        with self.lock(shared=True):
+            manifest = self.root_space.load_manifest()
+            if manifest is not None:
+                names = [manifest.namespace]
+            else:
+                names = [path.name for path in self.root_space.get_all_ns_paths()]
+
+            return [self.namespace(name).plan_deactivate() for name in names]
+
+    @staticmethod
+    def __apply(namespace: Optional[str], plans: List[Plan]) -> Result:
+        applied: List[str] = []
+        failed: List[str] = []
+
+        for plan in plans:
+            # Operations of follow-up plans are only known once applied
+            failures = {id(operation) for operation in plan.apply()}
+
+            for operation in plan.iter_applied():
+                if id(operation) in failures:
+                    failed.append(str(operation))
+                else:
+                    applied.append(str(operation))
+
+        return Result(namespace, applied, failed)
+
+    def activate(self, name: str) -> Result:
+        with self.lock():
+            return self.__apply(name, [self.namespace(name).plan_activate()])
+
+    def switch(self, name: str) -> Result:
+        with self.lock():
+            return self.__apply(name, [self.namespace(name).plan_switch()])
+
+    def deactivate(self) -> Result:
+        with self.lock():
+            return self.__apply(None, self.plan_deactivate())
+
+    @contextmanager
+    def activated(self, name: str) -> Iterator[Result]:
+        """
+        Switches to namespace name for the block and back to the namespace
+        active before it, or deactivates if there was none, on the way out.
+        """
+
+        previous = self.current()
+        result = self.switch(name)
+
+        try:
+            yield result
+
+        finally:
+            if previous is not None and previous != name:
+                self.switch(previous)
+            elif previous is None:
+                self.deactivate()
+
+            logging.debug("debug: session: %s left, %s restored", name, previous)
@@ -13,23 +13,30 @@
 # ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
 # OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
-from typing import Any, List
+import sys
+from typing import Any, List, Optional
 
 __all__ = ["sgetopt"]
 
 
-def sgetopt(args: List[str], optstring: str) -> Any:
+def sgetopt(args: Optional[List[str]], optstring: str) -> Any:
     """
     Parses command line options and parameter list.
     args is the argument list to be parsed, without the leading reference
-    to the running program. Typically, this means "sys.argv[1:]".
+    to the running program. The decorated function can also be called with
+    the list, and without either "sys.argv[1:]" is read at call time.
     optstring is the string of option letters that the script wants to
     recognize, with options that require an argument followed by a
-    colon (i.e., the same format that Unix getopt() uses).
+    colon (i.e., the same format that Unix getopt() uses). Arguments
+    after "--" are appended to the parameter list as they are.
     """
 
     def func(f):
-        def wrapper():
+        def wrapper(call_args: Optional[List[str]] = None):
+            cmdline = call_args if call_args is not None else args
+            if cmdline is None:
+                cmdline = sys.argv[1:]
+
             def is_opt(opt: str) -> bool:
                 if len(opt) == 2 and opt.startswith("-"):
                     return True
@@ -42,17 +49,22 @@ def sgetopt(args: List[str], optstring: str) -> Any:
 
             opts, argv = [], []
 
-            for _ in range(len(args)):
-                arg, arg_ix = args[_], _
+            for _ in range(len(cmdline)):
+                arg, arg_ix = cmdline[_], _
+
+                # Everything after "--" is passed through untouched
+                if arg == "--":
+                    argv.extend(cmdline[arg_ix + 1 :])
+                    break
 
                 if is_opt(arg):
                     n_arg = arg_ix + 1
 
-                    if len(args) <= n_arg:
+                    if len(cmdline) <= n_arg:
                         opts.append((arg, None))
 
-                    elif req_arg(arg[1]) and not is_opt(args[n_arg]):
-                        opts.append((arg, args[n_arg]))
+                    elif req_arg(arg[1]) and not is_opt(cmdline[n_arg]):
+                        opts.append((arg, cmdline[n_arg]))
 
                     else:
                         opts.append((arg, ""))
@@ -60,14 +72,14 @@ def sgetopt(args: List[str], optstring: str) -> Any:
                 else:
                     p_arg = arg_ix - 1
 
-                    if is_opt(args[p_arg]):
-                        if not req_arg(args[p_arg][1]):
+                    if is_opt(cmdline[p_arg]):
+                        if not req_arg(cmdline[p_arg][1]):
                             argv.append(arg)
 
                     else:
                         argv.append(arg)
 
-            f(opts, argv)
+            return f(opts, argv)
 
         return wrapper
 
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Shell integration emitted by "punsctl init <shell>". The generated functions
+read .current_ns with the shell's readlink, so prompts never start Python.
+"""
+
+import shlex
+
+from punsctl.static import CURRENT_NS_SYMLINK_NAME
+
+__all__ = ["SHELLS", "render"]
+
+SHELLS = ("bash", "zsh", "fish")
+
+_POSIX = """\
+_punsctl_link={link}
+PUNSCTL_NS=
+
+_punsctl_refresh() {{
+    local ns
+    ns="$(readlink -- "$_punsctl_link" 2>/dev/null)"
+    ns="${{ns%/}}"
+    ns="${{ns##*/}}"
+    [ "$ns" = "$PUNSCTL_NS" ] || PUNSCTL_NS="$ns"
+}}
+
+punsctl_ns() {{
+    [ -n "$PUNSCTL_NS" ] && printf '%s\\n' "$PUNSCTL_NS"
+}}
+
+# Any invocation may change the link, e.g. repair, batch or fleet, and a
+# readlink costs nothing next to the command itself
+punsctl() {{
+    local rc
+    command punsctl "$@"
+    rc=$?
+    _punsctl_refresh
+    return $rc
+}}
+
+_punsctl_refresh
+"""
+
+_FISH = """\
+set -g _punsctl_link {link}
+set -g PUNSCTL_NS
+
+function _punsctl_refresh
+    set -l ns (readlink -- $_punsctl_link 2>/dev/null)
+    set ns (string replace -r '/$' '' -- $ns)
+    set ns (string replace -r '.*/' '' -- $ns)
+    if test "$ns" != "$PUNSCTL_NS"
+        set -g PUNSCTL_NS $ns
+    end
+end
+
+function punsctl_ns
+    test -n "$PUNSCTL_NS"; and echo $PUNSCTL_NS
+end
+
+# Any invocation may change the link, see the POSIX wrapper
+function punsctl --wraps punsctl
+    command punsctl $argv
+    set -l rc $status
+    _punsctl_refresh
+    return $rc
+end
+
+_punsctl_refresh
+"""
+
+
+def _fish_quote(value: str) -> str:
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def render(shell: str, symlink_path: str) -> str:
+    if shell not in SHELLS:
+        raise ValueError(f"unsupported shell: {shell}")
+
+    link = f"{symlink_path}/{CURRENT_NS_SYMLINK_NAME}"
+
+    if shell == "fish":
+        return _FISH.format(link=_fish_quote(link))
+
+    return _POSIX.format(link=shlex.quote(link))
@@ -13,31 +13,72 @@
 # ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
 # OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
-from pathlib import Path
+from os.path import expanduser
 
 from punsctl import __VERSION__
 
 USAGE = f"""
 punsctl {__VERSION__}
 Usage: punsctl <options>
+       punsctl [-s <symlink path>] <command>
+
+commands:
+    current           Print the active namespace
+    init <shell>      Print shell integration  (bash, zsh, fish)
+    daemon            Serve requests on a Unix socket in the root path
+    batch [file]      Run operations read from file or stdin
+    fleet [file]      Run operations on many rootspaces in parallel
+    clone <src> <dst> Copy namespace src to the new namespace dst
+    exec <ns> -- cmd  Run cmd with HOME in a private view of ns
+    check             Report dangling, foreign and missing links
+    repair            Fix what check reports   (-N prints the fixes)
+    which <entry>     Print the namespaces providing entry
+    gc                Prune unreferenced objects from the backup store
 
 options:
     -h                Help menu
     -v                Verbose mode             (The maximum is 1)
+    -t                Trace mode               (JSON timings on stderr)
     -r                Root path                (Default: ~/.ns)
     -s                Symlink path             (Default: ~/)
-    -l                List namespaces
+    -l [pattern]      List namespaces          (Optional glob filter)
+    -f <format>       Listing format           (text, json, nul)
     -n <namespace>    Create namespace
     -x <namespace>    Delete namespace
     -a <namespace>    Activate namespace
     -d                Deactivate namespaces
+    -w <namespace>    Switch to namespace
+    -N                Dry run                  (Print planned operations)
+    -A                Atomic replace mode      (Targets never go missing)
+    -j <jobs>         Parallel link operations (Default: 1)
+    -T                Tree mode                (Unfold into existing dirs)
+    -I                Indirect links           (Through .current_ns, O(1) switch)
+    -B                Back up into the store   (Root's .backups, not <name>.<ns>.bak)
+    -e                Stop batch on first error
+    -L                Hardlink files on clone  (Edits affect both)
+    -R                Remove recursively       (With -x, -d deactivates first)
+    -b                Remove in background     (Moves to the root's .trash)
+    -W <seconds>      Rootspace lock timeout   (Default: wait, 0: fail at once)
+    -P <processes>    Fleet worker processes   (Default: number of CPUs)
 """
 
-SGETOPT_STRING = "hlvd:s:r:n:d:a:x:"
+SGETOPT_STRING = "hlvteLRbNATIBd:s:r:n:d:a:x:w:j:f:W:P:"
 
 DEFAULT_ROOTSPACE_MKDIR_MODE = 0o744
 DEFAULT_NAMESPACE_MKDIR_MODE = 0o744
 
-DEFAULT_ROOTSPACE_PATH = f"{Path.home()}/.ns"
-DEFAULT_SYMLINK_PATH = f"{Path.home()}"
+DEFAULT_JOBS = 1
+
+DEFAULT_ROOTSPACE_PATH = f"{expanduser('~')}/.ns"
+DEFAULT_SYMLINK_PATH = f"{expanduser('~')}"
 CURRENT_NS_SYMLINK_NAME = ".current_ns"
+MANIFEST_NAME = f"{CURRENT_NS_SYMLINK_NAME}.manifest"
+
+LOCK_NAME = ".punsctl.lock"
+INDEX_NAME = ".punsctl.index"
+TRASH_NAME = ".trash"
+BACKUP_STORE_NAME = ".backups"
+ROOTSPACE_RESERVED_NAMES = (TRASH_NAME, BACKUP_STORE_NAME)
+
+DAEMON_SOCKET_NAME = ".punsctl.sock"
+DAEMON_SOCKET_MODE = 0o600
@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Content-addressed backup store under the root path. Entries a namespace
+activation would overwrite are moved into the store instead of being
+renamed to "<name>.<namespace>.bak" next to the link. Regular files are
+stored once per content hash; directories and symlinks are moved in as
+they are. index.json records, per backed up path, a stack of backups, so
+repeated activations over new files never skip a backup or lose one.
+"""
+
+import errno
+import json
+import logging
+import os
+import stat
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from punsctl.fscopy import copy_file, move
+from punsctl.trace import tracer
+
+__all__ = ["STORE_BACKUP", "BackupStore", "stash_name"]
+
+# Manifest backup value of entries backed up into the store. NUL can't
+# appear in a file name, so it never collides with an in-place backup.
+STORE_BACKUP = "\0store"
+
+INDEX_VERSION = 1
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def stash_name(name: str) -> str:
+    head, tail = os.path.split(name)
+    return os.path.join(head, f".{tail}.{os.getpid()}.punsctl.stash")
+
+
+class BackupStore(object):
+    def __init__(self, path: Path):
+        self.path = path
+        self.objects_path = Path(f"{path}/objects")
+        self.index_path = Path(f"{path}/index.json")
+        self.lock = threading.RLock()
+
+        # backed up path -> backups, the latest last
+        self.records: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self.records_key: Optional[Tuple[int, int, int]] = None
+
+    def __get_index_key(self) -> Optional[Tuple[int, int, int]]:
+        if tracer.enabled:
+            tracer.count("stats")
+
+        try:
+            st = os.stat(self.index_path)
+
+        except FileNotFoundError:
+            return None
+
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def __load(self) -> Dict[str, List[Dict[str, Any]]]:
+        # Reread only when another process saved the index since, a long
+        # running daemon shares the store with direct invocations
+        key = self.__get_index_key()
+        if self.records is not None and key == self.records_key:
+            return self.records
+
+        self.records_key = key
+
+        try:
+            with open(self.index_path) as fd:
+                data = json.load(fd)
+
+            if data.get("version") != INDEX_VERSION:
+                raise ValueError(f"unsupported version {data.get('version')}")
+
+            self.records = {key: list(value) for key, value in data["paths"].items()}
+
+        except FileNotFoundError:
+            self.records = {}
+
+        except (ValueError, KeyError, TypeError, AttributeError) as exc:
+            # Refusing beats silently forgetting where backups are
+            raise OSError(f"unreadable backup index {self.index_path}: {exc}")
+
+        return self.records
+
+    def save(self) -> None:
+        with self.lock:
+            if self.records is None:
+                return
+
+            os.makedirs(self.path, mode=0o700, exist_ok=True)
+
+            tmp = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as fd:
+                json.dump(
+                    {"version": INDEX_VERSION, "paths": self.records},
+                    fd,
+                    separators=(",", ":"),
+                )
+            os.rename(tmp, self.index_path)
+
+            self.records_key = self.__get_index_key()
+
+    def has(self, key: str) -> bool:
+        with self.lock:
+            return len(self.__load().get(key, [])) > 0
+
+    def get_owners(self) -> Dict[str, str]:
+        """
+        Returns, for every path with a backup, the namespace whose activation
+        displaced the latest one, "" for backups that don't record it. A
+        missing index costs a single stat.
+        """
+
+        with self.lock:
+            return {
+                key: records[-1].get("namespace", "")
+                for key, records in self.__load().items()
+                if records
+            }
+
+    def get_records(self) -> Dict[str, List[Dict[str, Any]]]:
+        with self.lock:
+            return {key: list(value) for key, value in self.__load().items()}
+
+    def __object_path(self, object_id: str) -> str:
+        return f"{self.objects_path}/{object_id[:2]}/{object_id}"
+
+    @staticmethod
+    def __hash(name: str, dir_fd: int) -> str:
+        # hashlib and uuid are imported on first use, they slow down startup
+        import hashlib
+
+        digest = hashlib.sha256()
+
+        fd = os.open(name, os.O_RDONLY | os.O_NOFOLLOW, dir_fd=dir_fd)
+        with os.fdopen(fd, "rb") as source:
+            for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+
+        return digest.hexdigest()
+
+    def __references(self, object_id: str) -> int:
+        return sum(
+            1
+            for records in self.__load().values()
+            for record in records
+            if record["object"] == object_id
+        )
+
+    @staticmethod
+    def __get_path(name: str, key: str) -> str:
+        # name is key's entry or its stash_name(), in key's directory
+        return f"{os.path.dirname(key)}/{os.path.basename(name)}"
+
+    def hand_over(self, key: str, previous: str, namespace: str) -> None:
+        """
+        Makes namespace the owner of the latest backup of key, displaced by
+        previous, when a switch keeps the link in place.
+        """
+
+        with self.lock:
+            records = self.__load().get(key)
+            if not records or records[-1].get("namespace", "") not in ("", previous):
+                raise FileNotFoundError(errno.ENOENT, f"no backup of {previous}", key)
+
+            records[-1]["namespace"] = namespace
+
+    def stash(
+        self,
+        name: str,
+        key: str,
+        dir_fd: int,
+        jobs: int = 1,
+        namespace: Optional[str] = None,
+    ) -> None:
+        """
+        Moves name, relative to dir_fd, into the store as the latest backup
+        of key, displaced by namespace. A file whose content is already
+        stored is just unlinked. Across filesystems the entry is copied, a
+        tree on up to jobs threads.
+        """
+
+        st = os.lstat(name, dir_fd=dir_fd)
+
+        if stat.S_ISREG(st.st_mode):
+            object_id = self.__hash(name, dir_fd)
+            kind = "file"
+        else:
+            import uuid
+
+            object_id = uuid.uuid4().hex
+            kind = "dir" if stat.S_ISDIR(st.st_mode) else "other"
+
+        path = self.__object_path(object_id)
+
+        with self.lock:
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+
+            if os.path.lexists(path):
+                if tracer.enabled:
+                    tracer.count("store_dedups")
+                os.unlink(name, dir_fd=dir_fd)
+            else:
+                try:
+                    os.rename(name, path, src_dir_fd=dir_fd)
+
+                except OSError as exc:
+                    if exc.errno != errno.EXDEV:
+                        raise
+                    move(self.__get_path(name, key), path, jobs=jobs)
+
+            record = {
+                "object": object_id,
+                "type": kind,
+                "mode": stat.S_IMODE(st.st_mode),
+            }
+            if namespace is not None:
+                record["namespace"] = namespace
+            self.__load().setdefault(key, []).append(record)
+
+        logging.debug("debug: store: %s stashed as %s", key, object_id)
+
+    def unstash(
+        self,
+        name: str,
+        key: str,
+        dir_fd: int,
+        jobs: int = 1,
+        namespace: Optional[str] = None,
+    ) -> None:
+        """
+        Restores the latest backup of key to name, relative to dir_fd, if
+        namespace displaced it. A file object still referenced by other
+        backups is copied out, anything else is moved out of the store, see
+        stash() for jobs. Nothing is ever restored over an existing entry.
+        """
+
+        with self.lock:
+            records = self.__load().get(key)
+            if not records:
+                raise FileNotFoundError(errno.ENOENT, "no backup in store", key)
+
+            record = records[-1]
+            owner = record.get("namespace")
+            if namespace is not None and owner not in (None, namespace):
+                raise FileNotFoundError(
+                    errno.ENOENT, f"latest backup displaced by {owner}", key
+                )
+
+            try:
+                os.lstat(name, dir_fd=dir_fd)
+
+            except FileNotFoundError:
+                pass
+
+            else:
+                raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), name)
+
+            path = self.__object_path(record["object"])
+            shared = (
+                record["type"] == "file" and self.__references(record["object"]) > 1
+            )
+
+            if shared:
+                copy_file(path, name, record["mode"], dst_dir_fd=dir_fd)
+            else:
+                try:
+                    os.rename(path, name, dst_dir_fd=dir_fd)
+
+                except OSError as exc:
+                    if exc.errno != errno.EXDEV:
+                        raise
+                    move(path, self.__get_path(name, key), jobs=jobs)
+
+                if record["type"] == "file":
+                    os.chmod(name, record["mode"], dir_fd=dir_fd)
+
+            records.pop()
+            if not records:
+                del self.__load()[key]
+
+        logging.debug("debug: store: %s restored from %s", key, record["object"])
+
+    def gc(self, dry_run: bool = False) -> Tuple[int, int]:
+        """
+        Removes objects no backup refers to, e.g. left behind by an
+        interrupted run, and records whose object is gone. Returns the
+        number of objects removed and the bytes they took, or would be
+        with dry_run.
+        """
+
+        removed, size = 0, 0
+
+        with self.lock:
+            records = self.__load()
+            referenced = {
+                record["object"] for values in records.values() for record in values
+            }
+
+            if os.path.isdir(self.objects_path):
+                for fan_out in os.scandir(self.objects_path):
+                    for entry in os.scandir(fan_out.path):
+                        if entry.name in referenced:
+                            continue
+
+                        size += entry.stat(follow_symlinks=False).st_size
+                        removed += 1
+                        if dry_run:
+                            continue
+
+                        if entry.is_dir(follow_symlinks=False):
+                            # Imported here, fsremove spawns processes
+                            from punsctl.fsremove import remove_tree
+
+                            remove_tree(entry.path)
+                        else:
+                            os.unlink(entry.path)
+
+                    if not dry_run and not os.listdir(fan_out.path):
+                        os.rmdir(fan_out.path)
+
+            if dry_run:
+                return removed, size
+
+            for key in list(records):
+                records[key] = [
+                    record
+                    for record in records[key]
+                    if os.path.lexists(self.__object_path(record["object"]))
+                ]
+                if not records[key]:
+                    del records[key]
+
+        self.save()
+
+        return removed, size
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Any, ContextManager, Dict, Iterator, Optional, TextIO
+
+__all__ = ["Tracer", "tracer"]
+
+
+class Tracer(object):
+    """
+    Collects wall time per phase and per operation counters for one run.
+    Disabled tracers hand out a shared no-op context and callers guard
+    counters with "if tracer.enabled", so hot paths pay one attribute
+    lookup when tracing is off.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.started = 0.0
+        self.phases: Dict[str, float] = {}
+        self.counters: Counter = Counter()
+        self.lock = threading.Lock()
+        self.null = nullcontext()
+
+    def enable(self) -> None:
+        self.enabled = True
+        self.started = time.perf_counter()
+
+    def disable(self) -> None:
+        self.enabled = False
+        self.phases = {}
+        self.counters = Counter()
+
+    def phase(self, name: str) -> ContextManager:
+        if not self.enabled:
+            return self.null
+
+        return self.__phase(name)
+
+    @contextmanager
+    def __phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        with self.lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self.lock:
+            self.counters[name] += value
+
+    def report(self) -> Dict[str, Any]:
+        from punsctl import __VERSION__
+
+        return {
+            "version": __VERSION__,
+            "argv": sys.argv[1:],
+            "wall": time.perf_counter() - self.started,
+            "phases": dict(sorted(self.phases.items())),
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def dump(self, stream: Optional[TextIO] = None) -> None:
+        stream = stream if stream is not None else sys.stderr
+        stream.write(f"{json.dumps(self.report())}\n")
+
+
+tracer = Tracer()
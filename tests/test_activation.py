@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+from pathlib import Path
+
+import pytest
+
+from punsctl.namespace import Namespace
+from punsctl.rootspace import RootSpace
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+def test_activation_links_and_backups(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    ns = Namespace(root_space=rs, name="work")
+    ns.create()
+
+    Path(f"{ns.get_path()}/.gitconfig").write_text("work")
+    Path(f"{ns.get_path()}/.ssh").mkdir()
+    Path(f"{ns.get_path()}/.ignored").write_text("ignored")
+    Path(f"{ns.get_path()}/.nsignore").write_text(".ignored\n.nsignore\n")
+
+    Path(f"{symlink_tmpdir}/.gitconfig").write_text("home")
+
+    ns.activate()
+
+    gitconfig = Path(f"{symlink_tmpdir}/.gitconfig")
+    assert gitconfig.is_symlink() is True
+    assert gitconfig.read_text() == "work"
+    assert Path(f"{symlink_tmpdir}/.gitconfig.work.bak").read_text() == "home"
+    assert Path(f"{symlink_tmpdir}/.ssh").is_symlink() is True
+    assert Path(f"{symlink_tmpdir}/.ignored").exists() is False
+    assert Path(f"{symlink_tmpdir}/.nsignore").exists() is False
+
+    # Activating twice keeps the existing links untouched
+    ns.activate()
+    assert Path(f"{symlink_tmpdir}/.gitconfig.work.bak").read_text() == "home"
+
+    ns.deactivate()
+
+    assert gitconfig.is_symlink() is False
+    assert gitconfig.read_text() == "home"
+    assert Path(f"{symlink_tmpdir}/.gitconfig.work.bak").exists() is False
+    assert Path(f"{symlink_tmpdir}/.ssh").exists() is False
+    assert ns.active() is False
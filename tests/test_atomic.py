@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+from pathlib import Path
+
+import pytest
+
+from punsctl import atomic
+from punsctl.namespace import Namespace
+from punsctl.plan import Operation
+from punsctl.rootspace import RootSpace
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture(params=[True, False], ids=["renameat2", "fallback"])
+def exchange_support(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(atomic, "_get_renameat2", lambda: None)
+
+    return request.param
+
+
+def make_namespace(rs, name, entries):
+    ns = Namespace(root_space=rs, name=name, atomic=True)
+    ns.create()
+
+    for entry in entries:
+        Path(f"{ns.get_path()}/{entry}").write_text(f"{name}:{entry}")
+
+    return ns
+
+
+def test_atomic_activation_and_deactivation(
+    root_tmpdir, symlink_tmpdir, exchange_support
+):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    Path(f"{symlink_tmpdir}/.gitconfig").write_text("home")
+    Path(f"{symlink_tmpdir}/.ssh").mkdir()
+    Path(f"{symlink_tmpdir}/.ssh/config").write_text("home")
+
+    ns = make_namespace(rs, "work", [".gitconfig"])
+    Path(f"{ns.get_path()}/.ssh").mkdir()
+
+    plan = ns.plan_activate()
+    assert [operation.action for operation in plan] == [
+        Operation.SYMLINK,
+        Operation.EXCHANGE,
+        Operation.EXCHANGE,
+    ]
+
+    plan.apply()
+
+    assert Path(f"{symlink_tmpdir}/.gitconfig").read_text() == "work:.gitconfig"
+    assert Path(f"{symlink_tmpdir}/.gitconfig.work.bak").read_text() == "home"
+    assert Path(f"{symlink_tmpdir}/.ssh").is_symlink() is True
+    assert Path(f"{symlink_tmpdir}/.ssh.work.bak/config").read_text() == "home"
+
+    ns.deactivate()
+
+    assert Path(f"{symlink_tmpdir}/.gitconfig").read_text() == "home"
+    assert Path(f"{symlink_tmpdir}/.ssh").is_symlink() is False
+    assert Path(f"{symlink_tmpdir}/.ssh/config").read_text() == "home"
+    assert sorted(path.name for path in symlink_tmpdir.iterdir()) == [
+        ".gitconfig",
+        ".ssh",
+    ]
+
+
+def test_atomic_switch_replaces_links(root_tmpdir, symlink_tmpdir, exchange_support):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+
+    work = make_namespace(rs, "work", [".gitconfig"])
+    home = make_namespace(rs, "home", [".gitconfig"])
+
+    work.activate()
+
+    plan = home.plan_switch()
+    assert [operation.action for operation in plan] == [
+        Operation.REPLACE,
+        Operation.REPLACE,
+    ]
+
+    plan.apply()
+
+    assert home.active() is True
+    assert Path(f"{symlink_tmpdir}/.gitconfig").read_text() == "home:.gitconfig"
+    assert sorted(path.name for path in symlink_tmpdir.iterdir()) == [
+        ".current_ns",
+        ".current_ns.manifest",
+        ".gitconfig",
+    ]
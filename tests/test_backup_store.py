@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import os
+from pathlib import Path
+
+import pytest
+
+from punsctl.namespace import Namespace
+from punsctl.ops import execute
+from punsctl.rootspace import RootSpace
+from punsctl.session import Session
+from punsctl.trace import tracer
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+def make_namespace(rs, name, entries, atomic=False):
+    ns = Namespace(root_space=rs, name=name, atomic=atomic, store=True)
+    ns.create()
+
+    for entry in entries:
+        Path(f"{ns.get_path()}/{entry}").write_text(f"{name}:{entry}")
+
+    return ns
+
+
+def count_objects(root_tmpdir):
+    return sum(len(files) for _, _, files in os.walk(f"{root_tmpdir}/.backups/objects"))
+
+
+@pytest.mark.parametrize("atomic", [False, True])
+def test_activate_stashes_and_deactivate_restores(root_tmpdir, symlink_tmpdir, atomic):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    ns = make_namespace(rs, "work", [".bashrc", ".config"], atomic=atomic)
+
+    Path(f"{symlink_tmpdir}/.bashrc").write_text("original")
+    os.chmod(f"{symlink_tmpdir}/.bashrc", 0o600)
+    Path(f"{symlink_tmpdir}/.config").mkdir()
+    Path(f"{symlink_tmpdir}/.config/app").write_text("settings")
+
+    ns.activate()
+
+    assert sorted(os.listdir(symlink_tmpdir)) == [
+        ".bashrc",
+        ".config",
+        ".current_ns",
+        ".current_ns.manifest",
+    ]
+    assert Path(f"{symlink_tmpdir}/.bashrc").read_text() == "work:.bashrc"
+    assert count_objects(root_tmpdir) == 2
+
+    ns.deactivate()
+
+    assert sorted(os.listdir(symlink_tmpdir)) == [".bashrc", ".config"]
+    assert not Path(f"{symlink_tmpdir}/.bashrc").is_symlink()
+    assert Path(f"{symlink_tmpdir}/.bashrc").read_text() == "original"
+    assert os.stat(f"{symlink_tmpdir}/.bashrc").st_mode & 0o777 == 0o600
+    assert Path(f"{symlink_tmpdir}/.config/app").read_text() == "settings"
+    assert count_objects(root_tmpdir) == 0
+    assert rs.get_backup_store().get_records() == {}
+
+
+def test_identical_backups_are_stored_once(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    work = make_namespace(rs, "work", [".a", ".b"])
+
+    Path(f"{symlink_tmpdir}/.a").write_text("same")
+    Path(f"{symlink_tmpdir}/.b").write_text("same")
+
+    work.activate()
+
+    assert count_objects(root_tmpdir) == 1
+    assert len(rs.get_backup_store().get_records()) == 2
+
+    work.deactivate()
+
+    assert Path(f"{symlink_tmpdir}/.a").read_text() == "same"
+    assert Path(f"{symlink_tmpdir}/.b").read_text() == "same"
+    assert count_objects(root_tmpdir) == 0
+
+
+def test_existing_backup_doesnt_skip_link(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    work = make_namespace(rs, "work", [".rc"])
+
+    Path(f"{symlink_tmpdir}/.rc").write_text("first")
+    work.activate()
+
+    # Replaced by hand while active, then activated again
+    os.unlink(f"{symlink_tmpdir}/.rc")
+    Path(f"{symlink_tmpdir}/.rc").write_text("second")
+    work.activate()
+
+    assert Path(f"{symlink_tmpdir}/.rc").read_text() == "work:.rc"
+    assert not Path(f"{symlink_tmpdir}/.rc.work.bak").exists()
+
+    work.deactivate()
+    assert Path(f"{symlink_tmpdir}/.rc").read_text() == "second"
+
+
+def test_switch_keeps_store_backups(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    work = make_namespace(rs, "work", [".shared", ".work"])
+    home = make_namespace(rs, "home", [".shared", ".home"])
+
+    Path(f"{symlink_tmpdir}/.shared").write_text("original")
+    Path(f"{symlink_tmpdir}/.work").write_text("original work")
+
+    work.activate()
+    home.switch()
+
+    assert Path(f"{symlink_tmpdir}/.shared").read_text() == "home:.shared"
+    assert Path(f"{symlink_tmpdir}/.work").read_text() == "original work"
+
+    home.deactivate()
+
+    assert sorted(os.listdir(symlink_tmpdir)) == [".shared", ".work"]
+    assert Path(f"{symlink_tmpdir}/.shared").read_text() == "original"
+
+
+def test_store_is_not_a_namespace(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    work = make_namespace(rs, "work", [".rc"])
+
+    Path(f"{symlink_tmpdir}/.rc").write_text("original")
+    work.activate()
+
+    assert [path.name for path in rs.get_all_ns_paths()] == ["work"]
+
+
+def test_gc_prunes_unreferenced_objects(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    work = make_namespace(rs, "work", [".rc"])
+
+    Path(f"{symlink_tmpdir}/.rc").write_text("original")
+    work.activate()
+
+    # Left behind by an interrupted run
+    orphan = Path(f"{root_tmpdir}/.backups/objects/ff/ff00")
+    orphan.parent.mkdir(parents=True)
+    orphan.write_text("orphan")
+
+    assert count_objects(root_tmpdir) == 2
+    assert execute(rs, {"op": "gc", "symlink_path": str(symlink_tmpdir)}) == 0
+    assert count_objects(root_tmpdir) == 1
+    assert not orphan.parent.exists()
+
+    work.deactivate()
+    assert Path(f"{symlink_tmpdir}/.rc").read_text() == "original"
+
+
+def test_backup_is_restored_once_by_its_owner(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    make_namespace(rs, "a", [".rc"])
+    make_namespace(rs, "b", [".rc"])
+    session = Session(root_space=rs, store=True)
+
+    Path(f"{symlink_tmpdir}/.rc").write_text("v1")
+    session.activate("a")
+
+    os.unlink(f"{symlink_tmpdir}/.rc")
+    Path(f"{symlink_tmpdir}/.rc").write_text("v2")
+    session.activate("a")
+
+    # Without link and manifest every namespace providing .rc is asked
+    os.unlink(f"{symlink_tmpdir}/.rc")
+    os.unlink(f"{symlink_tmpdir}/.current_ns.manifest")
+
+    result = session.deactivate()
+
+    assert [op for op in result.applied if op.startswith("unstash")] == [
+        f"unstash .rc <- {symlink_tmpdir}/.rc"
+    ]
+    assert Path(f"{symlink_tmpdir}/.rc").read_text() == "v2"
+    assert len(rs.get_backup_store().get_records()[f"{symlink_tmpdir}/.rc"]) == 1
+
+
+def test_unstash_never_overwrites(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    work = make_namespace(rs, "work", [".rc"])
+
+    Path(f"{symlink_tmpdir}/.rc").write_text("original")
+    work.activate()
+
+    # Replaced by hand, then the backup is restored without the link
+    os.unlink(f"{symlink_tmpdir}/.rc")
+    plan = work.plan_deactivate()
+    Path(f"{symlink_tmpdir}/.rc").write_text("edited")
+
+    assert len(plan.apply()) == 1
+    assert Path(f"{symlink_tmpdir}/.rc").read_text() == "edited"
+    assert rs.get_backup_store().has(f"{symlink_tmpdir}/.rc")
+
+
+def test_store_index_is_read_once_per_plan(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    entries = [f".rc{ix}" for ix in range(200)]
+    work = make_namespace(rs, "work", entries)
+    work.store = False
+    work.activate()
+
+    def count_stats():
+        before = tracer.counters["stats"]
+        work.plan_activate()
+        return tracer.counters["stats"] - before
+
+    tracer.enable()
+    try:
+        without_store = count_stats()
+
+        Path(f"{symlink_tmpdir}/.rc0").unlink()
+        Path(f"{symlink_tmpdir}/.rc0").write_text("original")
+        work.store = True
+        work.activate()
+
+        assert count_stats() == without_store
+
+    finally:
+        tracer.disable()
+
+    assert without_store <= 5
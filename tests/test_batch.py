@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+from punsctl.batch import parse_line, run_batch
+from punsctl.exceptions import NamespaceException
+from punsctl.rootspace import RootSpace
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+def run(root_tmpdir, symlink_tmpdir, lines, stop_on_error=False):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    stream = io.StringIO()
+
+    failed = run_batch(
+        rs,
+        lines,
+        defaults={"symlink_path": str(symlink_tmpdir)},
+        stop_on_error=stop_on_error,
+        stream=stream,
+    )
+
+    return failed, [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_parse_line():
+    assert parse_line("  ") is None
+    assert parse_line("# comment") is None
+    assert parse_line("deactivate") == {"op": "deactivate"}
+    assert parse_line("create 'my ns'") == {"op": "create", "namespace": "my ns"}
+    assert parse_line("list work-*") == {"op": "list", "pattern": "work-*"}
+    assert parse_line('{"op": "switch", "namespace": "a", "atomic": true}') == {
+        "op": "switch",
+        "namespace": "a",
+        "atomic": True,
+    }
+
+    with pytest.raises(NamespaceException):
+        parse_line("create a b")
+
+    with pytest.raises(NamespaceException):
+        parse_line("{not json")
+
+
+def test_batch_keeps_going(root_tmpdir, symlink_tmpdir):
+    lines = [
+        "create a",
+        "create b",
+        "",
+        "activate a",
+        "activate b",
+        '{"op": "list", "format": "nul", "pattern": "a"}',
+        "switch b",
+    ]
+    failed, results = run(root_tmpdir, symlink_tmpdir, lines)
+
+    assert failed == 1
+    assert [result["line"] for result in results] == [1, 2, 4, 5, 6, 7]
+    assert [result["ok"] for result in results] == [True, True, True, False, True, True]
+    assert results[3]["error"].startswith("namespace error:")
+    assert results[4]["output"] == "a\0"
+    assert results[5]["output"] == "info: switched to b\n"
+    assert Path(f"{symlink_tmpdir}/.current_ns").resolve().name == "b"
+
+
+def test_batch_stop_on_error(root_tmpdir, symlink_tmpdir):
+    lines = ["create a", "create a", "create b"]
+    failed, results = run(root_tmpdir, symlink_tmpdir, lines, stop_on_error=True)
+
+    assert failed == 1
+    assert len(results) == 2
+    assert not Path(f"{root_tmpdir}/b").exists()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import importlib.util
+import json
+from pathlib import Path
+
+BENCH_PATH = Path(__file__).resolve().parent.parent / "benchmarks" / "bench.py"
+
+
+def load_bench():
+    spec = importlib.util.spec_from_file_location("bench", BENCH_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def test_benchmark_smoke(tmpdir):
+    bench = load_bench()
+    output = Path(f"{tmpdir}/results.json")
+
+    args = ["-n", "2", "-m", "4", "-r", "1", "-d", str(tmpdir), "-o", str(output)]
+    assert bench.main(args) == 0
+
+    results = json.loads(output.read_text())["results"]
+
+    assert set(results) == {
+        "rootspace_check",
+        "get_all_ns_paths",
+        "list",
+        "activate",
+        "switch",
+        "deactivate",
+        "startup_interpreter",
+        "startup_current",
+        "cli_list",
+        "cli_activate",
+        "cli_deactivate",
+    }
+    assert results["activate"]["syscalls"]["symlink"] >= 4
+    assert results["cli_list"]["syscalls"] is None
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import os
+import stat
+import sys
+from pathlib import Path
+
+import pytest
+
+from punsctl import fscopy
+from punsctl.exceptions import NamespaceException
+from punsctl.namespace import Namespace
+from punsctl.rootspace import RootSpace
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def source(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    ns = Namespace(root_space=rs, name="work", jobs=4)
+    ns.create()
+
+    Path(f"{ns.get_path()}/.config/app").mkdir(parents=True)
+    Path(f"{ns.get_path()}/.config/app/config").write_text("config")
+    Path(f"{ns.get_path()}/.gnupg").mkdir(mode=0o700)
+    Path(f"{ns.get_path()}/.gnupg/key").write_bytes(os.urandom(1 << 16))
+    Path(f"{ns.get_path()}/.gnupg/key").chmod(0o600)
+    Path(f"{ns.get_path()}/.gitconfig").symlink_to(".config/app/config")
+
+    return ns
+
+
+def assert_same_tree(src: Path, dst: Path) -> None:
+    for root, dirs, files in os.walk(src):
+        for name in dirs + files:
+            a = Path(f"{root}/{name}")
+            b = dst / a.relative_to(src)
+
+            assert stat.S_IMODE(a.lstat().st_mode) == stat.S_IMODE(b.lstat().st_mode)
+
+            if a.is_symlink():
+                assert os.readlink(a) == os.readlink(b)
+            elif a.is_file():
+                assert a.read_bytes() == b.read_bytes()
+
+
+def test_clone_copies_tree(source, root_tmpdir):
+    counts = source.clone("home")
+
+    assert_same_tree(source.get_path(), Path(f"{root_tmpdir}/home"))
+    assert counts["dirs"] == 4
+    assert counts["symlinks"] == 1
+    assert sum(counts.get(m, 0) for m in ("reflink", "copy_file_range")) == 2
+    assert [p.name for p in root_tmpdir.iterdir() if p.name.startswith(".")] == []
+
+
+def test_clone_hardlink(source, root_tmpdir):
+    counts = source.clone("home", hardlink=True)
+
+    assert counts["hardlink"] == 2
+    key = Path(f"{root_tmpdir}/home/.gnupg/key")
+    assert key.stat().st_ino == Path(f"{source.get_path()}/.gnupg/key").stat().st_ino
+
+
+@pytest.mark.parametrize("method", ["sendfile", "copy"])
+def test_clone_fallbacks(source, root_tmpdir, monkeypatch, method):
+    monkeypatch.setattr(fscopy, "_reflink", lambda src_fd, dst_fd: False)
+    monkeypatch.delattr(os, "copy_file_range", raising=False)
+    if method == "sendfile" and not sys.platform.startswith("linux"):
+        pytest.skip("sendfile copies between files only on Linux")
+    if method == "copy":
+        # Elsewhere sendfile refuses regular files, e.g. ENOTSOCK on macOS
+        monkeypatch.setattr(sys, "platform", "darwin")
+
+    counts = source.clone("home")
+
+    assert counts[method] == 2
+    assert_same_tree(source.get_path(), Path(f"{root_tmpdir}/home"))
+
+
+def test_clone_errors(source, root_tmpdir, monkeypatch):
+    with pytest.raises(NamespaceException):
+        source.clone("work")
+
+    def fail(src, dst, mode):
+        raise PermissionError(13, "Permission denied", src)
+
+    monkeypatch.setattr(fscopy, "copy_file", fail)
+
+    with pytest.raises(NamespaceException):
+        source.clone("home")
+
+    # The partial copy is removed with its temporary directory
+    assert sorted(p.name for p in root_tmpdir.iterdir()) == ["work"]
+
+
+def test_interrupted_clone_is_not_a_namespace(source, root_tmpdir, symlink_tmpdir):
+    Path(f"{root_tmpdir}/.home.{os.getpid()}.punsctl.tmp").mkdir()
+
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    assert [entry.name for entry in rs.iter_ns_entries()] == ["work"]
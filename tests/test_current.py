@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from punsctl.current import get_current_ns_name, main
+from punsctl.namespace import Namespace
+from punsctl.rootspace import RootSpace
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+def test_current_namespace(root_tmpdir, symlink_tmpdir, capsys):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    assert get_current_ns_name(str(symlink_tmpdir)) is None
+
+    assert main(symlink_path=str(symlink_tmpdir)) == 0
+    assert capsys.readouterr().out == ""
+
+    Namespace(root_space=rs, name="work").create()
+    Namespace(root_space=rs, name="work").activate()
+
+    assert get_current_ns_name(str(symlink_tmpdir)) == "work"
+    assert main(symlink_path=str(symlink_tmpdir)) == 0
+    assert capsys.readouterr().out == "work\n"
+
+
+def test_current_fast_path_imports(symlink_tmpdir):
+    # The fast path must not pull in the rest of punsctl
+    script = (
+        "import sys\n"
+        "from punsctl.cli import main\n"
+        "sys.argv = ['punsctl', 'current']\n"
+        "try:\n"
+        "    main()\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print(sorted(m for m in sys.modules if m.startswith('punsctl')))\n"
+    )
+    env = {"NS_SYMLINK": str(symlink_tmpdir), "PATH": ""}
+    out = subprocess.run(
+        [sys.executable, "-c", script],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+        cwd=str(Path(__file__).resolve().parent.parent),
+    ).stdout.splitlines()
+
+    assert out[-1] == str(
+        ["punsctl", "punsctl.cli", "punsctl.current", "punsctl.static"]
+    )
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from punsctl.client import call, get_socket_path
+from punsctl.daemon import Daemon, RWLock
+from punsctl.main import main
+from punsctl.namespace import Namespace
+from punsctl.rootspace import RootSpace
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def daemon(root_tmpdir):
+    service = Daemon(str(root_tmpdir))
+    service.bind()
+
+    thread = threading.Thread(target=service.serve_forever, daemon=True)
+    thread.start()
+
+    yield service
+
+    service.shutdown()
+    thread.join()
+    service.close()
+
+
+def test_client_without_daemon(root_tmpdir):
+    assert call(get_socket_path(str(root_tmpdir)), {"op": "ping"}) is None
+
+
+def test_daemon_requests(daemon, root_tmpdir, symlink_tmpdir):
+    socket_path = get_socket_path(str(root_tmpdir))
+    base = {"symlink_path": str(symlink_tmpdir)}
+
+    response = call(socket_path, {"op": "create", "namespace": "work", **base})
+    assert response == {
+        "ok": True,
+        "status": 0,
+        "error": None,
+        "output": "info: work created\n",
+    }
+
+    Path(f"{root_tmpdir}/work/.gitconfig").write_text("")
+
+    response = call(socket_path, {"op": "list", "format": "nul", **base})
+    assert response["output"] == "work\0"
+
+    response = call(socket_path, {"op": "activate", "namespace": "work", **base})
+    assert response["ok"]
+    assert Path(f"{symlink_tmpdir}/.gitconfig").is_symlink()
+
+    response = call(socket_path, {"op": "current", **base})
+    assert response["output"] == "work\n"
+
+    response = call(socket_path, {"op": "create", "namespace": "work", **base})
+    assert response["ok"] is False
+    assert response["error"].startswith("namespace error:")
+
+    response = call(socket_path, {"op": "deactivate", **base})
+    assert response["ok"]
+    assert not Path(f"{symlink_tmpdir}/.gitconfig").exists()
+
+    assert call(socket_path, {"op": "list"})["error"] == "invalid request"
+
+    response = call(socket_path, {"op": "list", "symlink_path": "workspace"})
+    assert response["error"] == "invalid request: symlink path must be absolute"
+
+
+def test_relative_symlink_path_is_the_callers(
+    tmpdir, root_tmpdir, symlink_tmpdir, monkeypatch, capsys
+):
+    daemon_cwd = Path(f"{tmpdir}/elsewhere")
+    daemon_cwd.mkdir()
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([str(Path(__file__).parent.parent)] + sys.path)
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "from punsctl.main import main; main()",
+            "-r",
+            str(root_tmpdir),
+            "-s",
+            str(daemon_cwd),
+            "daemon",
+        ],
+        cwd=daemon_cwd,
+        env=env,
+    )
+
+    try:
+        socket_path = get_socket_path(str(root_tmpdir))
+        for _ in range(500):
+            if call(socket_path, {"op": "ping", "symlink_path": "/"}) is not None:
+                break
+            time.sleep(0.01)
+
+        Path(f"{root_tmpdir}/work").mkdir()
+        Path(f"{root_tmpdir}/work/.gitconfig").write_text("")
+
+        monkeypatch.chdir(symlink_tmpdir)
+        monkeypatch.delenv("NS_NO_DAEMON", raising=False)
+        monkeypatch.delenv("NS_TRACE", raising=False)
+
+        with pytest.raises(SystemExit) as exc:
+            main(["-r", str(root_tmpdir), "-s", ".", "-a", "work"])
+
+        assert exc.value.code == 0
+        assert capsys.readouterr().out == "info: work activated\n"
+
+    finally:
+        process.terminate()
+        process.wait()
+
+    assert Path(f"{symlink_tmpdir}/.gitconfig").is_symlink()
+    assert os.listdir(daemon_cwd) == []
+
+
+def test_daemon_socket_is_removed(root_tmpdir):
+    service = Daemon(str(root_tmpdir))
+    service.bind()
+    assert Path(service.socket_path).exists()
+
+    service.close()
+    assert not Path(service.socket_path).exists()
+
+
+def test_rwlock_readers_share_writers_exclude():
+    lock = RWLock()
+    events = []
+
+    def reader(ix):
+        with lock.read():
+            events.append(("read", ix))
+            time.sleep(0.05)
+            events.append(("read-done", ix))
+
+    def writer():
+        with lock.write():
+            events.append(("write", 0))
+            time.sleep(0.02)
+            events.append(("write-done", 0))
+
+    threads = [threading.Thread(target=reader, args=(ix,)) for ix in range(2)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.01)
+
+    threads.append(threading.Thread(target=writer))
+    threads[-1].start()
+    for thread in threads:
+        thread.join()
+
+    # Both readers were inside at once, the writer waited for both
+    assert [event for event, _ in events[:2]] == ["read", "read"]
+    assert events[-2:] == [("write", 0), ("write-done", 0)]
+
+
+def test_rootspace_listing_cache(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    Namespace(root_space=rs, name="a").create()
+
+    assert [entry.name for entry in rs.iter_ns_entries()] == ["a"]
+    assert rs.ns_entries_cache is not None
+
+    # A namespace created behind the cache changes the root's stat
+    Path(f"{root_tmpdir}/b").mkdir()
+    assert sorted(entry.name for entry in rs.iter_ns_entries()) == ["a", "b"]
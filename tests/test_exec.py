@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from punsctl.exceptions import NamespaceException
+from punsctl.execns import run_in_namespace
+from punsctl.namespace import Namespace
+from punsctl.rootspace import RootSpace
+from punsctl.sgetopt import sgetopt
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def namespaces(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+
+    for name in ("work", "home"):
+        Namespace(root_space=rs, name=name).create()
+        Path(f"{root_tmpdir}/{name}/.gitconfig").write_text(name)
+
+    Namespace(root_space=rs, name="home").activate()
+
+    return rs
+
+
+def test_exec_private_view(namespaces, root_tmpdir, symlink_tmpdir, tmpdir):
+    out = Path(f"{tmpdir}/out")
+    script = (
+        "import os, sys\n"
+        "home = os.environ['HOME']\n"
+        "print(home, os.environ['XDG_CONFIG_HOME'], file=open(sys.argv[1], 'w'))\n"
+        "print(open(f'{home}/.gitconfig').read(), file=open(sys.argv[1], 'a'))\n"
+        "sys.exit(7)\n"
+    )
+
+    returncode = run_in_namespace(
+        root_tmpdir, "work", [sys.executable, "-c", script, str(out)]
+    )
+
+    assert returncode == 7
+
+    home, content = out.read_text().splitlines()[:2]
+    assert home.split()[1] == f"{home.split()[0]}/.config"
+    assert content == "work"
+
+    # The view is gone and the shared symlink path is untouched
+    assert not Path(home.split()[0]).exists()
+    assert Path(f"{symlink_tmpdir}/.gitconfig").read_text() == "home"
+
+
+def test_exec_errors(namespaces, root_tmpdir):
+    before = set(Path(tempfile.gettempdir()).glob("punsctl-*"))
+
+    assert run_in_namespace(root_tmpdir, "work", ["punsctl-no-such-command"]) == 127
+
+    with pytest.raises(NamespaceException):
+        run_in_namespace(root_tmpdir, "missing", ["true"])
+
+    assert set(Path(tempfile.gettempdir()).glob("punsctl-*")) == before
+
+
+def test_sgetopt_passes_through_after_double_dash():
+    parsed = []
+
+    @sgetopt(args=["-v", "exec", "work", "--", "git", "-c", "x=y"], optstring="va:")
+    def main(opts, argv):
+        parsed.extend([opts, argv])
+
+    main()
+
+    assert parsed == [[("-v", "")], ["exec", "work", "git", "-c", "x=y"]]
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import io
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from punsctl.exceptions import NamespaceException
+from punsctl.fleet import parse_target, run_fleet
+
+
+@pytest.fixture
+def accounts(tmpdir):
+    """
+    Rootspace and symlink path of four accounts, each with a "work"
+    namespace providing .gitconfig.
+    """
+
+    paths = []
+    for ix in range(4):
+        root = Path(f"{tmpdir}/account{ix}/.ns")
+        home = Path(f"{tmpdir}/account{ix}/home")
+        Path(f"{root}/work").mkdir(parents=True)
+        home.mkdir()
+        Path(f"{root}/work/.gitconfig").write_text(f"account{ix}")
+        paths.append((root, home))
+
+    return paths
+
+
+def run(lines, **kwargs):
+    stream = io.StringIO()
+    failed = run_fleet(lines, stream=stream, **kwargs)
+
+    results = [json.loads(line) for line in stream.getvalue().splitlines()]
+    return failed, results[:-1], results[-1]
+
+
+def test_parse_target():
+    assert parse_target("/r /s activate work") == {
+        "op": "activate",
+        "namespace": "work",
+        "root_path": "/r",
+        "symlink_path": "/s",
+    }
+    assert parse_target("'/r 1' /s clone a b")["target"] == "b"
+    assert parse_target('{"op": "list", "root_path": "/r", "symlink_path": "/s"}')
+    assert parse_target("# comment") is None
+
+    for line in ("/r activate", '{"op": "list", "root_path": "/r"}'):
+        with pytest.raises(NamespaceException):
+            parse_target(line)
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_fleet_activates_every_account(accounts, processes):
+    lines = [f"{root} {home} activate work" for root, home in accounts]
+
+    failed, results, summary = run(lines, processes=processes)
+
+    assert failed == 0
+    assert [result["line"] for result in results] == [1, 2, 3, 4]
+    assert all(result["ok"] and result["seconds"] >= 0 for result in results)
+    assert summary["targets"] == 4 and summary["failed"] == 0
+
+    for ix, (root, home) in enumerate(accounts):
+        assert Path(f"{home}/.gitconfig").read_text() == f"account{ix}"
+        assert os.readlink(f"{home}/.current_ns") == f"{root}/work"
+
+
+def test_fleet_reports_failures(accounts):
+    root, home = accounts[0]
+    lines = [
+        f"{root} {home} activate work",
+        f"{root} {home} activate missing",
+        "not a target",
+        json.dumps({"op": "list", "root_path": str(root), "symlink_path": str(home)}),
+    ]
+
+    failed, results, summary = run(lines, processes=2, defaults={"format": "nul"})
+
+    assert failed == 2
+    assert summary["failed"] == 2
+    assert [result["ok"] for result in results] == [True, False, False, True]
+    assert "doesn't exists" in results[1]["error"]
+    assert results[3]["output"] == "work\0"
+
+
+def test_fleet_dry_run_changes_nothing(accounts):
+    lines = [f"{root} {home} activate work" for root, home in accounts]
+
+    failed, results, _ = run(lines, processes=2, defaults={"dry_run": True})
+
+    assert failed == 0
+    assert all(result["output"].startswith("dry-run: ") for result in results)
+    assert all(os.listdir(home) == [] for _, home in accounts)
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import io
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from punsctl.fsck import (
+    CONFLICT,
+    CORRECT,
+    DANGLING,
+    FOREIGN,
+    IGNORED,
+    MISSING,
+    ORPHAN_BACKUP,
+    Finding,
+    Fsck,
+)
+from punsctl.namespace import Namespace
+from punsctl.ops import execute
+from punsctl.rootspace import RootSpace
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def broken(root_tmpdir, symlink_tmpdir):
+    """
+    An activation of work.v2 damaged in every way fsck knows about.
+    """
+
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+
+    for name, entries in (("work.v2", ["a", "b", "c", "d"]), ("home", ["a", "e"])):
+        Namespace(root_space=rs, name=name).create()
+        for entry in entries:
+            Path(f"{root_tmpdir}/{name}/{entry}").write_text(f"{name}:{entry}")
+
+    Path(f"{symlink_tmpdir}/a").write_text("original")
+    Namespace(root_space=rs, name="work.v2").activate()
+
+    # dangling: the entry was removed from the namespace
+    Path(f"{root_tmpdir}/work.v2/b").unlink()
+    # missing: the link was removed from home
+    Path(f"{symlink_tmpdir}/c").unlink()
+    # conflict: a real file where the namespace has an entry
+    Path(f"{symlink_tmpdir}/d").unlink()
+    Path(f"{symlink_tmpdir}/d").write_text("mine")
+    # foreign: a leftover link into another namespace
+    Path(f"{symlink_tmpdir}/e").symlink_to(f"{root_tmpdir}/home/e")
+    # orphan backup: nothing of home is linked
+    Path(f"{symlink_tmpdir}/f.home.bak").write_text("backup")
+    # not punsctl's
+    Path(f"{symlink_tmpdir}/g").symlink_to("/")
+
+    return rs
+
+
+def test_check_classifies(broken):
+    findings = {finding.name: finding.status for finding in Fsck(broken).scan()}
+
+    assert findings == {
+        ".current_ns": CORRECT,
+        "a": CORRECT,
+        "a.work.v2.bak": CORRECT,
+        "b": DANGLING,
+        "c": MISSING,
+        "d": CONFLICT,
+        "e": FOREIGN,
+        "f.home.bak": ORPHAN_BACKUP,
+    }
+
+
+def test_repair(broken, root_tmpdir, symlink_tmpdir):
+    stream = io.StringIO()
+    assert execute(broken, {"op": "repair"}, stream) == 1
+    assert "conflict: d (work.v2), left as is" in stream.getvalue()
+
+    assert not os.path.lexists(f"{symlink_tmpdir}/b")
+    assert not os.path.lexists(f"{symlink_tmpdir}/e")
+    assert Path(f"{symlink_tmpdir}/c").read_text() == "work.v2:c"
+    assert Path(f"{symlink_tmpdir}/d").read_text() == "mine"
+    assert Path(f"{symlink_tmpdir}/f").read_text() == "backup"
+
+    problems = Fsck(broken).scan()
+    assert [f for f in problems if f.status != CORRECT] == [
+        Finding("d", CONFLICT, "work.v2")
+    ]
+
+    # The rewritten manifest lets deactivation undo the repaired state
+    Namespace(root_space=broken, name="work.v2").deactivate()
+    assert Path(f"{symlink_tmpdir}/a").read_text() == "original"
+    assert not os.path.lexists(f"{symlink_tmpdir}/c")
+
+
+def test_repair_dangling_current_ns(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    ns = Namespace(root_space=rs, name="work")
+    ns.create()
+    Path(f"{ns.get_path()}/a").write_text("")
+    ns.activate()
+
+    Path(f"{ns.get_path()}/a").unlink()
+    ns.get_path().rmdir()
+
+    fsck = Fsck(rs)
+    assert {f.status for f in fsck.scan()} == {DANGLING}
+
+    fsck.plan_repair().apply()
+    assert sorted(p.name for p in symlink_tmpdir.iterdir()) == []
+
+
+def test_links_into_ignored_entries_are_kept(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    ns = Namespace(root_space=rs, name="work")
+    ns.create()
+    Path(f"{ns.get_path()}/.nsignore").write_text(".nsignore\n*.log\n")
+    Path(f"{ns.get_path()}/a").write_text("")
+    Path(f"{ns.get_path()}/debug.log").write_text("")
+    ns.activate()
+
+    Path(f"{symlink_tmpdir}/debug.log").symlink_to(f"{ns.get_path()}/debug.log")
+
+    fsck = Fsck(rs)
+    findings = {finding.name: finding.status for finding in fsck.scan()}
+    assert findings["debug.log"] == IGNORED
+    assert fsck.problems() == []
+
+    stream = io.StringIO()
+    assert execute(rs, {"op": "repair"}, stream) == 0
+    assert Path(f"{symlink_tmpdir}/debug.log").is_symlink()
+
+
+def test_repair_after_namespace_removed(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    ns = Namespace(root_space=rs, name="a")
+    ns.create()
+    Path(f"{ns.get_path()}/f1").write_text("a")
+    Path(f"{symlink_tmpdir}/f1").write_text("original")
+    ns.activate()
+
+    assert Path(f"{symlink_tmpdir}/f1.a.bak").read_text() == "original"
+    shutil.rmtree(ns.get_path())
+
+    findings = {finding.name: finding.status for finding in Fsck(rs).scan()}
+    assert findings["f1.a.bak"] == ORPHAN_BACKUP
+
+    stream = io.StringIO()
+    assert execute(rs, {"op": "repair"}, stream) == 0
+
+    assert sorted(p.name for p in symlink_tmpdir.iterdir()) == ["f1"]
+    assert Path(f"{symlink_tmpdir}/f1").read_text() == "original"
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import io
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from punsctl.namespace import Namespace
+from punsctl.ops import execute
+from punsctl.rootspace import RootSpace
+from punsctl.trace import tracer
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def root_space(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+
+    for name, entries in (("work", [".ssh", ".gitconfig"]), ("home", [".ssh"])):
+        Namespace(root_space=rs, name=name).create()
+        for entry in entries:
+            Path(f"{root_tmpdir}/{name}/{entry}").mkdir()
+
+    return rs
+
+
+@pytest.fixture
+def traced():
+    tracer.enable()
+    yield tracer
+    tracer.disable()
+
+
+def count_scandirs(func):
+    before = tracer.counters["scandirs"]
+    func()
+    return tracer.counters["scandirs"] - before
+
+
+def test_lookup(root_space):
+    index = root_space.get_index()
+
+    assert index.lookup(".ssh") == ["home", "work"]
+    assert index.lookup(".gitconfig") == ["work"]
+    assert index.lookup(".vimrc") == []
+    assert index.get_entries("work") == {".ssh": True, ".gitconfig": True}
+    assert index.get_entries("missing") is None
+
+
+def test_incremental_refresh(root_space, root_tmpdir, symlink_tmpdir, traced):
+    assert count_scandirs(root_space.get_index().refresh) == 3
+
+    # A fresh instance loads the index from disk and scans only the root
+    index = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir).get_index()
+    assert count_scandirs(index.refresh) == 1
+
+    # The root listing is cached as well, only the changed namespace is read
+    Path(f"{root_tmpdir}/home/.vimrc").write_text("")
+    assert count_scandirs(index.refresh) == 1
+    assert index.lookup(".vimrc") == ["home"]
+
+    Path(f"{root_tmpdir}/home/.vimrc").unlink()
+    Path(f"{root_tmpdir}/home/.ssh").rmdir()
+    Path(f"{root_tmpdir}/home").rmdir()
+    assert index.lookup(".ssh") == ["work"]
+    assert "home" not in json.loads(Path(index.path).read_text())["namespaces"]
+
+
+def test_corrupted_index_is_rebuilt(root_space, root_tmpdir, symlink_tmpdir):
+    Path(root_space.get_index().path).write_text("{not json")
+
+    index = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir).get_index()
+    assert index.lookup(".ssh") == ["home", "work"]
+
+
+def test_which(root_space, symlink_tmpdir):
+    Namespace(root_space=root_space, name="work").activate()
+
+    stream = io.StringIO()
+    assert execute(root_space, {"op": "which", "entry": ".ssh"}, stream) == 0
+    assert stream.getvalue() == "home\nwork (linked)\n"
+
+    stream = io.StringIO()
+    request = {"op": "which", "entry": ".vimrc", "format": "json"}
+    assert execute(root_space, request, stream) == 1
+    assert stream.getvalue() == ""
+
+    assert os.path.islink(f"{symlink_tmpdir}/.gitconfig")
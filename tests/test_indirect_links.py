@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import os
+from pathlib import Path
+
+import pytest
+
+from punsctl.namespace import Namespace
+from punsctl.plan import Operation
+from punsctl.rootspace import RootSpace
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+def make_namespace(rs, name, entries, indirect=True, atomic=False):
+    ns = Namespace(root_space=rs, name=name, indirect=indirect, atomic=atomic)
+    ns.create()
+
+    for entry in entries:
+        Path(f"{ns.get_path()}/{entry}").write_text(f"{name}:{entry}")
+
+    return ns
+
+
+ENTRIES = [f".rc{ix}" for ix in range(20)]
+
+
+@pytest.mark.parametrize("atomic", [False, True])
+def test_switch_only_retargets_current_ns(root_tmpdir, symlink_tmpdir, atomic):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    work = make_namespace(rs, "work", ENTRIES, atomic=atomic)
+    home = make_namespace(rs, "home", ENTRIES, atomic=atomic)
+
+    work.activate()
+
+    link = os.readlink(f"{symlink_tmpdir}/.rc0")
+    assert link == f"{symlink_tmpdir}/.current_ns/.rc0"
+    assert Path(f"{symlink_tmpdir}/.rc0").read_text() == "work:.rc0"
+
+    plan = home.plan_switch()
+
+    assert [operation.name for operation in plan] == [".current_ns"]
+
+    plan.apply()
+
+    assert home.active() is True
+    assert Path(f"{symlink_tmpdir}/.rc0").read_text() == "home:.rc0"
+
+
+def test_switch_links_only_differing_entries(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    Path(f"{symlink_tmpdir}/.rc1").write_text("original")
+
+    work = make_namespace(rs, "work", ENTRIES + [".workrc"])
+    home = make_namespace(rs, "home", ENTRIES + [".homerc"])
+
+    work.activate()
+    operations = list(home.plan_switch())
+
+    assert {operation.name for operation in operations} == {
+        ".current_ns",
+        ".workrc",
+        ".homerc",
+        ".rc1.work.bak",
+    }
+    assert Operation(Operation.UNLINK, ".workrc") in operations
+    homerc = f"{symlink_tmpdir}/.current_ns/.homerc"
+    assert Operation(Operation.SYMLINK, ".homerc", homerc) in operations
+
+    home.switch()
+    assert Path(f"{symlink_tmpdir}/.homerc").read_text() == "home:.homerc"
+    assert not Path(f"{symlink_tmpdir}/.workrc").exists()
+
+    home.deactivate()
+
+    assert sorted(p.name for p in symlink_tmpdir.iterdir()) == [".rc1"]
+    assert Path(f"{symlink_tmpdir}/.rc1").read_text() == "original"
+
+
+def test_mode_change_retargets_links(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    work = make_namespace(rs, "work", ENTRIES, indirect=False)
+    home = make_namespace(rs, "home", ENTRIES, indirect=True)
+
+    work.activate()
+    assert os.readlink(f"{symlink_tmpdir}/.rc0") == f"{work.get_path()}/.rc0"
+
+    home.switch()
+
+    assert os.readlink(f"{symlink_tmpdir}/.rc0") == f"{symlink_tmpdir}/.current_ns/.rc0"
+    assert Path(f"{symlink_tmpdir}/.rc0").read_text() == "home:.rc0"
+
+    # Reactivating in direct mode converts the links back
+    home.indirect = False
+    home.activate()
+
+    assert os.readlink(f"{symlink_tmpdir}/.rc0") == f"{home.get_path()}/.rc0"
+    assert list(symlink_tmpdir.glob("*.bak")) == []
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+from punsctl.listing import write_namespaces
+from punsctl.namespace import Namespace
+from punsctl.rootspace import RootSpace
+
+NAMESPACES = ["work-a", "work-b", "home", "oss"]
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def root_space(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+
+    for namespace in NAMESPACES:
+        Namespace(root_space=rs, name=namespace).create()
+
+    # Neither files nor symlinks are namespaces
+    Path(f"{root_tmpdir}/file").write_text("")
+    Path(f"{root_tmpdir}/link").symlink_to(f"{root_tmpdir}/home")
+
+    Namespace(root_space=rs, name="work-b").activate()
+
+    return rs
+
+
+def test_list_text(root_space):
+    stream = io.StringIO()
+
+    assert write_namespaces(root_space, stream=stream) == 4
+    assert [line.split()[0] for line in stream.getvalue().splitlines()] == sorted(
+        NAMESPACES
+    )
+    assert "work-b (" in stream.getvalue()
+    assert stream.getvalue().count("active") == 1
+
+
+def test_list_json_with_pattern(root_space):
+    stream = io.StringIO()
+
+    write_namespaces(root_space, fmt="json", pattern="work-*", stream=stream)
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    assert sorted(record["name"] for record in records) == ["work-a", "work-b"]
+    assert {record["name"]: record["active"] for record in records} == {
+        "work-a": False,
+        "work-b": True,
+    }
+
+
+def test_list_nul(root_space):
+    stream = io.StringIO()
+
+    write_namespaces(root_space, fmt="nul", stream=stream)
+
+    assert stream.getvalue().endswith("\0")
+    assert sorted(stream.getvalue().split("\0")[:-1]) == sorted(NAMESPACES)
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from punsctl.exceptions import RootSpaceException
+from punsctl.ops import execute
+from punsctl.rootspace import RootSpace
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def holder(root_tmpdir):
+    """
+    Holds the rootspace lock from another process, flock doesn't conflict
+    between descriptors of one process the way the tests need.
+    """
+
+    processes = []
+
+    def hold(shared):
+        script = (
+            "import sys, time, fcntl\n"
+            f"fd = open({str(root_tmpdir / '.punsctl.lock')!r}, 'a')\n"
+            f"fcntl.flock(fd, fcntl.{'LOCK_SH' if shared else 'LOCK_EX'})\n"
+            "print('locked', flush=True)\n"
+            "sys.stdin.read()\n"
+        )
+        process = subprocess.Popen(
+            [sys.executable, "-c", script],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        assert process.stdout.readline() == "locked\n"
+        processes.append(process)
+
+    yield hold
+
+    for process in processes:
+        process.stdin.close()
+        process.wait()
+
+
+def test_readers_share(root_tmpdir, symlink_tmpdir, holder):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    holder(shared=True)
+
+    with rs.lock(shared=True, timeout=0):
+        pass
+
+    with pytest.raises(RootSpaceException):
+        with rs.lock(shared=False, timeout=0):
+            pass
+
+
+def test_writer_excludes(root_tmpdir, symlink_tmpdir, holder):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    holder(shared=False)
+
+    started = time.monotonic()
+    with pytest.raises(RootSpaceException):
+        with rs.lock(shared=True, timeout=0.2):
+            pass
+    assert time.monotonic() - started >= 0.2
+
+    request = {"op": "create", "namespace": "work", "lock_timeout": 0}
+    with pytest.raises(RootSpaceException):
+        execute(rs, request)
+    assert not Path(f"{root_tmpdir}/work").exists()
+
+
+def test_ops_lock(root_tmpdir, symlink_tmpdir, holder, capsys):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    execute(rs, {"op": "create", "namespace": "work"})
+    holder(shared=True)
+
+    execute(rs, {"op": "list", "format": "nul", "lock_timeout": 0})
+    execute(rs, {"op": "activate", "namespace": "work", "dry_run": True})
+
+    out = capsys.readouterr().out
+    assert out.startswith("info: work created\nwork\0dry-run: symlink .current_ns")
+
+
+def test_clone_is_exclusive(root_tmpdir, symlink_tmpdir, holder):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    execute(rs, {"op": "create", "namespace": "work"})
+    holder(shared=True)
+
+    # Two clones into one target must not both pass the existence check
+    request = {"op": "clone", "namespace": "work", "target": "copy", "lock_timeout": 0}
+    with pytest.raises(RootSpaceException):
+        execute(rs, request)
+    assert not Path(f"{root_tmpdir}/copy").exists()
+
+
+def _snapshot(*paths):
+    return sorted(
+        (str(path), path.is_symlink())
+        for top in paths
+        for path in [top, *top.rglob("*")]
+        # The lock and the entry index cache are written by readers too
+        if path.name not in (".punsctl.lock", ".punsctl.index")
+    )
+
+
+@pytest.mark.parametrize(
+    "request_",
+    [
+        {"op": "create", "namespace": "new"},
+        {"op": "clone", "namespace": "work", "target": "copy"},
+        {"op": "remove", "namespace": "home", "recursive": True},
+        {"op": "remove", "namespace": "work", "deactivate": True},
+        {"op": "activate", "namespace": "work"},
+        {"op": "switch", "namespace": "home"},
+        {"op": "deactivate"},
+        {"op": "repair"},
+        {"op": "gc"},
+    ],
+)
+def test_dry_run_changes_nothing(root_tmpdir, symlink_tmpdir, holder, request_):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    for name in ("home", "work"):
+        execute(rs, {"op": "create", "namespace": name})
+        Path(f"{root_tmpdir}/{name}/.gitconfig").write_text(name)
+    execute(rs, {"op": "activate", "namespace": "work"})
+    Path(f"{root_tmpdir}/.backups/objects/ab").mkdir(parents=True)
+    Path(f"{root_tmpdir}/.backups/objects/ab/abcd").write_text("unreferenced")
+
+    before = _snapshot(root_tmpdir, symlink_tmpdir)
+
+    # Runs under the shared lock of a dry run, alongside another reader
+    holder(shared=True)
+    assert execute(rs, {**request_, "dry_run": True, "lock_timeout": 0}) == 0
+
+    assert _snapshot(root_tmpdir, symlink_tmpdir) == before
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+from pathlib import Path
+
+import pytest
+
+from punsctl.manifest import Manifest
+from punsctl.namespace import Namespace
+from punsctl.rootspace import RootSpace
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+def make_namespace(rs, name, entries):
+    ns = Namespace(root_space=rs, name=name)
+    ns.create()
+
+    for entry in entries:
+        Path(f"{ns.get_path()}/{entry}").write_text(f"{name}:{entry}")
+
+    return ns
+
+
+def test_activation_writes_manifest(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    Path(f"{symlink_tmpdir}/.gitconfig").write_text("home")
+
+    ns = make_namespace(rs, "work", [".gitconfig", ".vimrc"])
+    ns.activate()
+
+    manifest = rs.load_manifest()
+
+    assert manifest is not None
+    assert manifest.namespace == "work"
+    assert sorted(manifest.links) == [".gitconfig", ".vimrc"]
+    assert manifest.backups == {".gitconfig": ".gitconfig.work.bak"}
+
+    # Re-activation keeps already linked entries in the manifest
+    ns.activate()
+    assert sorted(rs.load_manifest().links) == [".gitconfig", ".vimrc"]
+
+
+def test_deactivation_replays_manifest(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    Path(f"{symlink_tmpdir}/.gitconfig").write_text("home")
+
+    ns = make_namespace(rs, "work", [".gitconfig", ".vimrc"])
+    ns.activate()
+
+    # Entries removed from the namespace are still unlinked from the manifest
+    Path(f"{ns.get_path()}/.vimrc").unlink()
+
+    ns.deactivate()
+
+    assert Path(f"{symlink_tmpdir}/.vimrc").is_symlink() is False
+    assert Path(f"{symlink_tmpdir}/.gitconfig").read_text() == "home"
+    assert rs.get_manifest_path().exists() is False
+    assert ns.active() is False
+
+
+def test_deactivation_without_manifest_scans(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    Path(f"{symlink_tmpdir}/.gitconfig").write_text("home")
+
+    ns = make_namespace(rs, "work", [".gitconfig"])
+    ns.activate()
+
+    rs.get_manifest_path().unlink()
+    ns.deactivate()
+
+    assert Path(f"{symlink_tmpdir}/.gitconfig").read_text() == "home"
+    assert ns.active() is False
+
+
+def test_manifest_roundtrip():
+    manifest = Manifest("work", links=[".ssh"], backups={".ssh": ".ssh.work.bak"})
+    loaded = Manifest.from_json(manifest.to_json())
+
+    assert loaded.namespace == "work"
+    assert loaded.links == [".ssh"]
+    assert loaded.backups == {".ssh": ".ssh.work.bak"}
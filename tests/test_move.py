@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import errno
+import os
+from pathlib import Path
+
+import pytest
+
+from punsctl import fscopy
+from punsctl.namespace import Namespace
+from punsctl.rootspace import RootSpace
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def cross_device(root_tmpdir, monkeypatch):
+    """
+    Fails renames between the root path and anywhere else with EXDEV, as if
+    the root path were a filesystem of its own. Relative names are in the
+    symlink path.
+    """
+
+    rename = os.rename
+
+    def on_root(path):
+        return os.path.isabs(str(path)) and str(path).startswith(f"{root_tmpdir}/")
+
+    def cross_rename(src, dst, *args, **kwargs):
+        if on_root(src) != on_root(dst):
+            raise OSError(errno.EXDEV, os.strerror(errno.EXDEV), src, None, dst)
+
+        return rename(src, dst, *args, **kwargs)
+
+    monkeypatch.setattr(os, "rename", cross_rename)
+
+
+def test_move_renames_on_one_filesystem(tmpdir):
+    Path(f"{tmpdir}/src").write_text("content")
+
+    assert fscopy.move(f"{tmpdir}/src", f"{tmpdir}/dst") == "rename"
+    assert Path(f"{tmpdir}/dst").read_text() == "content"
+
+
+def test_move_copies_file_across_filesystems(root_tmpdir, symlink_tmpdir, cross_device):
+    src = Path(f"{symlink_tmpdir}/.rc")
+    src.write_text("content")
+    os.chmod(src, 0o640)
+    os.utime(src, ns=(1_000_000_000, 2_000_000_000))
+
+    assert fscopy.move(str(src), f"{root_tmpdir}/rc") == "copy"
+
+    dst = Path(f"{root_tmpdir}/rc")
+    assert not src.exists()
+    assert dst.read_text() == "content"
+    assert dst.stat().st_mode & 0o777 == 0o640
+    assert dst.stat().st_mtime_ns == 2_000_000_000
+    assert os.listdir(root_tmpdir) == ["rc"]
+
+
+def test_move_copies_tree_across_filesystems(root_tmpdir, symlink_tmpdir, cross_device):
+    src = Path(f"{symlink_tmpdir}/.config")
+    Path(f"{src}/app/nested").mkdir(parents=True)
+    Path(f"{src}/app/nested/settings").write_text("settings")
+    Path(f"{src}/top").write_text("top")
+    os.symlink("top", f"{src}/link")
+
+    assert fscopy.move(str(src), f"{root_tmpdir}/config", jobs=4) == "copy"
+
+    dst = Path(f"{root_tmpdir}/config")
+    assert not src.exists()
+    assert Path(f"{dst}/app/nested/settings").read_text() == "settings"
+    assert Path(f"{dst}/top").read_text() == "top"
+    assert os.readlink(f"{dst}/link") == "top"
+
+
+def test_failed_copy_keeps_source(
+    root_tmpdir, symlink_tmpdir, cross_device, monkeypatch
+):
+    src = Path(f"{symlink_tmpdir}/.config")
+    src.mkdir()
+    Path(f"{src}/a").write_text("a")
+    Path(f"{src}/b").write_text("b")
+
+    # One file short, the copy doesn't match its source
+    copy_file = fscopy.copy_file
+    monkeypatch.setattr(
+        fscopy,
+        "copy_file",
+        lambda src, dst, mode: (
+            None if src.endswith("/b") else copy_file(src, dst, mode)
+        ),
+    )
+
+    with pytest.raises(OSError) as exc:
+        fscopy.move(str(src), f"{root_tmpdir}/config")
+
+    assert exc.value.errno == errno.EIO
+    assert sorted(os.listdir(src)) == ["a", "b"]
+    assert os.listdir(root_tmpdir) == []
+
+
+@pytest.mark.parametrize("atomic", [False, True])
+def test_store_backups_across_filesystems(
+    root_tmpdir, symlink_tmpdir, cross_device, atomic
+):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    ns = Namespace(root_space=rs, name="work", atomic=atomic, store=True)
+    ns.create()
+    Path(f"{ns.get_path()}/.bashrc").write_text("work")
+    Path(f"{ns.get_path()}/.config").mkdir()
+
+    Path(f"{symlink_tmpdir}/.bashrc").write_text("original")
+    Path(f"{symlink_tmpdir}/.config/app").mkdir(parents=True)
+    Path(f"{symlink_tmpdir}/.config/app/settings").write_text("settings")
+
+    ns.activate()
+
+    assert Path(f"{symlink_tmpdir}/.bashrc").read_text() == "work"
+    assert Path(f"{symlink_tmpdir}/.config").is_symlink()
+
+    ns.deactivate()
+
+    assert sorted(os.listdir(symlink_tmpdir)) == [".bashrc", ".config"]
+    assert Path(f"{symlink_tmpdir}/.bashrc").read_text() == "original"
+    assert Path(f"{symlink_tmpdir}/.config/app/settings").read_text() == "settings"
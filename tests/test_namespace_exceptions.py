@@ -61,3 +61,18 @@ def test_namespace_exception(root_tmpdir, symlink_tmpdir):
 
     with pytest.raises(NamespaceException):
         ns1.activate()
+
+
+def test_activate_over_dangling_current_ns(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    ns = Namespace(root_space=rs, name="a")
+    ns.create()
+    Path(f"{ns.get_path()}/f").write_text("")
+
+    Path(f"{symlink_tmpdir}/.current_ns").symlink_to(f"{root_tmpdir}/removed")
+
+    with pytest.raises(NamespaceException):
+        ns.activate()
+
+    # Nothing was linked and no manifest was written
+    assert sorted(path.name for path in symlink_tmpdir.iterdir()) == [".current_ns"]
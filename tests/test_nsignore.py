@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import os
+from pathlib import Path
+
+import pytest
+
+from punsctl.namespace import Namespace
+from punsctl.nsignore import NsIgnore
+from punsctl.rootspace import RootSpace
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+def test_nsignore_patterns():
+    nsignore = NsIgnore(
+        ["# comment", "", "*.log", "!keep.log", "cache/", ".nsignore", "docs/*.md"]
+    )
+
+    assert nsignore.match("debug.log") is True
+    assert nsignore.match("keep.log") is False
+    assert nsignore.match("cache", is_dir=True) is True
+    assert nsignore.match("cache", is_dir=False) is False
+    assert nsignore.match(".nsignore") is True
+    assert nsignore.match("docs/README.md") is True
+    assert nsignore.match("README.md") is False
+    assert nsignore.match(".gitconfig") is False
+    assert ".nsignore" in nsignore
+
+
+def test_nsignore_last_rule_wins():
+    assert NsIgnore(["!keep.log", "*.log"]).match("keep.log") is True
+    assert NsIgnore(["keep.log", "!*.log"]).match("keep.log") is False
+
+
+def test_nsignore_patterns_match_whole_paths():
+    nsignore = NsIgnore(["*.log", "cache*x"])
+
+    assert nsignore.match("cachex") is True
+    assert nsignore.match("cachex.bak") is False
+    assert nsignore.match("debug.log.1") is False
+
+    nsignore = NsIgnore(["*.conf", "!a?", "*.md"])
+
+    assert nsignore.match("ab.conf") is True
+    assert nsignore.match("ab") is False
+
+
+def test_nsignore_is_cached(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    ns = Namespace(root_space=rs, name="work")
+    ns.create()
+
+    path = Path(f"{ns.get_path()}/.nsignore")
+    path.write_text("*.log\n")
+
+    assert ns.load_nsignore() is ns.load_nsignore()
+
+    path.write_text("*.log\n*.tmp\n")
+    os.utime(path, ns=(0, 0))
+
+    assert ns.load_nsignore().match("file.tmp") is True
+
+
+def test_nsignore_applies_to_activation_and_deactivation(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    ns = Namespace(root_space=rs, name="work")
+    ns.create()
+
+    Path(f"{ns.get_path()}/.nsignore").write_text(".nsignore\n*.log\n!keep.log\n")
+    Path(f"{ns.get_path()}/debug.log").write_text("")
+    Path(f"{ns.get_path()}/keep.log").write_text("")
+
+    ns.activate()
+
+    assert Path(f"{symlink_tmpdir}/debug.log").exists() is False
+    assert Path(f"{symlink_tmpdir}/keep.log").is_symlink() is True
+    assert Path(f"{symlink_tmpdir}/.nsignore").exists() is False
+
+    # A link to an ignored entry is left alone by the scanning deactivation
+    Path(f"{symlink_tmpdir}/debug.log").symlink_to(f"{ns.get_path()}/debug.log")
+    rs.get_manifest_path().unlink()
+
+    ns.deactivate()
+
+    assert Path(f"{symlink_tmpdir}/keep.log").exists() is False
+    assert Path(f"{symlink_tmpdir}/debug.log").is_symlink() is True
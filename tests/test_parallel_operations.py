@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import logging
+from pathlib import Path
+
+import pytest
+
+from punsctl.namespace import Namespace
+from punsctl.pool import map_ordered
+from punsctl.rootspace import RootSpace
+
+ENTRIES = [f".entry{index:03d}" for index in range(64)]
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+def test_map_ordered_keeps_order():
+    assert map_ordered(lambda item: item * 2, list(range(100)), jobs=8) == [
+        item * 2 for item in range(100)
+    ]
+
+
+def test_parallel_activation(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    ns = Namespace(root_space=rs, name="work", jobs=8)
+    ns.create()
+
+    for entry in ENTRIES:
+        Path(f"{ns.get_path()}/{entry}").write_text(entry)
+
+    for entry in ENTRIES[::2]:
+        Path(f"{symlink_tmpdir}/{entry}").write_text("home")
+
+    ns.activate()
+
+    for entry in ENTRIES:
+        assert Path(f"{symlink_tmpdir}/{entry}").read_text() == entry
+
+    for entry in ENTRIES[::2]:
+        assert Path(f"{symlink_tmpdir}/{entry}.work.bak").read_text() == "home"
+
+    ns.deactivate()
+
+    for entry in ENTRIES[::2]:
+        assert Path(f"{symlink_tmpdir}/{entry}").read_text() == "home"
+
+    for entry in ENTRIES[1::2]:
+        assert Path(f"{symlink_tmpdir}/{entry}").exists() is False
+
+
+def test_parallel_warnings_are_reported_in_plan_order(
+    root_tmpdir, symlink_tmpdir, caplog
+):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    ns = Namespace(root_space=rs, name="work", jobs=8)
+    ns.create()
+
+    for entry in ENTRIES:
+        Path(f"{ns.get_path()}/{entry}").write_text(entry)
+
+    plan = ns.plan_activate()
+
+    # Targets created after planning make the symlink operations fail
+    for entry in ENTRIES[::3]:
+        Path(f"{symlink_tmpdir}/{entry}").write_text("home")
+
+    with caplog.at_level(logging.WARNING):
+        failed = plan.apply()
+
+    assert [operation.name for operation in failed] == ENTRIES[::3]
+    assert [record.getMessage().split()[-1] for record in caplog.records] == (
+        ENTRIES[::3]
+    )
+    assert sorted(rs.load_manifest().links) == sorted(set(ENTRIES) - set(ENTRIES[::3]))
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import time
+from pathlib import Path
+
+import pytest
+
+from punsctl.exceptions import NamespaceException
+from punsctl.fsremove import remove_tree
+from punsctl.namespace import Namespace
+from punsctl.rootspace import RootSpace
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def outside(tmpdir):
+    path = Path(f"{tmpdir}/outside")
+    path.mkdir()
+    Path(f"{path}/keep").write_text("")
+
+    return path
+
+
+def populate(path: Path, outside: Path) -> None:
+    for ix in range(8):
+        Path(f"{path}/.config/app{ix}/nested").mkdir(parents=True)
+        Path(f"{path}/.config/app{ix}/nested/file").write_text("")
+
+    Path(f"{path}/.gnupg").mkdir(mode=0o700)
+    Path(f"{path}/.gnupg/key").write_text("")
+    Path(f"{path}/.gnupg").chmod(0o500)
+    Path(f"{path}/outside").symlink_to(outside)
+    Path(f"{path}/.config/outside").symlink_to(outside)
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_remove_tree(tmpdir, outside, jobs):
+    path = Path(f"{tmpdir}/tree")
+    path.mkdir()
+    populate(path, outside)
+
+    remove_tree(str(path), jobs=jobs)
+
+    assert not path.exists()
+    assert Path(f"{outside}/keep").exists()
+
+
+def test_remove_refuses_active(root_tmpdir, symlink_tmpdir, outside):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    ns = Namespace(root_space=rs, name="work")
+    ns.create()
+    populate(ns.get_path(), outside)
+
+    with pytest.raises(NamespaceException):
+        ns.remove(recursive=False)
+
+    ns.activate()
+
+    with pytest.raises(NamespaceException):
+        ns.remove(recursive=True)
+    assert ns.exists()
+
+    ns.remove(recursive=True, deactivate=True)
+
+    assert not ns.exists()
+    assert list(symlink_tmpdir.iterdir()) == []
+    assert Path(f"{outside}/keep").exists()
+
+
+def test_remove_to_trash(root_tmpdir, symlink_tmpdir, outside):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    ns = Namespace(root_space=rs, name="work")
+    ns.create()
+    populate(ns.get_path(), outside)
+
+    ns.remove(trash=True)
+
+    assert not ns.exists()
+    assert rs.get_all_ns_paths() == []
+
+    # Deleted by a detached process, give it a moment
+    for _ in range(100):
+        if list(rs.get_trash_path().iterdir()) == []:
+            break
+        time.sleep(0.05)
+
+    assert list(rs.get_trash_path().iterdir()) == []
+    assert Path(f"{outside}/keep").exists()
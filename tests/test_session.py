@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+import punsctl
+from punsctl import NamespaceException, Session
+from punsctl.main import main
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def session(root_tmpdir, symlink_tmpdir):
+    session = Session(root_path=str(root_tmpdir), symlink_path=str(symlink_tmpdir))
+
+    for name in ("home", "work"):
+        session.create(name)
+        Path(f"{root_tmpdir}/{name}/.gitconfig").write_text(name)
+
+    return session
+
+
+def test_exports_are_lazy():
+    assert punsctl.Session is Session
+    assert "Session" in punsctl.__all__
+
+    with pytest.raises(AttributeError):
+        punsctl.missing
+
+
+def test_list_returns_namespaces(session, root_tmpdir):
+    assert session.list() == [
+        punsctl.NamespaceInfo("home", f"{root_tmpdir}/home", False),
+        punsctl.NamespaceInfo("work", f"{root_tmpdir}/work", False),
+    ]
+
+    session.activate("work")
+
+    assert [info.name for info in session.list() if info.active] == ["work"]
+    assert [info.name for info in session.list(pattern="h*")] == ["home"]
+
+
+def test_activate_switch_deactivate(session, symlink_tmpdir):
+    result = session.activate("work")
+
+    assert result.ok
+    assert result.namespace == "work"
+    assert "symlink .gitconfig -> " in " ".join(result.applied)
+    assert session.current() == "work"
+
+    result = session.switch("home")
+
+    assert result.ok
+    assert session.current() == "home"
+    assert Path(f"{symlink_tmpdir}/.gitconfig").read_text() == "home"
+
+    result = session.deactivate()
+
+    assert result.ok
+    assert session.current() is None
+    assert os.listdir(symlink_tmpdir) == []
+
+
+def test_tree_switch_reports_followup_operations(root_tmpdir, symlink_tmpdir):
+    session = Session(
+        root_path=str(root_tmpdir), symlink_path=str(symlink_tmpdir), tree=True
+    )
+
+    for name in ("home", "work"):
+        session.create(name)
+        Path(f"{root_tmpdir}/{name}/.gitconfig").write_text(name)
+
+    session.activate("home")
+    result = session.switch("work")
+
+    assert result.ok
+    assert f"symlink .gitconfig -> {root_tmpdir}/work/.gitconfig" in result.applied
+    assert Path(f"{symlink_tmpdir}/.gitconfig").read_text() == "work"
+
+
+def test_activated_restores_previous_namespace(session, symlink_tmpdir):
+    with session.activated("work"):
+        assert Path(f"{symlink_tmpdir}/.gitconfig").read_text() == "work"
+
+    assert session.current() is None
+    assert os.listdir(symlink_tmpdir) == []
+
+    session.activate("home")
+
+    with pytest.raises(RuntimeError):
+        with session.activated("work"):
+            assert session.current() == "work"
+            raise RuntimeError()
+
+    assert session.current() == "home"
+    assert Path(f"{symlink_tmpdir}/.gitconfig").read_text() == "home"
+
+
+def test_errors_raise(session):
+    with pytest.raises(NamespaceException):
+        session.activate("missing")
+
+    with pytest.raises(NamespaceException):
+        session.create("work")
+
+
+def test_scans_are_cached(session):
+    root_space = session.get_root_space()
+
+    session.list()
+    cached = root_space.ns_entries_cache
+
+    session.list()
+    assert root_space.ns_entries_cache is cached
+
+
+def test_lock_is_reentrant(session):
+    with session.lock():
+        session.create("other")
+        session.activate("other")
+
+    with session.lock(shared=True):
+        assert [info.name for info in session.list()] == ["home", "other", "work"]
+
+        with pytest.raises(NamespaceException):
+            session.create("blocked")
+
+
+def test_main_takes_args(session, root_tmpdir, symlink_tmpdir, capsys, monkeypatch):
+    monkeypatch.setenv("NS_NO_DAEMON", "1")
+    monkeypatch.setattr(sys, "argv", ["punsctl", "-h"])
+
+    with pytest.raises(SystemExit) as exc:
+        main(["-r", str(root_tmpdir), "-s", str(symlink_tmpdir), "-l", "-f", "nul"])
+
+    assert exc.value.code == 0
+    assert sorted(capsys.readouterr().out.split("\0")) == ["", "home", "work"]
+
+
+@pytest.mark.parametrize("args", [["-x", "work"], ["-n", "new"]])
+def test_main_dry_run_of_write_ops(
+    session, root_tmpdir, symlink_tmpdir, capsys, monkeypatch, args
+):
+    monkeypatch.setenv("NS_NO_DAEMON", "1")
+
+    with pytest.raises(SystemExit) as exc:
+        main(["-r", str(root_tmpdir), "-s", str(symlink_tmpdir), "-N"] + args)
+
+    assert exc.value.code == 0
+    assert capsys.readouterr().out.startswith("dry-run: ")
+    assert [info.name for info in session.list()] == ["home", "work"]
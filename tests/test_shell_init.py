@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from punsctl.namespace import Namespace
+from punsctl.rootspace import RootSpace
+from punsctl.shell import SHELLS, render
+from punsctl.static import CURRENT_NS_SYMLINK_NAME
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.mark.parametrize("shell", SHELLS)
+def test_render_uses_symlink_path(shell):
+    script = render(shell, "/tmp/my root")
+
+    assert f"/tmp/my root/{CURRENT_NS_SYMLINK_NAME}" in script
+    assert "python" not in script
+
+
+def test_render_unknown_shell():
+    with pytest.raises(ValueError):
+        render("csh", "/tmp")
+
+
+@pytest.mark.parametrize("shell", ["bash", "zsh"])
+def test_posix_prompt_refresh(shell, root_tmpdir, symlink_tmpdir, tmpdir):
+    if shutil.which(shell) is None:
+        pytest.skip(f"{shell} is not installed")
+
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    Namespace(root_space=rs, name="work").create()
+    Namespace(root_space=rs, name="work").activate()
+
+    # A stub stands in for the real command behind the wrapper function, it
+    # switches to the namespace named by its last argument
+    Path(f"{tmpdir}/bin").mkdir()
+    stub = Path(f"{tmpdir}/bin/punsctl")
+    stub.write_text(
+        "#!/bin/sh\n"
+        "for ns; do :; done\n"
+        f"rm -f '{symlink_tmpdir}/{CURRENT_NS_SYMLINK_NAME}'\n"
+        f"ln -s '{root_tmpdir}/'\"$ns\" '{symlink_tmpdir}/{CURRENT_NS_SYMLINK_NAME}'\n"
+    )
+    stub.chmod(0o755)
+
+    # Not only -a, -d, -w and -x change the link, e.g. batch does too
+    script = render(shell, str(symlink_tmpdir)) + (
+        "punsctl_ns\n"
+        "punsctl -w home\n"
+        "punsctl_ns\n"
+        "punsctl batch work\n"
+        "punsctl_ns\n"
+    )
+    out = subprocess.run(
+        [shell, "-c", script],
+        env={"PATH": f"{tmpdir}/bin:/usr/bin:/bin"},
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+    assert out.splitlines() == ["work", "home", "work"]
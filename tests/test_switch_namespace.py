@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+from pathlib import Path
+
+import pytest
+
+from punsctl.namespace import Namespace
+from punsctl.plan import Operation
+from punsctl.rootspace import RootSpace
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+def make_namespace(rs, name, entries):
+    ns = Namespace(root_space=rs, name=name)
+    ns.create()
+
+    for entry in entries:
+        Path(f"{ns.get_path()}/{entry}").write_text(f"{name}:{entry}")
+
+    return ns
+
+
+def test_switch_retargets_shared_entries_and_keeps_backups(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    Path(f"{symlink_tmpdir}/.gitconfig").write_text("home")
+
+    work = make_namespace(rs, "work", [".gitconfig", ".vimrc", ".workrc"])
+    home = make_namespace(rs, "home", [".gitconfig", ".vimrc", ".homerc"])
+
+    work.activate()
+
+    plan = home.plan_switch()
+    operations = list(plan)
+
+    assert Operation(Operation.UNLINK, ".workrc") in operations
+    homerc = f"{home.get_path()}/.homerc"
+    assert Operation(Operation.SYMLINK, ".homerc", homerc) in operations
+    # Shared entries are relinked too, only their backups stay in place
+    vimrc = f"{home.get_path()}/.vimrc"
+    assert Operation(Operation.SYMLINK, ".vimrc", vimrc) in operations
+    assert (
+        Operation(Operation.RENAME, ".gitconfig.work.bak", ".gitconfig.home.bak")
+        in operations
+    )
+    assert all(
+        operation.action != Operation.RENAME or operation.name != ".gitconfig"
+        for operation in operations
+    )
+
+    home.switch()
+
+    assert home.active() is True
+    assert work.active() is False
+    assert Path(f"{symlink_tmpdir}/.vimrc").read_text() == "home:.vimrc"
+    assert Path(f"{symlink_tmpdir}/.homerc").read_text() == "home:.homerc"
+    assert Path(f"{symlink_tmpdir}/.workrc").exists() is False
+
+    manifest = rs.load_manifest()
+    assert manifest.namespace == "home"
+    assert sorted(manifest.links) == [".gitconfig", ".homerc", ".vimrc"]
+    assert manifest.backups == {".gitconfig": ".gitconfig.home.bak"}
+
+    home.deactivate()
+
+    assert Path(f"{symlink_tmpdir}/.gitconfig").read_text() == "home"
+    assert Path(f"{symlink_tmpdir}/.vimrc").exists() is False
+    assert Path(f"{symlink_tmpdir}/.homerc").exists() is False
+
+
+def test_switch_without_active_namespace_activates(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    work = make_namespace(rs, "work", [".workrc"])
+
+    work.switch()
+
+    assert work.active() is True
+    assert Path(f"{symlink_tmpdir}/.workrc").read_text() == "work:.workrc"
+
+
+def test_dry_run_does_not_touch_symlink_path(root_tmpdir, symlink_tmpdir, capsys):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    work = make_namespace(rs, "work", [".workrc"])
+
+    work.plan_activate().print()
+
+    assert "dry-run: symlink .workrc" in capsys.readouterr().out
+    assert list(symlink_tmpdir.iterdir()) == []
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+from punsctl.namespace import Namespace
+from punsctl.rootspace import RootSpace
+from punsctl.trace import tracer
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def enabled_tracer():
+    tracer.enable()
+    yield tracer
+    tracer.disable()
+
+
+def test_disabled_tracer_records_nothing(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    ns = Namespace(root_space=rs, name="work")
+    ns.create()
+    ns.activate()
+
+    assert tracer.enabled is False
+    assert tracer.phases == {}
+    assert len(tracer.counters) == 0
+
+
+def test_trace_report(root_tmpdir, symlink_tmpdir, enabled_tracer):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    rs.check()
+
+    ns = Namespace(root_space=rs, name="work")
+    ns.create()
+    Path(f"{ns.get_path()}/.nsignore").write_text(".nsignore\n")
+    Path(f"{ns.get_path()}/.gitconfig").write_text("work")
+    Path(f"{symlink_tmpdir}/.gitconfig").write_text("home")
+
+    ns.activate()
+    ns.deactivate()
+
+    stream = io.StringIO()
+    enabled_tracer.dump(stream)
+    report = json.loads(stream.getvalue())
+
+    assert {"rootspace_check", "nsignore_load", "scan", "link", "backup"} <= set(
+        report["phases"]
+    )
+    assert report["counters"]["symlinks"] == 2
+    assert report["counters"]["renames"] == 2
+    assert report["counters"]["scandirs"] >= 2
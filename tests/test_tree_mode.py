@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2022, 2024 Aleksandar Buza <tech@aleksandarbuza.com>
+#
+# Permission to use, copy, modify, and distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+from pathlib import Path
+
+import pytest
+
+from punsctl.namespace import Namespace
+from punsctl.rootspace import RootSpace
+
+
+@pytest.fixture
+def root_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/.ns")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+@pytest.fixture
+def symlink_tmpdir(tmpdir):
+    path = Path(f"{tmpdir}/workspace")
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+def make_namespace(rs, name, files):
+    ns = Namespace(root_space=rs, name=name, tree=True)
+    ns.create()
+
+    for file in files:
+        path = Path(f"{ns.get_path()}/{file}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"{name}:{file}")
+
+    return ns
+
+
+def test_tree_folds_missing_directories(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    ns = make_namespace(rs, "work", [".config/nvim/init.lua", ".config/git/config"])
+
+    ns.activate()
+
+    # Nothing to merge with, the whole tree is a single symlink
+    assert Path(f"{symlink_tmpdir}/.config").is_symlink() is True
+    assert rs.load_manifest().links == [".config"]
+
+
+def test_tree_unfolds_existing_directories(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    Path(f"{symlink_tmpdir}/.config/htop").mkdir(parents=True)
+    Path(f"{symlink_tmpdir}/.config/htop/htoprc").write_text("home")
+    Path(f"{symlink_tmpdir}/.config/git").mkdir()
+    Path(f"{symlink_tmpdir}/.config/git/config").write_text("home")
+
+    ns = make_namespace(
+        rs, "work", [".config/nvim/init.lua", ".config/git/config", ".gitconfig"]
+    )
+
+    ns.activate()
+
+    config = Path(f"{symlink_tmpdir}/.config")
+    assert config.is_symlink() is False
+    assert Path(f"{config}/htop/htoprc").read_text() == "home"
+    assert Path(f"{config}/nvim").is_symlink() is True
+    assert Path(f"{config}/git").is_symlink() is False
+    assert Path(f"{config}/git/config").read_text() == "work:.config/git/config"
+    assert Path(f"{config}/git/config.work.bak").read_text() == "home"
+    assert sorted(rs.load_manifest().links) == [
+        ".config/git/config",
+        ".config/nvim",
+        ".gitconfig",
+    ]
+
+    ns.deactivate()
+
+    assert Path(f"{config}/htop/htoprc").read_text() == "home"
+    assert Path(f"{config}/git/config").read_text() == "home"
+    assert Path(f"{config}/git/config.work.bak").exists() is False
+    assert Path(f"{config}/nvim").exists() is False
+    assert Path(f"{symlink_tmpdir}/.gitconfig").exists() is False
+
+
+def test_tree_deactivation_without_manifest(root_tmpdir, symlink_tmpdir):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    Path(f"{symlink_tmpdir}/.config").mkdir()
+
+    ns = make_namespace(rs, "work", [".config/nvim/init.lua"])
+    ns.activate()
+
+    rs.get_manifest_path().unlink()
+    ns.deactivate()
+
+    assert Path(f"{symlink_tmpdir}/.config").is_dir() is True
+    assert Path(f"{symlink_tmpdir}/.config/nvim").exists() is False
+
+
+def test_tree_switch(root_tmpdir, symlink_tmpdir, capsys):
+    rs = RootSpace(path=root_tmpdir, symlink_path=symlink_tmpdir)
+    Path(f"{symlink_tmpdir}/.config").mkdir()
+
+    work = make_namespace(rs, "work", [".config/nvim/init.lua"])
+    home = make_namespace(rs, "home", [".config/fish/config.fish"])
+
+    work.activate()
+
+    plan = home.plan_switch()
+    plan.print()
+    assert "dry-run: then activate home" in capsys.readouterr().out
+
+    plan.apply()
+
+    assert home.active() is True
+    assert Path(f"{symlink_tmpdir}/.config/nvim").exists() is False
+    assert Path(f"{symlink_tmpdir}/.config/fish").is_symlink() is True